@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import sys
+from catalog_cache import load_catalog
+from playlist_sampler import PlaylistIndex, duration_seconds
+
+# Программный доступ к запросам меню (main.py) без input() и глобального
+# состояния: каталог загружается и индексируется один раз, после чего
+# запросы выполняются поиском по словарю. Пакетный режим читает файл
+# запросов и пишет результаты в JSONL.
+
+QUERY_OPS = ("genre", "artist", "long-tracks", "playlist")
+
+
+class AlbumService:
+    def __init__(self, data):
+        """data — каталог в JSON-виде (список альбомов)"""
+        self.data = data
+        self._titles_by_genre = {}
+        self._genres_by_artist = {}
+        self._long_albums = []
+        self._playlists = None
+
+        for album in data:
+            title = album.get("title", "")
+            genres = album.get("genres", [])
+            for g in dict.fromkeys(g.strip().lower() for g in genres):
+                self._titles_by_genre.setdefault(g, []).append(title)
+            for a in {a.strip().lower() for a in album.get("artists", [])}:
+                self._genres_by_artist.setdefault(a, set()).update(genres)
+            if any(duration_seconds(t.get("duration")) > 300 for t in album.get("tracks", [])):
+                self._long_albums.append(title)
+
+    @classmethod
+    def from_xml(cls, xml_path):
+        return cls(load_catalog(xml_path))
+
+    @property
+    def playlists(self):
+        # индекс плейлистов нужен не всем, строим при первом запросе
+        if self._playlists is None:
+            self._playlists = PlaylistIndex(self.data)
+        return self._playlists
+
+    def albums_by_genre(self, genre):
+        return list(self._titles_by_genre.get(genre.strip().lower(), []))
+
+    def genres_by_artist(self, artist):
+        return sorted(self._genres_by_artist.get(artist.strip().lower(), ()))
+
+    def albums_longer_than_5min(self):
+        return list(self._long_albums)
+
+    def random_playlist(self, n=None, minutes=None, genre=None, artist=None, tolerance=60):
+        if minutes is not None:
+            return self.playlists.sample_duration(minutes * 60, n=n, tolerance=tolerance,
+                                                  genre=genre, artist=artist)
+        return self.playlists.sample(n or 0, genre=genre, artist=artist)
+
+    def run(self, query):
+        """Выполняет запрос вида {"op": "genre", "genre": "..."}"""
+        op = query.get("op")
+        if op == "genre":
+            return self.albums_by_genre(_text_param(query, "genre"))
+        if op == "artist":
+            return self.genres_by_artist(_text_param(query, "artist"))
+        if op == "long-tracks":
+            return self.albums_longer_than_5min()
+        if op == "playlist":
+            return self.random_playlist(
+                n=query.get("n"), minutes=query.get("minutes"),
+                genre=_text_param(query, "genre", required=False),
+                artist=_text_param(query, "artist", required=False),
+                tolerance=query.get("tolerance", 60),
+            )
+        raise ValueError(f"неизвестный запрос: {op!r} (доступны: {', '.join(QUERY_OPS)})")
+
+
+def _text_param(query, name, required=True):
+    """Строковый параметр запроса; KeyError, если его нет, TypeError — если не строка"""
+    value = query[name] if required else query.get(name)
+    if (value is not None or required) and not isinstance(value, str):
+        raise TypeError(f"параметр {name!r} должен быть строкой, а не {type(value).__name__}")
+    return value
+
+
+def parse_query_line(line):
+    """
+    Строка файла запросов: JSON-объект или короткая форма
+    "genre Alternative Rock", "artist Radiohead", "long-tracks", "playlist 10".
+    """
+    line = line.strip()
+    if line.startswith("{"):
+        return json.loads(line)
+    op, _, arg = line.partition(" ")
+    arg = arg.strip()
+    if op == "genre":
+        return {"op": op, "genre": arg}
+    if op == "artist":
+        return {"op": op, "artist": arg}
+    if op == "playlist":
+        return {"op": op, "n": int(arg)}
+    return {"op": op}
+
+
+def run_batch(service, lines, out):
+    """Выполняет запросы построчно, по строке JSONL на запрос; возвращает число ошибок"""
+    errors = 0
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        record = {"line": line_no}
+        try:
+            query = parse_query_line(line)
+            record["id"] = query.get("id", line_no)
+            record["op"] = query.get("op")
+            record["result"] = service.run(query)
+        except KeyError as e:
+            errors += 1
+            record["error"] = f"не указан параметр {e}"
+        except (ValueError, TypeError) as e:
+            errors += 1
+            record["error"] = str(e)
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетное выполнение запросов к каталогу альбомов")
+    parser.add_argument("xml", help="XML-каталог")
+    parser.add_argument("queries", help="файл запросов (JSONL или короткая форма), '-' — stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL с результатами, '-' — stdout")
+    args = parser.parse_args()
+
+    service = AlbumService.from_xml(os.path.abspath(args.xml))
+
+    src = sys.stdin if args.queries == "-" else open(args.queries, "r", encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        errors = run_batch(service, src, dst)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    return 0 if errors == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
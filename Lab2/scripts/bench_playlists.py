@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import random
+import time
+
+from playlist_sampler import PlaylistIndex
+
+# Микробенчмарк: плейлисты через список всех треков (как исходный
+# random_playlist в main.py) против PlaylistIndex на «раздутом» каталоге.
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # lab2
+JSON_PATH = os.path.join(BASE, "out", "albums.json")
+
+
+def scale_catalog(data, factor):
+    """Копирует все альбомы factor раз (жанры и исполнители — с номером копии)"""
+    scaled = []
+    for k in range(factor):
+        for album in data:
+            scaled.append({**album,
+                           "genres": album.get("genres", []) + [f"genre {k % 50}"],
+                           "artists": [f"{a} {k}" for a in album.get("artists", [])]})
+    return scaled
+
+
+def baseline_playlist(data, n, genre=None):
+    genre = genre.strip().lower() if genre else None
+    tracks = [
+        {"album": album["title"], "title": track["title"], "duration": track["duration"]}
+        for album in data
+        if genre is None or genre in {g.strip().lower() for g in album.get("genres", [])}
+        for track in album.get("tracks", [])
+    ]
+    return random.sample(tracks, min(n, len(tracks)))
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Playlist sampling microbenchmark")
+    parser.add_argument("--json", default=JSON_PATH)
+    parser.add_argument("--scale", type=int, default=20000, help="во сколько раз размножить альбомы")
+    parser.add_argument("-n", type=int, default=15, help="треков в плейлисте")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.json, "r", encoding="utf-8") as f:
+        data = scale_catalog(json.load(f), args.scale)
+    t0 = time.perf_counter()
+    index = PlaylistIndex(data)
+    print(f"albums: {len(data)}, tracks: {index.total_tracks}, index build: {time.perf_counter() - t0:.3f}s")
+
+    cases = [
+        ("sample(n)", lambda: baseline_playlist(data, args.n), lambda: index.sample(args.n)),
+        ("sample(n, genre)", lambda: baseline_playlist(data, args.n, "genre 7"),
+         lambda: index.sample(args.n, genre="genre 7")),
+    ]
+    print(f"{'case':26} {'list':>12} {'index':>12} {'speedup':>8}")
+    for name, old_fn, new_fn in cases:
+        old = best_of(old_fn, args.repeat)
+        new = best_of(new_fn, args.repeat)
+        print(f"{name:26} {old * 1000:10.1f}ms {new * 1000:10.3f}ms {old / new:7.0f}x")
+    seconds = best_of(lambda: index.sample_duration(3600, n=args.n), args.repeat)
+    print(f"{'sample_duration(3600, n)':26} {'':>12} {seconds * 1000:10.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
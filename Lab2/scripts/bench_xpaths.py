@@ -0,0 +1,69 @@
+import argparse
+import copy
+import time
+from lxml import etree
+
+import run_xpaths
+import xpath_queries
+
+# Микробенчмарк: исходные функции run_xpaths.py против
+# скомпилированных запросов xpath_queries.py на «раздутом» albums.xml.
+
+
+def scale_tree(tree, factor):
+    """Копирует все альбомы factor раз в новый документ"""
+    root = tree.getroot()
+    albums = root.findall("album")
+    scaled = etree.Element(root.tag)
+    for _ in range(factor):
+        for a in albums:
+            scaled.append(copy.deepcopy(a))
+    return etree.ElementTree(scaled)
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def check_same(tree):
+    genre, artist = "Alternative Rock", "Radiohead"
+    assert run_xpaths.a_albums_by_genre(tree, genre) == xpath_queries.a_albums_by_genre(tree, genre)
+    assert run_xpaths.b_genres_by_artist(tree, artist) == xpath_queries.b_genres_by_artist(tree, artist)
+    assert run_xpaths.c_albums_with_tracks_over_5min(tree) == xpath_queries.c_albums_with_tracks_over_5min(tree)
+    assert run_xpaths.e_counts_per_album(tree) == xpath_queries.e_counts_per_album(tree)
+    n = 10 ** 9
+    assert run_xpaths.d_random_playlist(tree, n) == xpath_queries.d_random_playlist(tree, n)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XPath microbenchmark")
+    parser.add_argument("--xml", default=xpath_queries.XML_PATH)
+    parser.add_argument("--scale", type=int, default=2000, help="во сколько раз размножить альбомы")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tree = scale_tree(etree.parse(args.xml), args.scale)
+    print(f"albums: {len(tree.getroot())}")
+    check_same(tree)
+
+    cases = [
+        ("a_albums_by_genre", lambda m: m.a_albums_by_genre(tree, "Alternative Rock")),
+        ("b_genres_by_artist", lambda m: m.b_genres_by_artist(tree, "Radiohead")),
+        ("c_albums_with_tracks_over_5min", lambda m: m.c_albums_with_tracks_over_5min(tree)),
+        ("d_random_playlist", lambda m: m.d_random_playlist(tree, 5)),
+        ("e_counts_per_album", lambda m: m.e_counts_per_album(tree)),
+    ]
+    print(f"{'query':32} {'run_xpaths':>12} {'compiled':>12} {'speedup':>8}")
+    for name, call in cases:
+        old = best_of(lambda: call(run_xpaths), args.repeat)
+        new = best_of(lambda: call(xpath_queries), args.repeat)
+        print(f"{name:32} {old * 1000:10.1f}ms {new * 1000:10.1f}ms {old / new:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+from lxml import etree
+
+# Бинарный снимок разобранного каталога альбомов.
+# Снимок лежит рядом с XML (albums.xml -> albums.xml.snapshot) и хранит
+# результат XSLT -> JSON -> json.loads, чтобы повторная загрузка того же
+# файла не запускала XSLT и разбор JSON заново.
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+XSLT_JSON = os.path.join(BASE, "xslt", "to_json.xslt")
+
+SNAPSHOT_SUFFIX = ".snapshot"
+SNAPSHOT_MAGIC = b"ALBSNAP1"
+
+# magic, версия marshal, mtime_ns и размер XML, sha256 XML, sha256 XSLT
+HEADER = struct.Struct("<8sIqQ32s32s")
+
+_TRANSFORM = None
+
+
+def snapshot_path(xml_path):
+    return xml_path + SNAPSHOT_SUFFIX
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+def _get_transform():
+    # XSLT компилируется один раз на процесс
+    global _TRANSFORM
+    if _TRANSFORM is None:
+        _TRANSFORM = etree.XSLT(etree.parse(XSLT_JSON))
+    return _TRANSFORM
+
+
+def build_catalog(xml_path):
+    """Разбор каталога тем же путём, что и в меню: XML -> XSLT -> JSON"""
+    result = _get_transform()(etree.parse(xml_path))
+    return json.loads(str(result))
+
+
+def _read_header(path):
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(HEADER.size)
+    except OSError:
+        return None
+    if len(raw) != HEADER.size:
+        return None
+    header = HEADER.unpack(raw)
+    if header[0] != SNAPSHOT_MAGIC or header[1] != marshal.version:
+        return None
+    return header
+
+
+def _load_payload(path):
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                return marshal.loads(view[HEADER.size:])
+            finally:
+                view.release()
+
+
+def write_snapshot(xml_path, data, xml_digest=None, xslt_digest=None, st=None):
+    # st снимается до разбора: если XML успеют изменить, снимок не совпадёт по mtime
+    if st is None:
+        st = os.stat(xml_path)
+    if xml_digest is None:
+        xml_digest = file_digest(xml_path)
+    if xslt_digest is None:
+        xslt_digest = file_digest(XSLT_JSON)
+    header = HEADER.pack(SNAPSHOT_MAGIC, marshal.version, st.st_mtime_ns,
+                         st.st_size, xml_digest, xslt_digest)
+
+    path = snapshot_path(xml_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(marshal.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def _touch_header(path, header, st):
+    # Файл «тронут», но содержимое не изменилось: обновляем только mtime в заголовке
+    fresh = HEADER.pack(header[0], header[1], st.st_mtime_ns, st.st_size,
+                        header[4], header[5])
+    try:
+        with open(path, "r+b") as f:
+            f.write(fresh)
+    except OSError:
+        pass
+
+
+def load_catalog(xml_path, rebuild=False):
+    """
+    Возвращает разобранный каталог (список альбомов).
+    Если снимок актуален — читает его через mmap, иначе пересобирает.
+    """
+    path = snapshot_path(xml_path)
+    st = os.stat(xml_path)
+    xslt_digest = file_digest(XSLT_JSON)
+    header = None if rebuild else _read_header(path)
+    if header is not None and header[5] != xslt_digest:
+        # Изменилось само преобразование — снимок устарел
+        header = None
+
+    if header is not None and header[2] == st.st_mtime_ns and header[3] == st.st_size:
+        return _load_payload(path)
+
+    xml_digest = file_digest(xml_path)
+    if header is not None and header[4] == xml_digest:
+        _touch_header(path, header, st)
+        return _load_payload(path)
+
+    data = build_catalog(xml_path)
+    try:
+        write_snapshot(xml_path, data, xml_digest, xslt_digest, st)
+    except OSError:
+        # Каталог только для чтения — работаем без снимка
+        pass
+    return data
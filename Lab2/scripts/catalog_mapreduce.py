@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from lxml import etree
+
+# Map-reduce по большим XML-каталогам.
+# Файл (или все *.xml в папке) режется на диапазоны байтов по границам
+# <album>, каждый диапазон разбирается потоково в отдельном процессе,
+# а частичные агрегаты (Counter) складываются. Граница ищется по тексту,
+# поэтому "<album" внутри комментариев или CDATA не поддерживается.
+
+DEFAULT_SHARD_SIZE = 64 << 20
+SCAN_CHUNK = 1 << 20
+READ_CHUNK = 1 << 20
+
+ALBUM_START = re.compile(rb"<album[\s>/]")
+ROOT_END = b"</albums>"
+
+
+def duration_seconds(d):
+    try:
+        mins, secs = d.split(":")
+        return int(mins) * 60 + int(secs)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _find_album_start(f, pos, limit):
+    """Первое "<album" не раньше pos (и раньше limit) или limit"""
+    overlap = 7
+    while pos < limit:
+        f.seek(pos)
+        chunk = f.read(min(SCAN_CHUNK, limit - pos) + overlap)
+        m = ALBUM_START.search(chunk)
+        if m is not None and pos + m.start() < limit:
+            return pos + m.start()
+        if len(chunk) <= overlap:
+            break
+        pos += len(chunk) - overlap
+    return limit
+
+
+def _find_root_end(f, size):
+    """Позиция последнего </albums> (ищем с конца файла)"""
+    pos = size
+    while pos > 0:
+        start = max(0, pos - SCAN_CHUNK)
+        f.seek(start)
+        chunk = f.read(pos - start + len(ROOT_END))
+        i = chunk.rfind(ROOT_END)
+        if i != -1:
+            return start + i
+        pos = start
+    return size
+
+
+def plan_shards(path, shard_size=DEFAULT_SHARD_SIZE):
+    """Диапазоны [start, end) файла, каждый из целых элементов <album>"""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        end = _find_root_end(f, size)
+        first = _find_album_start(f, 0, end)
+        starts = [first]
+        pos = first + shard_size
+        while pos < end:
+            s = _find_album_start(f, pos, end)
+            if s >= end:
+                break
+            if s > starts[-1]:
+                starts.append(s)
+            pos = s + shard_size
+    bounds = starts + [end]
+    return [(path, bounds[i], bounds[i + 1]) for i in range(len(starts)) if bounds[i] < bounds[i + 1]]
+
+
+def empty_aggregates():
+    return {
+        "albums": 0,
+        "tracks": 0,
+        "genre_albums": Counter(),
+        "artist_seconds": Counter(),
+        "duration_histogram": Counter(),
+    }
+
+
+def _add_album(agg, album):
+    agg["albums"] += 1
+    genres = {g.text for g in album.iterfind("genres/genre")}
+    agg["genre_albums"].update(genres)
+    total = 0
+    for d in album.iterfind("tracks/track/duration"):
+        agg["tracks"] += 1
+        secs = duration_seconds(d.text)
+        if secs is None:
+            continue
+        total += secs
+        # корзины гистограммы по минутам: 0 -> [0:00, 1:00), 1 -> [1:00, 2:00), ...
+        agg["duration_histogram"][secs // 60] += 1
+    for artist in {a.text for a in album.iterfind("artists/artist")}:
+        agg["artist_seconds"][artist] += total
+
+
+def map_shard(shard):
+    """Разбирает один диапазон потоково и возвращает частичные агрегаты"""
+    path, start, end = shard
+    agg = empty_aggregates()
+    parser = etree.XMLPullParser(events=("end",), tag="album")
+
+    def drain():
+        for _, album in parser.read_events():
+            _add_album(agg, album)
+            album.clear()
+            parent = album.getparent()
+            while album.getprevious() is not None:
+                del parent[0]
+
+    parser.feed(b"<albums>")
+    with open(path, "rb") as f:
+        f.seek(start)
+        left = end - start
+        while left > 0:
+            chunk = f.read(min(READ_CHUNK, left))
+            if not chunk:
+                break
+            left -= len(chunk)
+            parser.feed(chunk)
+            drain()
+    parser.feed(b"</albums>")
+    parser.close()
+    drain()
+    return agg
+
+
+def merge_aggregates(parts):
+    total = empty_aggregates()
+    for part in parts:
+        total["albums"] += part["albums"]
+        total["tracks"] += part["tracks"]
+        for key in ("genre_albums", "artist_seconds", "duration_histogram"):
+            total[key].update(part[key])
+    return total
+
+
+def collect_files(paths):
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files.extend(os.path.join(p, name) for name in sorted(os.listdir(p)) if name.endswith(".xml"))
+        else:
+            files.append(p)
+    return files
+
+
+def aggregate(paths, jobs=None, shard_size=DEFAULT_SHARD_SIZE):
+    """Агрегаты по всем файлам; jobs=1 — в текущем процессе"""
+    shards = [s for path in collect_files(paths) for s in plan_shards(path, shard_size)]
+    if jobs == 1 or len(shards) <= 1:
+        parts = map(map_shard, shards)
+        return merge_aggregates(parts), len(shards)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # частичные результаты складываются по мере готовности
+        return merge_aggregates(pool.map(map_shard, shards)), len(shards)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Параллельные агрегаты по XML-каталогам альбомов")
+    parser.add_argument("paths", nargs="+", help="XML-файлы или папки с ними")
+    parser.add_argument("-j", "--jobs", type=int, default=None)
+    parser.add_argument("--shard-mb", type=int, default=DEFAULT_SHARD_SIZE >> 20, help="размер шарда, МБ")
+    parser.add_argument("--top", type=int, default=20, help="сколько артистов выводить")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    agg, shard_count = aggregate(args.paths, args.jobs, args.shard_mb << 20)
+    report = {
+        "shards": shard_count,
+        "seconds": round(time.perf_counter() - started, 3),
+        "albums": agg["albums"],
+        "tracks": agg["tracks"],
+        "genre_albums": dict(agg["genre_albums"].most_common()),
+        "artist_seconds": dict(agg["artist_seconds"].most_common(args.top)),
+        "duration_histogram": {f"{m}:00-{m + 1}:00": c for m, c in sorted(agg["duration_histogram"].items())},
+    }
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import argparse
+import copy
+import hashlib
+import json
+import os
+import sys
+import time
+from lxml import etree
+from catalog_cache import file_digest
+
+# Инкрементальная пересборка out/<имя>.txt, .html и .json.
+# Вывод каждого XSLT раскладывается на «рамку» (начало, разделитель, конец)
+# и фрагменты отдельных альбомов. В манифесте предыдущего запуска хранятся
+# хеши поддеревьев <album> и смещения их фрагментов в выходных файлах:
+# неизменённые фрагменты копируются из старого файла, XSLT запускается
+# только для новых и изменённых альбомов.
+
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+XSLT_DIR = os.path.join(BASE, "xslt")
+OUT_DIR = os.path.join(BASE, "out")
+
+# расширение выходного файла, XSLT, метод сериализации (как в main.py)
+FORMATS = (
+    ("txt", os.path.join(XSLT_DIR, "to_text.xslt"), "text"),
+    ("html", os.path.join(XSLT_DIR, "to_html.xslt"), "html"),
+    ("json", os.path.join(XSLT_DIR, "to_json.xslt"), "text"),
+)
+
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 1
+# сколько первых альбомов проверяется сравнением с цельным преобразованием
+PROBE_ALBUMS = 3
+COPY_CHUNK = 1 << 20
+
+_RENDERERS = {}
+
+
+class FragmentError(ValueError):
+    """Вывод XSLT не раскладывается на независимые фрагменты альбомов"""
+
+
+def album_digest(album):
+    return hashlib.sha1(etree.tostring(album, with_tail=False)).hexdigest()
+
+
+class FragmentRenderer:
+    def __init__(self, xslt_path, method="text"):
+        self.xslt_path = xslt_path
+        self.method = method
+        self.digest = file_digest(xslt_path).hex()
+        self.transform = etree.XSLT(etree.parse(xslt_path))
+
+    def render(self, root, albums, keep_text=False):
+        """Вывод XSLT (bytes, UTF-8) для корня root с указанными альбомами"""
+        doc = etree.Element(root.tag, attrib=dict(root.attrib), nsmap=root.nsmap)
+        if keep_text:
+            doc.text = root.text
+        for album in albums:
+            album = copy.deepcopy(album)
+            if not keep_text:
+                album.tail = None
+            doc.append(album)
+        return self.render_document(etree.ElementTree(doc))
+
+    def render_document(self, tree):
+        """Цельное преобразование документа, как transform_xml в main.py"""
+        result = self.transform(tree)
+        if self.method == "text":
+            return str(result).encode("utf-8")
+        return etree.tostring(result, encoding="utf-8", method=self.method)
+
+    def frame(self, root, albums):
+        """
+        (начало, разделитель, конец) вывода. Вывод для n альбомов должен быть
+        равен начало + разделитель.join(фрагменты) + конец — это проверяется
+        на первых альбомах каталога, иначе FragmentError.
+        """
+        probe = albums[0]
+        empty = self.render(root, [])
+        one = self.render(root, [probe])
+        two = self.render(root, [probe, probe])
+        found = None
+        # граница начала и конца внутри пустого вывода заранее неизвестна
+        for k in range(len(empty), -1, -1):
+            head, tail = empty[:k], empty[k:]
+            if not (one.startswith(head) and one.endswith(tail) and len(one) >= len(empty)):
+                continue
+            part = one[k:len(one) - len(tail)]
+            if not (two.startswith(head + part) and two.endswith(part + tail)):
+                continue
+            sep_end = len(two) - len(tail) - len(part)
+            if sep_end < k + len(part):
+                continue
+            found = head, two[k + len(part):sep_end], tail
+            break
+        if found is None:
+            raise FragmentError(f"{self.xslt_path}: вывод не делится на фрагменты альбомов")
+
+        head, sep, tail = found
+        sample = albums[:PROBE_ALBUMS]
+        expected = head + sep.join(self.fragment(root, a, found) for a in sample) + tail
+        if self.render(root, sample, keep_text=True) != expected:
+            raise FragmentError(f"{self.xslt_path}: фрагменты альбомов зависят от соседних альбомов")
+        return found
+
+    def fragment(self, root, album, frame):
+        head, _, tail = frame
+        out = self.render(root, [album])
+        if not (out.startswith(head) and out.endswith(tail)):
+            raise FragmentError(f"{self.xslt_path}: неожиданный вывод для альбома")
+        return out[len(head):len(out) - len(tail)]
+
+
+def get_renderer(xslt_path, method="text"):
+    # XSLT компилируется один раз на процесс и заново — если файл изменился
+    renderer = _RENDERERS.get((xslt_path, method))
+    if renderer is None or renderer.digest != file_digest(xslt_path).hex():
+        renderer = _RENDERERS[(xslt_path, method)] = FragmentRenderer(xslt_path, method)
+    return renderer
+
+
+def manifest_path(out_dir, base_name):
+    return os.path.join(out_dir, base_name + MANIFEST_SUFFIX)
+
+
+def load_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _reusable_spans(entry, hashes, renderer, out_path):
+    """hash альбома -> (start, end) в старом файле, если файл и XSLT не менялись"""
+    if not entry or entry.get("xslt") != renderer.digest:
+        return {}
+    try:
+        if _file_stamp(out_path) != entry.get("stamp"):
+            return {}
+    except OSError:
+        return {}
+    spans = entry.get("spans", [])
+    if len(spans) != len(hashes):
+        return {}
+    return {h: tuple(span) for h, span in zip(hashes, spans)}
+
+
+def _write_pieces(out_path, old_path, frame, pieces):
+    """
+    Пишет начало, фрагменты через разделитель и конец. pieces — bytes
+    (новый фрагмент) или (start, end) в старом файле; соседние куски старого
+    файла копируются одним блоком вместе с разделителем между ними.
+    Возвращает смещения фрагментов в новом файле.
+    """
+    head, sep, tail = frame
+    tmp = out_path + ".tmp"
+    spans = []
+    old = open(old_path, "rb") if old_path else None
+    try:
+        with open(tmp, "wb") as out:
+            pos = out.write(head)
+            run = None  # (start, end) в старом файле, ещё не скопированный
+
+            def flush():
+                old.seek(run[0])
+                left = run[1] - run[0]
+                while left > 0:
+                    chunk = old.read(min(COPY_CHUNK, left))
+                    if not chunk:
+                        raise OSError(f"{old_path}: файл короче, чем записано в манифесте")
+                    out.write(chunk)
+                    left -= len(chunk)
+
+            for i, piece in enumerate(pieces):
+                if i:
+                    pos += len(sep)
+                if not isinstance(piece, bytes) and run is not None and piece[0] == run[1] + len(sep):
+                    run = (run[0], piece[1])
+                    spans.append([pos, pos + piece[1] - piece[0]])
+                    pos += piece[1] - piece[0]
+                    continue
+                if run is not None:
+                    flush()
+                    run = None
+                if i:
+                    out.write(sep)
+                if isinstance(piece, bytes):
+                    out.write(piece)
+                    size = len(piece)
+                else:
+                    run = piece
+                    size = piece[1] - piece[0]
+                spans.append([pos, pos + size])
+                pos += size
+            if run is not None:
+                flush()
+            out.write(tail)
+    finally:
+        if old is not None:
+            old.close()
+    os.replace(tmp, out_path)
+    return spans
+
+
+def incremental_transform(xml_path, out_dir=OUT_DIR, base_name=None, formats=FORMATS, rebuild=False):
+    """
+    Пересобирает выходные файлы каталога. Возвращает статистику:
+    {"albums": N, "seconds": ..., "files": {расширение: {"path", "rendered", "reused", "incremental"}}}.
+    rebuild=True — не использовать результаты прошлого запуска.
+    """
+    started = time.perf_counter()
+    if base_name is None:
+        base_name = os.path.splitext(os.path.basename(xml_path))[0]
+    os.makedirs(out_dir, exist_ok=True)
+    m_path = manifest_path(out_dir, base_name)
+    manifest = None if rebuild else load_manifest(m_path)
+    old_formats = manifest.get("formats", {}) if manifest else {}
+
+    tree = etree.parse(xml_path)
+    root = tree.getroot()
+    albums = [el for el in root if el.tag == "album"]
+    hashes = [album_digest(a) for a in albums]
+    old_hashes = manifest.get("albums", []) if manifest else []
+
+    new_manifest = {"version": MANIFEST_VERSION, "albums": hashes, "formats": {}}
+    stats = {"albums": len(albums), "files": {}}
+    for ext, xslt_path, method in formats:
+        renderer = get_renderer(xslt_path, method)
+        out_path = os.path.join(out_dir, f"{base_name}.{ext}")
+        try:
+            if not albums or len(albums) != len(root):
+                raise FragmentError("в корне не только альбомы или их нет")
+            frame = renderer.frame(root, albums)
+        except FragmentError:
+            # рамку не выделить — пишем цельное преобразование без манифеста
+            data = renderer.render_document(tree)
+            _write_pieces(out_path, None, (data, b"", b""), [])
+            stats["files"][ext] = {"path": out_path, "rendered": len(albums), "reused": 0,
+                                   "incremental": False}
+            continue
+
+        known = _reusable_spans(old_formats.get(ext), old_hashes, renderer, out_path)
+        pieces = []
+        rendered = 0
+        cache = {}
+        for album, h in zip(albums, hashes):
+            if h in known:
+                pieces.append(known[h])
+                continue
+            if h not in cache:
+                cache[h] = renderer.fragment(root, album, frame)
+                rendered += 1
+            pieces.append(cache[h])
+        spans = _write_pieces(out_path, out_path if known else None, frame, pieces)
+        new_manifest["formats"][ext] = {
+            "xslt": renderer.digest,
+            "stamp": _file_stamp(out_path),
+            "spans": spans,
+        }
+        stats["files"][ext] = {"path": out_path, "rendered": rendered, "reused": len(albums) - rendered,
+                               "incremental": True}
+
+    tmp = m_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(new_manifest, f, separators=(",", ":"))
+    os.replace(tmp, m_path)
+    stats["seconds"] = round(time.perf_counter() - started, 6)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Инкрементальное XSLT-преобразование каталога альбомов")
+    parser.add_argument("xml", help="XML-каталог")
+    parser.add_argument("-o", "--out-dir", default=OUT_DIR)
+    parser.add_argument("--full", action="store_true", help="пересобрать всё, не глядя на манифест")
+    args = parser.parse_args()
+
+    stats = incremental_transform(os.path.abspath(args.xml), args.out_dir, rebuild=args.full)
+    json.dump(stats, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
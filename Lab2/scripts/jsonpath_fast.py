@@ -0,0 +1,88 @@
+import re
+from functools import lru_cache
+from jsonpath_ng import parse
+
+# Небольшой вычислитель JSONPath для простых путей вида "$[*]",
+# "$[*].tracks[*]", "$.field": путь компилируется один раз в цепочку
+# генераторов по обычным list/dict, без объектов DatumInContext.
+# Всё, что сложнее (фильтры, срезы, "..", индексы), уходит в jsonpath_ng.
+
+_STEP_RE = re.compile(r"""\.(?P<name>[A-Za-z_]\w*)|\[\*\]|\[(?P<q>['"])(?P<qname>[^'"\\]*)(?P=q)\]""")
+
+_MISSING = object()
+
+# Slice в jsonpath_ng до 1.6 пропускал любое ложное значение (0, "", {},
+# False), в новых версиях — только None. Проверяем установленную версию
+# один раз, чтобы результаты совпадали с ней.
+_WILDCARD_SKIPS_FALSY = not parse("$[*]").find(0)
+
+
+def _wildcard(values):
+    # Та же логика, что у Slice в jsonpath_ng: None (или любое ложное
+    # значение, см. выше) пропускается, словарь и скаляр считаются
+    # списком из одного элемента
+    for v in values:
+        if v is None or (_WILDCARD_SKIPS_FALSY and not v):
+            continue
+        if isinstance(v, list):
+            yield from v
+        elif isinstance(v, (dict, int, float, str, bool)):
+            yield v
+        else:
+            for i in range(len(v)):
+                yield v[i]
+
+
+def _field(name):
+    def step(values):
+        for v in values:
+            try:
+                value = v.get(name, _MISSING)
+            except (TypeError, AttributeError):
+                continue
+            if value is not _MISSING:
+                yield value
+    return step
+
+
+def _parse_simple(path):
+    """Список шагов для простого пути или None, если путь нужно отдать jsonpath_ng"""
+    if not path.startswith("$"):
+        return None
+    steps = []
+    pos = 1
+    while pos < len(path):
+        m = _STEP_RE.match(path, pos)
+        if m is None:
+            return None
+        if m.group("name") is not None:
+            steps.append(_field(m.group("name")))
+        elif m.group("qname") is not None:
+            steps.append(_field(m.group("qname")))
+        else:
+            steps.append(_wildcard)
+        pos = m.end()
+    return steps
+
+
+@lru_cache(maxsize=256)
+def compile_path(path):
+    """
+    Возвращает функцию data -> итератор значений.
+    Результат кэшируется, поэтому повторный вызов с тем же путём ничего не разбирает.
+    """
+    steps = _parse_simple(path)
+    if steps is None:
+        expr = parse(path)
+        return lambda data: (m.value for m in expr.find(data))
+
+    def run(data):
+        values = iter((data,))
+        for step in steps:
+            values = step(values)
+        return values
+    return run
+
+
+def find_values(path, data):
+    return compile_path(path)(data)
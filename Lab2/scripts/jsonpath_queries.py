@@ -1,7 +1,7 @@
 import json
 import os
 import random
-from jsonpath_ng import parse
+from jsonpath_fast import find_values
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 JSON_PATH = os.path.join(BASE_DIR, "out", "albums.json")
@@ -11,16 +11,14 @@ def load_json(path):
         return json.load(f)
 
 def a_albums_by_genre(data, genre):
-    expr = parse("$[*]")
-    return [a.value["title"] for a in expr.find(data) if genre in a.value.get("genres", [])]
+    return [a["title"] for a in find_values("$[*]", data) if genre in a.get("genres", [])]
 
 def b_genres_by_artist(data, artist):
-    expr = parse("$[*]")
     genres = set(
         g
-        for album in expr.find(data)
-        if artist in album.value.get("artists", [])
-        for g in album.value.get("genres", [])
+        for album in find_values("$[*]", data)
+        if artist in album.get("artists", [])
+        for g in album.get("genres", [])
     )
     return sorted(genres)
 
@@ -29,26 +27,23 @@ def parse_duration(dur_str):
     return mins * 60 + secs
 
 def c_albums_with_tracks_over_5min(data):
-    expr = parse("$[*]")
     result = []
-    for album in expr.find(data):
-        tracks = album.value.get("tracks", [])
+    for album in find_values("$[*]", data):
+        tracks = album.get("tracks", [])
         if any(parse_duration(t["duration"]) > 300 for t in tracks):
-            result.append(album.value["title"])
+            result.append(album["title"])
     return result
 
 def d_random_playlist(data, n):
-    expr = parse("$[*].tracks[*]")
-    all_tracks = [t.value for t in expr.find(data)]
+    all_tracks = list(find_values("$[*].tracks[*]", data))
     return random.sample(all_tracks, min(n, len(all_tracks)))
 
 def e_counts_per_album(data):
-    expr = parse("$[*]")
     out = []
-    for album in expr.find(data):
-        title = album.value["title"]
-        genre_count = len(album.value.get("genres", []))
-        track_count = len(album.value.get("tracks", []))
+    for album in find_values("$[*]", data):
+        title = album["title"]
+        genre_count = len(album.get("genres", []))
+        track_count = len(album.get("tracks", []))
         out.append((title, genre_count, track_count))
     return out
 
@@ -2,6 +2,9 @@ import os
 import json
 import random
 from lxml import etree
+from catalog_cache import load_catalog
+from playlist_sampler import reservoir_sample
+from incremental_build import incremental_transform
 
 # ---------- Цветной вывод ----------
 class Color:
@@ -28,6 +31,8 @@ os.makedirs(OUT_DIR, exist_ok=True)
 # Глобальная переменная для хранения текущего XML файла
 CURRENT_XML = None
 CURRENT_JSON = None
+# Разобранный каталог (из бинарного снимка рядом с XML)
+CURRENT_DATA = None
 
 # ---------- Функции XSLT ----------
 def transform_xml(xml_path, xslt_path, out_path, method="text"):
@@ -104,18 +109,20 @@ def albums_longer_than_5min(data):
     return result
 
 def random_playlist(data, n):
-    tracks = [
+    # Выборка из потока: словари создаются только для выбранных треков
+    tracks = ((album, track) for album in data for track in album.get("tracks", []))
+    chosen = reservoir_sample(tracks, n)
+    if n > len(chosen):
+        print(Color.YELLOW + f"\n⚠  Запрошено {n} треков, но доступно только {len(chosen)}." + Color.RESET)
+    random.shuffle(chosen)
+    return [
         {"album": album["title"], "title": track["title"], "duration": track["duration"]}
-        for album in data for track in album.get("tracks", [])
+        for album, track in chosen
     ]
-    if n > len(tracks):
-        print(Color.YELLOW + f"\n⚠  Запрошено {n} треков, но доступно только {len(tracks)}." + Color.RESET)
-        n = len(tracks)
-    return random.sample(tracks, n)
 
 def load_xml_file():
     """Загрузка XML файла"""
-    global CURRENT_XML, CURRENT_JSON
+    global CURRENT_XML, CURRENT_JSON, CURRENT_DATA
     
     print(Color.CYAN + "\n" + "─" * 50 + Color.RESET)
     print(Color.BOLD + Color.YELLOW + "📁 Загрузка XML файла" + Color.RESET)
@@ -138,7 +145,14 @@ def load_xml_file():
         print(Color.RED + "❌ Файл должен иметь расширение .xml" + Color.RESET)
         return False
     
+    try:
+        data = load_catalog(xml_path)
+    except Exception as e:
+        print(Color.RED + f"❌ Ошибка разбора каталога: {str(e)}" + Color.RESET)
+        return False
+    
     CURRENT_XML = xml_path
+    CURRENT_DATA = data
     # Формируем путь для JSON на основе имени XML файла
     base_name = os.path.splitext(os.path.basename(xml_path))[0]
     CURRENT_JSON = os.path.join(OUT_DIR, f"{base_name}.json")
@@ -148,7 +162,7 @@ def load_xml_file():
 
 # ---------- Главный цикл ----------
 def main():
-    global CURRENT_XML, CURRENT_JSON
+    global CURRENT_XML, CURRENT_JSON, CURRENT_DATA
     
     print(Color.BOLD + Color.MAGENTA + "\n" + "=" * 50)
     print("  🎵 СИСТЕМА УПРАВЛЕНИЯ МУЗЫКАЛЬНЫМИ АЛЬБОМАМИ 🎵")
@@ -191,24 +205,34 @@ def main():
             out_html = os.path.join(OUT_DIR, f"{base_name}.html")
             out_json = os.path.join(OUT_DIR, f"{base_name}.json")
             
-            transform_xml(CURRENT_XML, XSLT_TEXT, out_text, "text")
-            transform_xml(CURRENT_XML, XSLT_HTML, out_html, "html")
-            transform_xml(CURRENT_XML, XSLT_JSON, out_json, "text")
+            # Перерисовываются только изменённые с прошлого запуска альбомы
+            try:
+                stats = incremental_transform(CURRENT_XML, OUT_DIR, base_name)
+            except Exception as e:
+                print(Color.YELLOW + f"⚠  Инкрементальная сборка не удалась ({str(e)}), полное преобразование" + Color.RESET)
+                transform_xml(CURRENT_XML, XSLT_TEXT, out_text, "text")
+                transform_xml(CURRENT_XML, XSLT_HTML, out_html, "html")
+                transform_xml(CURRENT_XML, XSLT_JSON, out_json, "text")
+            else:
+                for info in stats["files"].values():
+                    print(Color.GREEN + f"✔ Создан файл: {info['path']}"
+                          f" (перерисовано альбомов: {info['rendered']} из {stats['albums']})" + Color.RESET)
             
             CURRENT_JSON = out_json
+            # Файл мог измениться с момента загрузки — снимок проверит это сам
+            try:
+                CURRENT_DATA = load_catalog(CURRENT_XML)
+            except Exception as e:
+                print(Color.RED + f"❌ Ошибка разбора каталога: {str(e)}" + Color.RESET)
 
         elif choice == "3":
             if not CURRENT_XML:
                 print(Color.RED + "\n❌ Сначала загрузите XML файл (пункт 1)!\n" + Color.RESET)
                 continue
                 
-            if not CURRENT_JSON or not os.path.exists(CURRENT_JSON):
-                print(Color.RED + "\n❌ JSON файл отсутствует. Выполните XSLT-преобразования (пункт 2)!\n" + Color.RESET)
-                continue
-
-            data = load_json(CURRENT_JSON)
+            data = CURRENT_DATA
             if data is None:
-                print(Color.RED + "\n❌ Ошибка чтения JSON.\n" + Color.RESET)
+                print(Color.RED + "\n❌ Каталог не разобран. Загрузите XML файл заново (пункт 1)!\n" + Color.RESET)
                 continue
 
             print(Color.BOLD + Color.CYAN + "\n" + "═" * 50 + Color.RESET)
@@ -0,0 +1,207 @@
+import math
+import random
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import chain, islice
+
+# Выборка случайных плейлистов без списка «всех треков».
+# PlaylistIndex хранит префиксные суммы числа треков по альбомам и
+# длительности в компактных массивах: номер трека переводится в
+# (альбом, позиция) бинарным поиском, словарь создаётся только для
+# попавших в плейлист треков. Для разовых выборок из потока —
+# reservoir_sample и stream_sample.
+
+
+def duration_seconds(d):
+    # "M:SS" / "MM:SS"; некорректное значение -> -1
+    try:
+        mins, secs = d.split(":")
+        return int(mins) * 60 + int(secs)
+    except (AttributeError, ValueError):
+        return -1
+
+
+_END = object()
+# столько подмножеств (жанр, исполнитель) PlaylistIndex держит готовыми
+SUBSET_CACHE_SIZE = 256
+
+
+def reservoir_sample(iterable, n, rng=random):
+    """
+    Равномерная выборка n элементов из потока за один проход (алгоритм L).
+    Если элементов меньше n, возвращает их все в исходном порядке.
+    """
+    it = iter(iterable)
+    reservoir = list(islice(it, n))
+    if n <= 0 or len(reservoir) < n:
+        return reservoir
+    w = math.exp(math.log(rng.random() or 5e-324) / n)
+    while True:
+        skip = math.floor(math.log(rng.random() or 5e-324) / math.log1p(-w))
+        nxt = next(islice(it, skip, None), _END)
+        if nxt is _END:
+            return reservoir
+        reservoir[rng.randrange(n)] = nxt
+        w *= math.exp(math.log(rng.random() or 5e-324) / n)
+
+
+def stream_sample(iterable, n, rng=random):
+    """
+    random.sample для потока: если элементов не больше n, возвращает
+    их все в исходном порядке, иначе n случайных в случайном порядке.
+    """
+    it = iter(iterable)
+    head = list(islice(it, n))
+    nxt = next(it, _END)
+    if n <= 0 or nxt is _END:
+        return head
+    chosen = reservoir_sample(chain(head, [nxt], it), n, rng)
+    rng.shuffle(chosen)
+    return chosen
+
+
+class _Subset:
+    """Альбомы, прошедшие фильтр, и префиксные суммы их треков"""
+    __slots__ = ("albums", "prefix")
+
+    def __init__(self, albums, counts):
+        self.albums = albums
+        self.prefix = array("q", [0])
+        total = 0
+        for i in albums:
+            total += counts[i]
+            self.prefix.append(total)
+
+    @property
+    def total(self):
+        return self.prefix[-1]
+
+
+class PlaylistIndex:
+    def __init__(self, data):
+        """data — каталог в JSON-виде (список альбомов, как в out/albums.json)"""
+        self.data = data
+        self._counts = array("l")
+        # offsets[i] — номер первого трека альбома i в общей нумерации
+        self._offsets = array("q", [0])
+        self._durations = array("l")
+        self._by_genre = {}
+        self._by_artist = {}
+        # LRU: (жанр, исполнитель) -> _Subset
+        self._subsets = OrderedDict()
+
+        for i, album in enumerate(data):
+            tracks = album.get("tracks", [])
+            self._counts.append(len(tracks))
+            self._offsets.append(self._offsets[-1] + len(tracks))
+            self._durations.extend(duration_seconds(t.get("duration")) for t in tracks)
+            for g in {g.strip().lower() for g in album.get("genres", [])}:
+                self._by_genre.setdefault(g, array("l")).append(i)
+            for a in {a.strip().lower() for a in album.get("artists", [])}:
+                self._by_artist.setdefault(a, array("l")).append(i)
+
+        self._all = _Subset(range(len(data)), self._counts)
+
+    @property
+    def total_tracks(self):
+        return self._offsets[-1]
+
+    def _subset(self, genre=None, artist=None):
+        genre = genre.strip().lower() if genre else None
+        artist = artist.strip().lower() if artist else None
+        if genre is None and artist is None:
+            return self._all
+        key = (genre, artist)
+        subset = self._subsets.get(key)
+        if subset is not None:
+            self._subsets.move_to_end(key)
+        else:
+            albums = None
+            if genre is not None:
+                albums = self._by_genre.get(genre, array("l"))
+            if artist is not None:
+                by_artist = self._by_artist.get(artist, array("l"))
+                if albums is None:
+                    albums = by_artist
+                else:
+                    allowed = set(by_artist)
+                    albums = array("l", (i for i in albums if i in allowed))
+            subset = self._subsets[key] = _Subset(albums, self._counts)
+            if len(self._subsets) > SUBSET_CACHE_SIZE:
+                self._subsets.popitem(last=False)
+        return subset
+
+    def _locate(self, subset, pos):
+        """Номер трека в подмножестве -> (альбом, номер трека в альбоме)"""
+        k = bisect_right(subset.prefix, pos) - 1
+        return subset.albums[k], pos - subset.prefix[k]
+
+    def track(self, album_idx, track_idx):
+        album = self.data[album_idx]
+        t = album["tracks"][track_idx]
+        return {"album": album["title"], "title": t["title"], "duration": t["duration"]}
+
+    def count(self, genre=None, artist=None):
+        return self._subset(genre, artist).total
+
+    def sample(self, n, genre=None, artist=None, rng=random):
+        """n случайных треков без повторов (меньше, если столько нет)"""
+        subset = self._subset(genre, artist)
+        n = min(n, subset.total)
+        positions = rng.sample(range(subset.total), n)
+        return [self.track(*self._locate(subset, p)) for p in positions]
+
+    def sample_duration(self, target_seconds, n=None, tolerance=60, genre=None, artist=None,
+                        rng=random, max_steps=2000):
+        """
+        Плейлист суммарной длительностью около target_seconds (±tolerance).
+        Если задан n — ровно n треков, подбор улучшается случайными заменами;
+        иначе треки добавляются, пока сумма не попадёт в допуск.
+        """
+        subset = self._subset(genre, artist)
+        if subset.total == 0:
+            return []
+
+        def draw():
+            album_idx, track_idx = self._locate(subset, rng.randrange(subset.total))
+            return album_idx, track_idx, self._durations[self._offsets[album_idx] + track_idx]
+
+        chosen = {}
+        total = 0
+        steps = 0
+        if n is None:
+            # жадно добираем треки, пока очередной трек ещё помещается в допуск
+            misses = 0
+            while misses < 50 and steps < max_steps and abs(total - target_seconds) > tolerance:
+                steps += 1
+                a, t, d = draw()
+                if d < 0 or (a, t) in chosen or total + d > target_seconds + tolerance:
+                    misses += 1
+                    continue
+                misses = 0
+                chosen[(a, t)] = d
+                total += d
+        else:
+            n = min(n, subset.total)
+            while len(chosen) < n:
+                a, t, d = draw()
+                if (a, t) not in chosen:
+                    chosen[(a, t)] = max(d, 0)
+                    total += max(d, 0)
+
+        # доводим сумму случайными заменами, число треков не меняется
+        keys = list(chosen)
+        while keys and steps < max_steps and abs(total - target_seconds) > tolerance:
+            steps += 1
+            j = rng.randrange(len(keys))
+            a, t, d = draw()
+            if d < 0 or (a, t) in chosen:
+                continue
+            new_total = total - chosen[keys[j]] + d
+            if abs(new_total - target_seconds) < abs(total - target_seconds):
+                del chosen[keys[j]]
+                chosen[(a, t)] = d
+                keys[j] = (a, t)
+                total = new_total
+        return [self.track(a, t) for a, t in chosen]
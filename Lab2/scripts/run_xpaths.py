@@ -1,6 +1,6 @@
 import os
-import random
 from lxml import etree
+from playlist_sampler import stream_sample
 
 # Путь к XML
 BASE = os.path.dirname(os.path.dirname(__file__))  # lab2
@@ -40,18 +40,16 @@ def c_albums_with_tracks_over_5min(tree):
     return result
 
 def d_random_playlist(tree, n):
-    # Получаем все треки как (album_title, track_title, duration)
+    # Выбираем n пар (альбом, трек) из потока, поля читаем только у выбранных
+    pairs = ((a, t) for a in tree.xpath('//album') for t in a.xpath('tracks/track'))
+    chosen = stream_sample(pairs, n)
     tracks = []
-    albums = tree.xpath('//album')
-    for a in albums:
+    for a, t in chosen:
         album_title = a.xpath('title/text()')[0]
-        for t in a.xpath('tracks/track'):
-            t_title = t.xpath('title/text()')[0]
-            t_dur = t.xpath('duration/text()')[0]
-            tracks.append({"album": album_title, "title": t_title, "duration": t_dur})
-    if n >= len(tracks):
-        return tracks
-    return random.sample(tracks, n)
+        t_title = t.xpath('title/text()')[0]
+        t_dur = t.xpath('duration/text()')[0]
+        tracks.append({"album": album_title, "title": t_title, "duration": t_dur})
+    return tracks
 
 def e_counts_per_album(tree):
     albums = tree.xpath('//album')
@@ -0,0 +1,148 @@
+import argparse
+import copy
+import gzip
+import json
+import os
+import sys
+import time
+from lxml import etree
+from incremental_build import FORMATS, OUT_DIR, PROBE_ALBUMS, FragmentError, get_renderer
+
+# Потоковая запись отчётов (txt / html / json) без дерева результата целиком.
+# Каталог читается через iterparse, каждый альбом преобразуется тем же XSLT
+# отдельно (см. FragmentRenderer в incremental_build.py), и его фрагмент сразу
+# пишется в файл между «рамкой» документа. Отчёт можно разбить на страницы
+# по N альбомов и писать в gzip; память не зависит от размера вывода.
+
+
+def page_path(out_dir, base_name, ext, page=None, compress=False):
+    name = f"{base_name}.{ext}" if page is None else f"{base_name}.{page:03d}.{ext}"
+    return os.path.join(out_dir, name + (".gz" if compress else ""))
+
+
+def open_output(path, compress=False):
+    if compress:
+        return gzip.open(path, "wb", compresslevel=6)
+    return open(path, "wb")
+
+
+def render_stream(xml_path, renderer, open_page, page_size=0):
+    """
+    Пишет отчёт по альбомам каталога. open_page(номер страницы) возвращает
+    бинарный файл; page_size=0 — всё в одну страницу.
+    Возвращает (число альбомов, число страниц).
+    """
+    frame = None
+    pending = []  # первые альбомы, пока не выделена рамка
+    out = None
+    pages = 0
+    on_page = 0
+    count = 0
+    root = None
+
+    def write_album(album):
+        nonlocal out, pages, on_page
+        if out is not None and page_size and on_page == page_size:
+            out.write(frame[2])
+            out.close()
+            out = None
+        if out is None:
+            pages += 1
+            out = open_page(pages)
+            out.write(frame[0])
+            on_page = 0
+        if on_page:
+            out.write(frame[1])
+        out.write(renderer.fragment(root, album, frame))
+        on_page += 1
+
+    try:
+        depth = 0
+        for event, elem in etree.iterparse(xml_path, events=("start", "end")):
+            if event == "start":
+                if depth == 0:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            if elem.tag != "album":
+                raise FragmentError(f"{xml_path}: в корне неожиданный элемент <{elem.tag}>")
+            count += 1
+            if frame is None:
+                pending.append(copy.deepcopy(elem))
+                if len(pending) == PROBE_ALBUMS:
+                    frame = renderer.frame(root, pending)
+                    for album in pending:
+                        write_album(album)
+                    pending = []
+            else:
+                write_album(elem)
+            elem.clear()
+            while elem.getprevious() is not None:
+                del root[0]
+
+        if frame is None and pending:
+            frame = renderer.frame(root, pending)
+            for album in pending:
+                write_album(album)
+        if out is not None:
+            out.write(frame[2])
+        elif root is not None:
+            # пустой каталог — одна страница с цельным преобразованием
+            pages = 1
+            out = open_page(pages)
+            out.write(renderer.render(root, []))
+    finally:
+        if out is not None:
+            out.close()
+    return count, pages
+
+
+def render_report(xml_path, ext="html", out_dir=OUT_DIR, page_size=0, compress=False, base_name=None):
+    """Отчёт формата ext ("txt", "html", "json") в out_dir; возвращает пути файлов"""
+    formats = {e: (xslt, method) for e, xslt, method in FORMATS}
+    if ext not in formats:
+        raise ValueError(f"неизвестный формат: {ext!r} (доступны: {', '.join(formats)})")
+    renderer = get_renderer(*formats[ext])
+    if base_name is None:
+        base_name = os.path.splitext(os.path.basename(xml_path))[0]
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+
+    def open_page(page):
+        path = page_path(out_dir, base_name, ext, page if page_size else None, compress)
+        paths.append(path)
+        return open_output(path, compress)
+
+    render_stream(xml_path, renderer, open_page, page_size)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Потоковая запись отчётов по каталогу альбомов")
+    parser.add_argument("xml", help="XML-каталог")
+    parser.add_argument("-f", "--format", nargs="+", default=["html", "txt"],
+                        choices=[ext for ext, _, _ in FORMATS])
+    parser.add_argument("-o", "--out-dir", default=OUT_DIR)
+    parser.add_argument("-n", "--page-size", type=int, default=0, help="альбомов на файл (0 — один файл)")
+    parser.add_argument("--gzip", action="store_true", help="сжимать файлы (.gz)")
+    args = parser.parse_args()
+
+    report = {}
+    for ext in args.format:
+        started = time.perf_counter()
+        try:
+            paths = render_report(os.path.abspath(args.xml), ext, args.out_dir, args.page_size, args.gzip)
+        except (OSError, etree.Error, FragmentError) as e:
+            report[ext] = {"error": str(e)}
+            continue
+        report[ext] = {"files": paths, "seconds": round(time.perf_counter() - started, 6)}
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    return 1 if any("error" in r for r in report.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
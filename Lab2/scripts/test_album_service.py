@@ -0,0 +1,26 @@
+import io
+import json
+
+from album_service import AlbumService, run_batch
+
+DATA = [
+    {"title": "OK Computer", "artists": ["Radiohead"], "genres": ["Alternative Rock"],
+     "tracks": [{"title": "Airbag", "duration": "4:44"}, {"title": "Paranoid Android", "duration": "6:23"}]},
+]
+
+
+def test_bad_queries_are_rejected_one_by_one():
+    lines = [
+        '{"op": "genre", "genre": null}',
+        '{"op": "genre", "genre": 5}',
+        '{"op": "artist", "artist": ["Radiohead"]}',
+        '{"op": "playlist", "n": 1, "genre": 7}',
+        '{"op": "artist"}',
+        '{"op": "genre", "genre": "alternative rock"}',
+    ]
+    out = io.StringIO()
+    assert run_batch(AlbumService(DATA), lines, out) == 5
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [("error" in r) for r in records] == [True] * 5 + [False]
+    assert "строкой" in records[0]["error"]
+    assert records[-1]["result"] == ["OK Computer"]
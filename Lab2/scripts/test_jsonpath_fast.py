@@ -0,0 +1,42 @@
+import random
+
+import pytest
+from jsonpath_ng import parse
+
+import jsonpath_fast
+from jsonpath_fast import compile_path
+
+PATHS = ["$[*]", "$[*].tracks[*]", "$[*].tracks[*].title", "$.title", "$[*]['genres'][*]"]
+FALSY = [0, "", {}, [], False, None, 0.0]
+
+
+def _random_value(rng, depth=0):
+    kind = rng.random()
+    if depth > 2 or kind < 0.4:
+        return rng.choice(FALSY + [1, "x", True, 2.5])
+    if kind < 0.7:
+        return [_random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    keys = ["title", "tracks", "genres", "other"]
+    return {k: _random_value(rng, depth + 1) for k in rng.sample(keys, rng.randint(0, 4))}
+
+
+def _reference(path, data):
+    return [m.value for m in parse(path).find(data)]
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_matches_jsonpath_ng_on_falsy_values(path):
+    rng = random.Random(path)
+    for _ in range(500):
+        data = _random_value(rng)
+        assert list(compile_path(path)(data)) == _reference(path, data), data
+
+
+@pytest.mark.parametrize("skip_falsy", [False, True])
+def test_wildcard_follows_both_slice_semantics(monkeypatch, skip_falsy):
+    monkeypatch.setattr(jsonpath_fast, "_WILDCARD_SKIPS_FALSY", skip_falsy)
+    result = list(jsonpath_fast._wildcard([[1], 0, "", None, {"a": 1}]))
+    if skip_falsy:
+        assert result == [1, {"a": 1}]
+    else:
+        assert result == [1, 0, "", {"a": 1}]
@@ -0,0 +1,73 @@
+import random
+from collections import Counter
+
+import playlist_sampler
+from playlist_sampler import PlaylistIndex, duration_seconds, stream_sample
+
+
+def test_stream_sample_keeps_order_when_n_covers_stream():
+    items = list(range(10))
+    assert stream_sample(iter(items), 10) == items
+    assert stream_sample(iter(items), 15) == items
+    assert stream_sample(iter(items), 0) == []
+
+
+def test_stream_sample_picks_distinct_items():
+    rng = random.Random(1)
+    chosen = stream_sample(iter(range(100)), 10, rng)
+    assert len(chosen) == 10
+    assert len(set(chosen)) == 10
+    assert all(0 <= x < 100 for x in chosen)
+
+
+def _catalog():
+    # неравные альбомы: выборка должна быть равномерной по трекам, а не по альбомам
+    albums = []
+    for i, (count, genre) in enumerate([(1, "Rock"), (2, "Pop"), (7, "Rock")]):
+        albums.append({
+            "title": f"A{i}", "genres": [genre], "artists": [f"artist {i}"],
+            "tracks": [{"title": f"A{i}-{j}", "duration": f"{2 + j % 3}:00"} for j in range(count)],
+        })
+    return albums
+
+
+def test_sample_is_uniform_over_tracks():
+    index = PlaylistIndex(_catalog())
+    rng = random.Random(7)
+    draws = 20000
+    counts = Counter(t["title"] for _ in range(draws) for t in index.sample(1, rng=rng))
+    assert len(counts) == 10
+    assert all(abs(c - draws / 10) < draws / 10 * 0.1 for c in counts.values())
+
+
+def test_sample_respects_filter_and_size():
+    index = PlaylistIndex(_catalog())
+    rock = index.sample(100, genre=" rock ")
+    assert len(rock) == 8
+    assert len({t["title"] for t in rock}) == 8
+    assert {t["album"] for t in rock} == {"A0", "A2"}
+    assert index.sample(3, genre="jazz") == []
+
+
+def test_sample_duration_stays_within_tolerance():
+    index = PlaylistIndex(_catalog())
+    for seed in range(20):
+        rng = random.Random(seed)
+        playlist = index.sample_duration(15 * 60, tolerance=60, rng=rng)
+        total = sum(duration_seconds(t["duration"]) for t in playlist)
+        assert abs(total - 15 * 60) <= 60
+        assert len({t["title"] for t in playlist}) == len(playlist)
+
+        playlist = index.sample_duration(12 * 60, n=4, tolerance=0, rng=rng)
+        assert len(playlist) == 4
+        assert sum(duration_seconds(t["duration"]) for t in playlist) == 12 * 60
+
+
+def test_subset_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(playlist_sampler, "SUBSET_CACHE_SIZE", 2)
+    index = PlaylistIndex(_catalog())
+    for genre in ("rock", "pop", "jazz", "rock"):
+        index.count(genre=genre)
+    assert list(index._subsets) == [("jazz", None), ("rock", None)]
+    assert index.count(genre="rock") == 8
+    assert index.count() == 10
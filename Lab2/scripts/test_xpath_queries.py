@@ -0,0 +1,24 @@
+from lxml import etree
+
+import run_xpaths
+from xpath_queries import c_albums_with_tracks_over_5min, e_counts_per_album, iter_albums
+
+XML = b"""<albums><album><title>A</title><genres><genre>Rock</genre></genres><tracks>
+<track><duration>6:00</duration><title>late title</title></track>
+<track><duration>1:00</duration></track>
+<track><title>no duration</title></track>
+<track/>
+</tracks></album></albums>"""
+
+
+def test_iter_albums_tolerates_missing_and_reordered_track_fields():
+    tree = etree.fromstring(XML).getroottree()
+    assert list(iter_albums(tree)) == [
+        ("A", 1, [["late title", "6:00"], [None, "1:00"], ["no duration", None], [None, None]]),
+    ]
+    assert c_albums_with_tracks_over_5min(tree) == ["A"]
+
+
+def test_counts_match_baseline_query():
+    tree = etree.fromstring(XML.replace(b"<genre>Rock</genre>", b"")).getroottree()
+    assert e_counts_per_album(tree) == run_xpaths.e_counts_per_album(tree) == [("A", 0, 4)]
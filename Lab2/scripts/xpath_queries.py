@@ -0,0 +1,122 @@
+import os
+from lxml import etree
+from playlist_sampler import stream_sample
+
+# Те же запросы, что и в run_xpaths.py, но на заранее скомпилированных
+# выражениях: значения передаются через XPath-переменные ($genre, $artist),
+# поэтому кавычки в названиях не ломают запрос, а выражение не компилируется
+# заново при каждом вызове.
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # lab2
+XML_PATH = os.path.join(BASE, "albums.xml")
+
+ALBUMS_BY_GENRE = etree.XPath("//album[genres/genre = $genre]/title/text()")
+GENRES_BY_ARTIST = etree.XPath("//album[artists/artist = $artist]/genres/genre/text()")
+
+ALBUMS = etree.XPath("//album")
+# Все нужные поля альбома одним запросом (в порядке документа).
+# Выражение относительное и вычисляется один раз на альбом: объединение
+# по всему документу («//album/title | ...») в libxml2 работает квадратично.
+ALBUM_FIELDS = etree.XPath("title | genres/genre | tracks/track | tracks/track/title | tracks/track/duration")
+
+
+def parse_xml(path):
+    return etree.parse(path)
+
+
+def a_albums_by_genre(tree, genre):
+    return ALBUMS_BY_GENRE(tree, genre=genre)
+
+
+def b_genres_by_artist(tree, artist):
+    return GENRES_BY_ARTIST(tree, artist=artist)
+
+
+def iter_albums(tree):
+    """
+    Один запрос на альбом вместо N×3: для каждого альбома отдаёт
+    (название, число жанров, [(название трека, длительность), ...])
+    """
+    for a in ALBUMS(tree):
+        title = None
+        genre_count = 0
+        tracks = []
+        for el in ALBUM_FIELDS(a):
+            tag = el.tag
+            if tag == "genre":
+                genre_count += 1
+            elif tag == "track":
+                # <track> идёт раньше своих полей, любое из которых может отсутствовать
+                tracks.append([None, None])
+            elif el.getparent() is a:
+                title = el.text
+            else:
+                tracks[-1][tag == "duration"] = el.text
+        yield title, genre_count, tracks
+
+
+def duration_seconds(d):
+    # d формат "M:SS" или "MM:SS"; некорректные значения -> None
+    try:
+        mins, secs = d.split(":")
+        return int(mins) * 60 + int(secs)
+    except (AttributeError, ValueError):
+        return None
+
+
+def c_albums_with_tracks_over_5min(tree):
+    result = []
+    for title, _, tracks in iter_albums(tree):
+        for _, d in tracks:
+            secs = duration_seconds(d)
+            if secs is not None and secs > 5 * 60:
+                result.append(title)
+                break
+    return result
+
+
+def d_random_playlist(tree, n):
+    pairs = (
+        (album_title, track)
+        for album_title, _, album_tracks in iter_albums(tree)
+        for track in album_tracks
+    )
+    chosen = stream_sample(pairs, n)
+    return [{"album": album_title, "title": t_title, "duration": t_dur}
+            for album_title, (t_title, t_dur) in chosen]
+
+
+def e_counts_per_album(tree):
+    return [(title, genre_count, len(tracks)) for title, genre_count, tracks in iter_albums(tree)]
+
+
+def main():
+    tree = parse_xml(XML_PATH)
+    print("XML parsed:", XML_PATH)
+
+    genre = "Alternative Rock"
+    print(f"\n(a) Альбомы жанра '{genre}':")
+    for t in a_albums_by_genre(tree, genre):
+        print(" -", t)
+
+    artist = "Radiohead"
+    print(f"\n(b) Жанры, в которых работал исполнитель '{artist}':")
+    for g in sorted(set(b_genres_by_artist(tree, artist))):
+        print(" -", g)
+
+    print("\n(c) Альбомы с треками длиннее 5 минут:")
+    for a in c_albums_with_tracks_over_5min(tree):
+        print(" -", a)
+
+    N = 5
+    print(f"\n(d) Случайный плейлист из {N} композиций:")
+    for t in d_random_playlist(tree, N):
+        print(f" - {t['title']} ({t['duration']}) — из '{t['album']}'")
+
+    print("\n(e) Для каждого альбома: (название, число жанров, число треков):")
+    for title, gcount, tcount in e_counts_per_album(tree):
+        print(f" - {title}: genres={gcount}, tracks={tcount}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import struct
+import zipfile
+import zlib
+
+# Шаблон .docx в памяти: все члены ZIP хранятся как есть (сжатые байты,
+# CRC и размеры из центрального каталога). При записи копии неизменённые
+# части переносятся без распаковки и повторного сжатия, сжимаются только
+# переданные замены (обычно один word/document.xml). Выходной поток пишется
+# последовательно, поэтому подходит и файл, и BytesIO, и сокет.
+# Очень большие части можно читать (open) и писать (замена-функция)
+# потоково, не держа распакованное содержимое в памяти.
+
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+DATA_DESCRIPTOR = struct.Struct("<4s3L")
+
+LOCAL_SIG = b"PK\x03\x04"
+CENTRAL_SIG = b"PK\x01\x02"
+END_SIG = b"PK\x05\x06"
+DESCRIPTOR_SIG = b"PK\x07\x08"
+
+VERSION = 20
+FLAG_UTF8 = 0x800
+# бит 3: размеры и CRC после данных; копии пишутся с размерами в заголовке,
+# дескриптор нужен только частям, сжимаемым потоково
+FLAG_DATA_DESCRIPTOR = 0x08
+ZIP32_LIMIT = 0xFFFFFFFF
+
+DOCUMENT_XML = "word/document.xml"
+
+
+class Member:
+    __slots__ = ("name", "method", "flags", "date_time", "crc", "compress_size", "file_size",
+                 "external_attr", "data")
+
+    def __init__(self, name, method, flags, date_time, crc, compress_size, file_size, external_attr, data):
+        self.name = name
+        self.method = method
+        self.flags = flags
+        self.date_time = date_time
+        self.crc = crc
+        self.compress_size = compress_size
+        self.file_size = file_size
+        self.external_attr = external_attr
+        self.data = data
+
+
+def _dos_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+def _read_raw(f, info):
+    """Сжатые данные члена архива без распаковки"""
+    f.seek(info.header_offset)
+    header = f.read(LOCAL_HEADER.size)
+    fields = LOCAL_HEADER.unpack(header)
+    if fields[0] != LOCAL_SIG:
+        raise zipfile.BadZipFile(f"{info.filename}: неверный локальный заголовок")
+    name_len, extra_len = fields[9], fields[10]
+    f.seek(name_len + extra_len, 1)
+    data = f.read(info.compress_size)
+    if len(data) != info.compress_size:
+        raise zipfile.BadZipFile(f"{info.filename}: архив обрезан")
+    return data
+
+
+class DocxTemplate:
+    def __init__(self, source):
+        """source — путь или бинарный файл с .docx"""
+        self.members = []
+        with zipfile.ZipFile(source, "r") as z:
+            f = z.fp
+            for info in z.infolist():
+                if info.flag_bits & 0x1:
+                    raise zipfile.BadZipFile(f"{info.filename}: зашифрованные архивы не поддерживаются")
+                self.members.append(Member(
+                    info.filename, info.compress_type, info.flag_bits & ~FLAG_DATA_DESCRIPTOR,
+                    info.date_time, info.CRC, info.compress_size, info.file_size,
+                    info.external_attr, _read_raw(f, info),
+                ))
+        self._by_name = {m.name: m for m in self.members}
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def read(self, name):
+        """Распакованное содержимое члена архива"""
+        m = self._by_name[name]
+        if m.method == zipfile.ZIP_STORED:
+            return m.data
+        if m.method == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(m.data, -15)
+        raise zipfile.BadZipFile(f"{name}: метод сжатия {m.method} не поддерживается")
+
+    def open(self, name):
+        """Поток для чтения распакованного содержимого (без распаковки целиком)"""
+        m = self._by_name[name]
+        if m.method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise zipfile.BadZipFile(f"{name}: метод сжатия {m.method} не поддерживается")
+        return _InflateReader(m.data, m.method)
+
+    def write(self, out, replacements=None, level=6):
+        """
+        Пишет архив в бинарный поток out. replacements — {имя: bytes}
+        для изменённых частей, остальные копируются как есть. Вместо bytes
+        можно передать функцию produce(sink): она пишет содержимое части
+        в sink.write() кусками, и часть сжимается на лету.
+        Возвращает число записанных байт.
+        """
+        replacements = dict(replacements or {})
+        unknown = set(replacements) - set(self._by_name)
+        if unknown:
+            raise KeyError(f"в шаблоне нет частей: {', '.join(sorted(unknown))}")
+
+        pos = 0
+        central = []
+        for m in self.members:
+            replacement = replacements.get(m.name)
+            if callable(replacement):
+                m, size = _write_streamed(out, m, replacement, level, pos)
+                central.append(_central_record(m, pos))
+                pos += size
+                continue
+            if replacement is not None:
+                m = _deflated(m, replacement, level)
+            name, flags = _encoded_name(m)
+            dos_time, dos_date = _dos_time(m.date_time)
+            if pos > ZIP32_LIMIT or m.compress_size > ZIP32_LIMIT or m.file_size > ZIP32_LIMIT:
+                raise zipfile.LargeZipFile("ZIP64 не поддерживается")
+            out.write(LOCAL_HEADER.pack(LOCAL_SIG, VERSION, flags, m.method, dos_time, dos_date,
+                                        m.crc, m.compress_size, m.file_size, len(name), 0))
+            out.write(name)
+            out.write(m.data)
+            central.append(_central_record(m, pos))
+            pos += LOCAL_HEADER.size + len(name) + len(m.data)
+
+        cd_size = sum(len(c) for c in central)
+        for c in central:
+            out.write(c)
+        out.write(END_RECORD.pack(END_SIG, 0, 0, len(central), len(central), cd_size, pos, 0))
+        return pos + cd_size + END_RECORD.size
+
+
+def _deflated(m, data, level):
+    c = zlib.compressobj(level, zlib.DEFLATED, -15)
+    packed = c.compress(data) + c.flush()
+    return Member(m.name, zipfile.ZIP_DEFLATED, m.flags & ~0x6, m.date_time, zlib.crc32(data),
+                  len(packed), len(data), m.external_attr, packed)
+
+
+def _encoded_name(m):
+    flags = m.flags | FLAG_UTF8 if not m.name.isascii() else m.flags
+    return m.name.encode("utf-8"), flags
+
+
+def _central_record(m, offset):
+    name, flags = _encoded_name(m)
+    dos_time, dos_date = _dos_time(m.date_time)
+    return CENTRAL_HEADER.pack(CENTRAL_SIG, VERSION, VERSION, flags, m.method, dos_time, dos_date,
+                               m.crc, m.compress_size, m.file_size, len(name),
+                               0, 0, 0, 0, m.external_attr, offset) + name
+
+
+class _DeflateSink:
+    """Сжимает записываемые куски сразу в выходной поток"""
+
+    def __init__(self, out, level):
+        self.out = out
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        self.crc = 0
+        self.file_size = 0
+        self.compress_size = 0
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.file_size += len(data)
+        packed = self.compressor.compress(data)
+        if packed:
+            self.out.write(packed)
+            self.compress_size += len(packed)
+        return len(data)
+
+    def close(self):
+        packed = self.compressor.flush()
+        self.out.write(packed)
+        self.compress_size += len(packed)
+
+
+def _write_streamed(out, m, produce, level, offset):
+    """
+    Часть, содержимое которой пишет produce(sink). Размеры заранее неизвестны,
+    поэтому CRC и размеры идут в дескрипторе данных после сжатых байт.
+    """
+    flags = (m.flags & ~0x6) | FLAG_DATA_DESCRIPTOR
+    m = Member(m.name, zipfile.ZIP_DEFLATED, flags, m.date_time, 0, 0, 0, m.external_attr, b"")
+    name, flags = _encoded_name(m)
+    dos_time, dos_date = _dos_time(m.date_time)
+    out.write(LOCAL_HEADER.pack(LOCAL_SIG, VERSION, flags, m.method, dos_time, dos_date,
+                                0, 0, 0, len(name), 0))
+    out.write(name)
+    sink = _DeflateSink(out, level)
+    produce(sink)
+    sink.close()
+    if offset > ZIP32_LIMIT or sink.compress_size > ZIP32_LIMIT or sink.file_size > ZIP32_LIMIT:
+        raise zipfile.LargeZipFile("ZIP64 не поддерживается")
+    m.crc, m.compress_size, m.file_size = sink.crc, sink.compress_size, sink.file_size
+    out.write(DATA_DESCRIPTOR.pack(DESCRIPTOR_SIG, m.crc, m.compress_size, m.file_size))
+    return m, LOCAL_HEADER.size + len(name) + m.compress_size + DATA_DESCRIPTOR.size
+
+
+class _InflateReader:
+    """Файлоподобный объект: распаковывает сжатые байты по мере чтения"""
+
+    def __init__(self, data, method, chunk=1 << 16):
+        self.data = data
+        self.pos = 0
+        self.chunk = chunk
+        self.inflater = zlib.decompressobj(-15) if method == zipfile.ZIP_DEFLATED else None
+        self.buffer = b""
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            parts = [self.buffer]
+            self.buffer = b""
+            while True:
+                part = self._next()
+                if not part:
+                    return b"".join(parts)
+                parts.append(part)
+        while len(self.buffer) < size:
+            part = self._next()
+            if not part:
+                break
+            self.buffer += part
+        res, self.buffer = self.buffer[:size], self.buffer[size:]
+        return res
+
+    def _next(self):
+        while self.pos < len(self.data):
+            raw = self.data[self.pos:self.pos + self.chunk]
+            self.pos += len(raw)
+            if self.inflater is None:
+                return raw
+            out = self.inflater.decompress(raw)
+            if out:
+                return out
+        if self.inflater is not None:
+            return self.inflater.flush()
+        return b""
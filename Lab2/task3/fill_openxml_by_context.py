@@ -1,31 +1,50 @@
+import argparse
+import csv
+import hashlib
+import json
+import re
+import sys
+import time
 import zipfile
-import shutil
 import os
+from concurrent.futures import ProcessPoolExecutor
 from lxml import etree
+from docx_package import DOCUMENT_XML, DocxTemplate
 
 INPUT_DOCX = "ПП.docx"          # исходный
 OUTPUT_DOCX = "ПП_filled.docx"  # результат
-TMP_DIR = "tmp_docx"
-
-
-
-def unzip_docx(path, outdir):
-    if os.path.exists(outdir):
-        shutil.rmtree(outdir)
-    os.makedirs(outdir)
-    with zipfile.ZipFile(path, 'r') as z:
-        z.extractall(outdir)
-
-def zip_dir_to_docx(dirpath, outpath):
-    with zipfile.ZipFile(outpath, 'w', zipfile.ZIP_DEFLATED) as z:
-        for folder, _, files in os.walk(dirpath):
-            for f in files:
-                file_path = os.path.join(folder, f)
-                archive_name = os.path.relpath(file_path, dirpath)
-                z.write(file_path, archive_name)
-
-def get_document_xml_path(tmp_dir):
-    return os.path.join(tmp_dir, "word", "document.xml")
+BATCH_OUT_DIR = "filled"
+
+DIRECTIONS = {
+    "1": "09.03.04",
+    "2": "38.03.05"
+}
+PRACTICE_TYPES = {
+    "1": "Научно-исследовательская",
+    "2": "Проектная"
+}
+# Якоря шаблона
+ANCHOR_COURSE = "Выдано студенту"
+ANCHOR_GROUP = "группы"
+ANCHOR_NAME = "(фамилия, имя, отчество при наличии)"
+ANCHOR_TERM = "Срок прохождения практики"
+ANCHORS = (ANCHOR_COURSE, ANCHOR_GROUP, ANCHOR_NAME, ANCHOR_TERM)
+NAME_MAX_BACK = 6
+PLAN_VERSION = 1
+
+# Обязательные столбцы CSV для пакетного режима
+FIELDS = ('student_name', 'course', 'group', 'date_from', 'date_to')
+
+# Шаблон текущего процесса (заполняется в init_template)
+_TEMPLATE = None
+_PLAN = None
+
+
+def check_template(template):
+    """Шаблон без word/document.xml — повреждённый архив, а не ошибка данных"""
+    if DOCUMENT_XML not in template:
+        raise zipfile.BadZipFile(f"в шаблоне нет {DOCUMENT_XML}")
+    return template
 
 def collect_runs(tree, ns):
     return tree.findall('.//w:r', namespaces=ns)
@@ -100,45 +119,84 @@ def run_text(r, ns):
     return t.text if (t is not None and t.text is not None) else ""
 
 
+def make_parser():
+    return etree.XMLParser(ns_clean=True, recover=True, encoding='utf-8')
+
 def fill_by_context(document_xml_path, data):
-    parser = etree.XMLParser(ns_clean=True, recover=True, encoding='utf-8')
-    tree = etree.parse(document_xml_path, parser)
-    root = tree.getroot()
+    tree = etree.parse(document_xml_path, make_parser())
+    ok = fill_tree(tree, data)
+    # Сохраняем изменения
+    tree.write(document_xml_path, encoding='utf-8', xml_declaration=True)
+    return ok
+
+def fill_document_xml(xml_bytes, data, plan=None):
+    """Заполняет word/document.xml, переданный байтами; возвращает новые байты"""
+    tree = etree.fromstring(xml_bytes, make_parser()).getroottree()
+    if plan is None:
+        fill_tree(tree, data)
+    else:
+        apply_plan(tree, plan, data)
+    return etree.tostring(tree, encoding='UTF-8', xml_declaration=True)
+
+def term_text(data):
+    return f"Срок прохождения практики: с {data['date_from']} по {data['date_to']}"
+
+def document_ns(root):
     ns = root.nsmap
     if None in ns:
         ns['pkg'] = ns.pop(None)
     if 'w' not in ns:
         ns['w'] = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    return ns
+
+def fill_docx(src, dst, data, plan=None):
+    """
+    Заполняет .docx целиком в памяти, без временной папки.
+    src — путь, бинарный файл или уже прочитанный DocxTemplate;
+    dst — путь или бинарный поток (файл, BytesIO). Неизменённые части
+    архива копируются сжатыми, как в шаблоне.
+    """
+    template = check_template(src if isinstance(src, DocxTemplate) else DocxTemplate(src))
+    xml = fill_document_xml(template.read(DOCUMENT_XML), data, plan)
+    if isinstance(dst, (str, os.PathLike)):
+        with open(dst, 'wb') as out:
+            template.write(out, {DOCUMENT_XML: xml})
+    else:
+        template.write(dst, {DOCUMENT_XML: xml})
+    return True
+
+def fill_tree(tree, data):
+    ns = document_ns(tree.getroot())
 
     runs = collect_runs(tree, ns)
 
     # === Заполнение курса, группы, ФИО, даты, направления ===
 
-    idx = find_run_index_with_text(runs, "Выдано студенту", ns)
+    idx = find_run_index_with_text(runs, ANCHOR_COURSE, ns)
     if idx != -1:
         next_u = find_next_underlined_index(runs, idx, ns)
         if next_u != -1:
             set_run_text_preserve_rPr(runs[next_u], f" {data['course']} ", ns)
 
-    idx_g = find_run_index_with_text(runs, "группы", ns)
+    idx_g = find_run_index_with_text(runs, ANCHOR_GROUP, ns)
     if idx_g != -1:
         next_u = find_next_underlined_index(runs, idx_g, ns)
         if next_u != -1:
             set_run_text_preserve_rPr(runs[next_u], f" {data['group']} ", ns)
 
-    idx_anchor = find_run_index_with_text(runs, "(фамилия, имя, отчество при наличии)", ns)
+    idx_anchor = find_run_index_with_text(runs, ANCHOR_NAME, ns)
     if idx_anchor != -1:
-        prev_indices = find_prev_contiguous_underlined_indices(runs, idx_anchor, ns, max_back=6)
+        prev_indices = find_prev_contiguous_underlined_indices(runs, idx_anchor, ns, max_back=NAME_MAX_BACK)
         if prev_indices:
             first = prev_indices[0]
             set_run_text_preserve_rPr(runs[first], f" {data['student_name']} ", ns)
             for j in prev_indices[1:]:
                 set_run_text_preserve_rPr(runs[j], " ", ns)
 
-    idx_term = find_run_index_with_text(runs, "Срок прохождения практики", ns)
+    idx_term = find_run_index_with_text(runs, ANCHOR_TERM, ns)
     if idx_term != -1:
         target_run = runs[idx_term]
-        full_text = f"Срок прохождения практики: с {data['date_from']} по {data['date_to']}"
+        full_text = term_text(data)
         set_run_text_preserve_rPr(target_run, full_text, ns)
         parent_p = target_run.getparent()
         all_runs_in_p = parent_p.findall("w:r", namespaces=ns)
@@ -163,13 +221,224 @@ def fill_by_context(document_xml_path, data):
             choose_side_of_slash_in_run(r, keep_left=keep_left, ns=ns)
             break
 
-    # Сохраняем изменения
-    tree.write(document_xml_path, encoding='utf-8', xml_declaration=True)
     return True
 
+# ----------------- План заполнения -----------------
+
+def compile_plan(tree):
+    """
+    Один проход по run'ам шаблона: индексы run'ов, куда fill_tree запишет
+    значения. Заполнение моделируется: записанный run перестаёт быть пустым
+    подчёркнутым и больше не совпадает с якорями (см. plan_applies).
+    """
+    ns = document_ns(tree.getroot())
+    runs = collect_runs(tree, ns)
+    texts = [run_text(r, ns) for r in runs]
+    empty = [is_underlined_empty_run(r, ns) for r in runs]
+    filled = set()
+
+    def find(match):
+        for i, txt in enumerate(texts):
+            if i not in filled and match(txt):
+                return i
+        return -1
+
+    def next_empty(start):
+        for i in range(start + 1, len(runs)):
+            if empty[i] and i not in filled:
+                return i
+        return -1
+
+    def prev_empty(start):
+        res = []
+        i = start - 1
+        while i >= 0 and len(res) < NAME_MAX_BACK and empty[i] and i not in filled:
+            res.insert(0, i)
+            i -= 1
+        return res
+
+    plan = {"version": PLAN_VERSION, "runs": len(runs)}
+    for key, anchor in (("course", ANCHOR_COURSE), ("group", ANCHOR_GROUP)):
+        idx = find(lambda txt: anchor in txt)
+        plan[key] = next_empty(idx) if idx != -1 else -1
+        if plan[key] != -1:
+            filled.add(plan[key])
+
+    idx = find(lambda txt: ANCHOR_NAME in txt)
+    plan["name"] = prev_empty(idx) if idx != -1 else []
+    if plan["name"]:
+        filled.add(plan["name"][0])
+
+    idx = find(lambda txt: ANCHOR_TERM in txt)
+    plan["term"] = idx
+    plan["term_remove"] = []
+    if idx != -1:
+        position = {r: i for i, r in enumerate(runs)}
+        siblings = runs[idx].getparent().findall("w:r", namespaces=ns)
+        after = siblings[siblings.index(runs[idx]) + 1:]
+        plan["term_remove"] = [position[r] for r in after]
+        filled.add(idx)
+
+    plan["direction"] = find(lambda txt: "/" in txt and any(v in txt for v in DIRECTIONS.values()))
+    plan["practice_type"] = find(lambda txt: "/" in txt and any(v in txt for v in PRACTICE_TYPES.values()))
+    return plan
+
+def plan_applies(data):
+    """
+    План верен, если записанные значения не пусты и не содержат якорей
+    и "/" — иначе fill_tree нашёл бы другие run'ы.
+    """
+    for key in ('course', 'group', 'student_name'):
+        if not data[key].strip():
+            return False
+    for key in ('course', 'group', 'student_name', 'date_from', 'date_to'):
+        if "/" in data[key] or any(a in data[key] for a in ANCHORS):
+            return False
+    return True
+
+def apply_plan(tree, plan, data):
+    """Заполняет документ по плану прямыми записями в run'ы"""
+    if not plan_applies(data):
+        return fill_tree(tree, data)
+    ns = document_ns(tree.getroot())
+    runs = collect_runs(tree, ns)
+    if len(runs) != plan["runs"]:
+        raise ValueError("план заполнения составлен для другого шаблона")
+
+    if plan["course"] != -1:
+        set_run_text_preserve_rPr(runs[plan["course"]], f" {data['course']} ", ns)
+    if plan["group"] != -1:
+        set_run_text_preserve_rPr(runs[plan["group"]], f" {data['group']} ", ns)
+    if plan["name"]:
+        set_run_text_preserve_rPr(runs[plan["name"][0]], f" {data['student_name']} ", ns)
+        for j in plan["name"][1:]:
+            set_run_text_preserve_rPr(runs[j], " ", ns)
+    if plan["term"] != -1:
+        target_run = runs[plan["term"]]
+        set_run_text_preserve_rPr(target_run, term_text(data), ns)
+        parent_p = target_run.getparent()
+        for j in plan["term_remove"]:
+            parent_p.remove(runs[j])
+    if plan["direction"] != -1:
+        keep_left = (data.get("direction_choice", "09.03.04") == "09.03.04")
+        choose_side_of_slash_in_run(runs[plan["direction"]], keep_left=keep_left, ns=ns)
+    if plan["practice_type"] != -1:
+        keep_left = (data.get("practice_type_choice", "Научно-исследовательская") == "Научно-исследовательская")
+        choose_side_of_slash_in_run(runs[plan["practice_type"]], keep_left=keep_left, ns=ns)
+    return True
+
+def template_plan(document_xml, plan_path=None):
+    """
+    План для word/document.xml (bytes). Если указан plan_path, план читается
+    оттуда, а при несовпадении версии или хеша шаблона — составляется и сохраняется заново.
+    """
+    digest = hashlib.sha256(document_xml).hexdigest()
+    if plan_path and os.path.exists(plan_path):
+        try:
+            with open(plan_path, 'r', encoding='utf-8') as f:
+                plan = json.load(f)
+            if plan.get("version") == PLAN_VERSION and plan.get("document") == digest:
+                return plan
+        except (OSError, ValueError, AttributeError):
+            pass
+    plan = compile_plan(etree.fromstring(document_xml, make_parser()).getroottree())
+    plan["document"] = digest
+    if plan_path:
+        with open(plan_path, 'w', encoding='utf-8') as f:
+            json.dump(plan, f)
+    return plan
+
+# ----------------- Пакетный режим -----------------
+
+def init_template(template_path, plan_path=None):
+    """Читает шаблон и план заполнения один раз на процесс"""
+    global _TEMPLATE, _PLAN
+    _TEMPLATE = check_template(DocxTemplate(template_path))
+    _PLAN = template_plan(_TEMPLATE.read(DOCUMENT_XML), plan_path)
+
+def normalize_record(row):
+    """Строка CSV -> данные для fill_tree; направление и тип можно задать номером (1/2)"""
+    values = {k: (v or "").strip() for k, v in row.items() if k}
+    missing = [f for f in FIELDS if not values.get(f)]
+    if missing:
+        raise KeyError(", ".join(missing))
+    direction = values.get('direction_choice', "")
+    values['direction_choice'] = DIRECTIONS.get(direction, direction or "09.03.04")
+    practice = values.get('practice_type_choice', "")
+    values['practice_type_choice'] = PRACTICE_TYPES.get(practice, practice or "Научно-исследовательская")
+    return values
+
+def student_file_name(values):
+    name = re.sub(r'[\\/:*?"<>|\s]+', "_", (values.get('student_name') or "").strip()).strip("_")
+    return f"{name or 'student'}.docx"
+
+def output_name(index, values):
+    return f"{index:04d}_{student_file_name(values)}"
+
+def fill_record(task):
+    """(номер, строка CSV, путь результата) -> (номер, путь, ошибка или None)"""
+    index, row, out_path = task
+    try:
+        values = normalize_record(row)
+        fill_docx(_TEMPLATE, out_path, values, _PLAN)
+    except KeyError as e:
+        return index, out_path, f"не заполнены поля: {e.args[0]}"
+    except zipfile.BadZipFile as e:
+        return index, out_path, f"шаблон повреждён: {e}"
+    except (OSError, ValueError, etree.Error) as e:
+        return index, out_path, str(e)
+    return index, out_path, None
+
+def read_tasks(csv_path, out_dir):
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        for index, row in enumerate(csv.DictReader(f), 1):
+            name = os.path.basename((row.get('output') or "").strip()) or output_name(index, row)
+            yield index, row, os.path.join(out_dir, name)
+
+def fill_batch(csv_path, template_path=INPUT_DOCX, out_dir=BATCH_OUT_DIR, jobs=None, plan_path=None):
+    """Заполняет шаблон для каждой строки CSV; jobs=1 — без пула процессов"""
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = list(read_tasks(csv_path, out_dir))
+    # план составляется (и сохраняется) здесь, процессы пула только читают его
+    init_template(template_path, plan_path)
+    if jobs == 1 or len(tasks) <= 1:
+        return [fill_record(t) for t in tasks]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_template,
+                             initargs=(template_path, plan_path)) as pool:
+        chunksize = max(1, len(tasks) // ((jobs or os.cpu_count() or 1) * 4))
+        return list(pool.map(fill_record, tasks, chunksize=chunksize))
+
+def batch_main(args):
+    if not os.path.exists(args.template):
+        print(f"Файл {args.template} не найден.")
+        return 1
+    started = time.perf_counter()
+    results = fill_batch(args.batch, args.template, args.out_dir, args.jobs, args.plan)
+    elapsed = time.perf_counter() - started
+    errors = [(i, path, err) for i, path, err in results if err]
+    for i, path, err in errors:
+        print(f"Строка {i}: {err}")
+    done = len(results) - len(errors)
+    rate = done / elapsed if elapsed else 0
+    print(f"Заполнено документов: {done} из {len(results)} за {elapsed:.2f} с ({rate:.0f} док/с) -> {args.out_dir}")
+    return 1 if errors else 0
+
 # ----------------- Main -----------------
 
 def main():
+    parser = argparse.ArgumentParser(description="Заполнение шаблона практики (ПП.docx)")
+    parser.add_argument("--batch", metavar="CSV",
+                        help="CSV со столбцами " + ", ".join(FIELDS) +
+                             " (и необязательными direction_choice, practice_type_choice, output)")
+    parser.add_argument("-t", "--template", default=INPUT_DOCX)
+    parser.add_argument("-o", "--out-dir", default=BATCH_OUT_DIR)
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="число процессов (по умолчанию — все ядра)")
+    parser.add_argument("--plan", metavar="JSON",
+                        help="файл плана заполнения шаблона (создаётся, если его нет или шаблон изменился)")
+    args = parser.parse_args()
+    if args.batch:
+        return batch_main(args)
+
     if not os.path.exists(INPUT_DOCX):
         print(f"Файл {INPUT_DOCX} не найден.")
         return
@@ -183,37 +452,24 @@ def main():
     values['date_to'] = input("Введите дату окончания практики (дд.мм.гггг): ").strip()
 
     # --- Выбор направления ---
-    directions = {
-        "1": "09.03.04",
-        "2": "38.03.05"
-    }
     print("Выберите направление практики:\n1 - 09.03.04\n2 - 38.03.05")
     choice = input("Ваш выбор (1/2): ").strip()
-    values['direction_choice'] = directions.get(choice, "09.03.04")
+    values['direction_choice'] = DIRECTIONS.get(choice, "09.03.04")
 
     # --- Выбор типа практики ---
-    practice_types = {
-        "1": "Научно-исследовательская",
-        "2": "Проектная"
-    }
     print("Выберите тип практики:\n1 - Научно-исследовательская\n2 - Проектная")
     choice = input("Ваш выбор (1/2): ").strip()
-    values['practice_type_choice'] = practice_types.get(choice, "Научно-исследовательская")
+    values['practice_type_choice'] = PRACTICE_TYPES.get(choice, "Научно-исследовательская")
 
-    unzip_docx(INPUT_DOCX, TMP_DIR)
-    document_xml = get_document_xml_path(TMP_DIR)
-    if not os.path.exists(document_xml):
-        print("document.xml не найден в распакованной структуре.")
+    try:
+        ok = fill_docx(INPUT_DOCX, OUTPUT_DOCX, values)
+    except zipfile.BadZipFile as e:
+        print(f"Шаблон повреждён: {e}")
         return
-
-    ok = fill_by_context(document_xml, values)
     if ok:
-        zip_dir_to_docx(TMP_DIR, OUTPUT_DOCX)
         print("Поля заполнены:", OUTPUT_DOCX)
     else:
         print("Возникли проблемы при заполнении.")
 
-    shutil.rmtree(TMP_DIR)
-
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,314 @@
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import quote, urlsplit
+from lxml import etree
+from docx_package import DOCUMENT_XML, DocxTemplate
+from fill_openxml_by_context import check_template, fill_docx, normalize_record, student_file_name, template_plan
+
+# HTTP-сервис заполнения шаблонов практики (только стандартная библиотека).
+# Шаблоны и планы заполнения загружаются один раз в каждом процессе пула,
+# разбор и сборка XML выполняются в пуле, цикл asyncio только принимает
+# запросы и отдаёт готовые .docx.
+#
+#   POST /fill[/<шаблон>]  JSON с полями студента -> .docx
+#   GET  /metrics          задержки по маршрутам (окно последних запросов)
+#   GET  /health
+
+BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TEMPLATES = {"pp": os.path.join(BASE, "ПП.docx")}
+
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+MAX_HEADER = 16 << 10
+MAX_BODY = 1 << 20
+KEEP_ALIVE_TIMEOUT = 30
+WRITE_CHUNK = 64 << 10
+METRICS_WINDOW = 1000
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+ROUTES = ("/fill", "/metrics", "/health")
+
+# Шаблоны текущего процесса пула: имя -> (DocxTemplate, план)
+_TEMPLATES = {}
+
+
+def init_worker(templates):
+    for name, path in templates.items():
+        template = check_template(DocxTemplate(path))
+        _TEMPLATES[name] = (template, template_plan(template.read(DOCUMENT_XML)))
+
+
+def render_docx(name, values):
+    """Выполняется в пуле: (байты .docx, секунды заполнения)"""
+    started = time.perf_counter()
+    template, plan = _TEMPLATES[name]
+    out = io.BytesIO()
+    fill_docx(template, out, values, plan)
+    return out.getvalue(), time.perf_counter() - started
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Metrics:
+    def __init__(self, window=METRICS_WINDOW):
+        self.started = time.time()
+        self.window = window
+        self.in_flight = 0
+        self.statuses = Counter()
+        self.counts = Counter()
+        self.latency = {}
+        self.fill = deque(maxlen=window)
+
+    def observe(self, route, status, seconds):
+        self.statuses[status] += 1
+        self.counts[route] += 1
+        self.latency.setdefault(route, deque(maxlen=self.window)).append(seconds)
+
+    @staticmethod
+    def _summary(values):
+        if not values:
+            return {}
+        ordered = sorted(values)
+        # nearest-rank: на малых выборках p95/p99 не опускаются к медиане
+        pick = lambda q: round(ordered[max(0, math.ceil(q * len(ordered)) - 1)] * 1000, 3)
+        return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+                "max_ms": round(ordered[-1] * 1000, 3),
+                "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3)}
+
+    def snapshot(self):
+        return {
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "in_flight": self.in_flight,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "routes": {route: {"count": self.counts[route], **self._summary(values)}
+                       for route, values in sorted(self.latency.items())},
+            "fill": self._summary(self.fill),
+        }
+
+
+class FillService:
+    def __init__(self, templates, jobs=None):
+        self.templates = dict(templates)
+        # шаблоны проверяются до запуска пула, чтобы ошибка была видна сразу
+        for path in self.templates.values():
+            check_template(DocxTemplate(path))
+        self.jobs = jobs
+        self.pool = self._new_pool()
+        self.pool_restarts = 0
+        self.metrics = Metrics()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.jobs, initializer=init_worker, initargs=(self.templates,))
+
+    def _restart_pool(self, broken):
+        """Пул с умершим процессом больше не принимает задачи — заменяем его новым"""
+        if self.pool is broken:
+            self.pool = self._new_pool()
+            self.pool_restarts += 1
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    async def render(self, name, values):
+        loop = asyncio.get_running_loop()
+        # одна повторная попытка: процесс мог умереть на чужой задаче
+        for attempt in range(2):
+            pool = self.pool
+            try:
+                return await loop.run_in_executor(pool, render_docx, name, values)
+            except BrokenProcessPool:
+                self._restart_pool(pool)
+        raise HTTPError(503, "процесс заполнения аварийно завершился, повторите запрос")
+
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except HTTPError as e:
+                    await send(writer, e.status, json_body({"error": str(e)}), "application/json", keep_alive=False)
+                    break
+                if request is None:
+                    break
+                keep_alive = await self.dispatch(writer, *request)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def dispatch(self, writer, method, target, headers, body):
+        started = time.perf_counter()
+        path = urlsplit(target).path.rstrip("/") or "/"
+        route = "/fill" if path == "/fill" or path.startswith("/fill/") else path
+        keep_alive = headers.get("connection", "").lower() != "close"
+        extra = {}
+        self.metrics.in_flight += 1
+        try:
+            if route == "/fill":
+                if method != "POST":
+                    raise HTTPError(405, "используйте POST")
+                name = path[len("/fill/"):] if path.startswith("/fill/") else "pp"
+                payload, filename, fill_seconds = await self.fill(name, body)
+                content_type = DOCX_TYPE
+                extra["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(filename)}"
+                extra["Server-Timing"] = f"fill;dur={fill_seconds * 1000:.3f}"
+                status = 200
+            elif route == "/metrics" and method == "GET":
+                snapshot = {**self.metrics.snapshot(), "pool_restarts": self.pool_restarts}
+                payload, content_type, status = json_body(snapshot), "application/json", 200
+            elif route == "/health" and method == "GET":
+                payload, content_type, status = json_body({"status": "ok"}), "application/json", 200
+            else:
+                raise HTTPError(404, f"нет маршрута {method} {path}")
+        except HTTPError as e:
+            payload, content_type, status = json_body({"error": str(e)}), "application/json", e.status
+        except Exception as e:
+            payload, content_type, status = json_body({"error": f"ошибка заполнения: {e}"}), "application/json", 500
+        finally:
+            self.metrics.in_flight -= 1
+
+        elapsed = time.perf_counter() - started
+        self.metrics.observe(route if route in ROUTES else "other", status, elapsed)
+        extra["X-Response-Time-Ms"] = f"{elapsed * 1000:.3f}"
+        await send(writer, status, payload, content_type, extra, keep_alive)
+        return keep_alive
+
+    async def fill(self, name, body):
+        if name not in self.templates:
+            raise HTTPError(404, f"нет шаблона {name!r} (доступны: {', '.join(self.templates)})")
+        try:
+            data = json.loads(body or b"null")
+        except ValueError as e:
+            raise HTTPError(400, f"некорректный JSON: {e}")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "ожидается JSON-объект с полями студента")
+        row = {k: "" if v is None else str(v) for k, v in data.items()}
+        try:
+            values = normalize_record(row)
+        except KeyError as e:
+            raise HTTPError(400, f"не заполнены поля: {e.args[0]}")
+        filename = os.path.basename(row.get("filename", "").strip()) or student_file_name(values)
+        try:
+            payload, fill_seconds = await self.render(name, values)
+        except (ValueError, etree.Error) as e:
+            raise HTTPError(400, str(e))
+        self.metrics.fill.append(fill_seconds)
+        return payload, filename, fill_seconds
+
+
+async def read_request(reader):
+    """(метод, цель, заголовки, тело) или None, если клиент закрыл соединение"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, "слишком большие заголовки")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "некорректная строка запроса")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(411, "нужен Content-Length")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise HTTPError(400, "некорректный Content-Length")
+    if length > MAX_BODY:
+        raise HTTPError(413, f"тело запроса больше {MAX_BODY} байт")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+def json_body(data):
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+async def send(writer, status, payload, content_type, extra=None, keep_alive=True):
+    head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(payload)}",
+            "Connection: " + ("keep-alive" if keep_alive else "close")]
+    head += [f"{k}: {v}" for k, v in (extra or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+    # большой ответ отдаётся частями, с учётом скорости клиента
+    for i in range(0, len(payload), WRITE_CHUNK):
+        writer.write(payload[i:i + WRITE_CHUNK])
+        await writer.drain()
+    await writer.drain()
+
+
+async def serve(host, port, templates, jobs=None):
+    service = FillService(templates, jobs)
+    server = await asyncio.start_server(service.handle, host, port, limit=MAX_HEADER)
+    print(f"Сервис заполнения: http://{host}:{port}/fill (шаблоны: {', '.join(templates)})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def parse_templates(items):
+    templates = {}
+    for item in items:
+        name, sep, path = item.partition("=")
+        if not sep or not name or not path:
+            raise argparse.ArgumentTypeError(f"ожидается ИМЯ=ПУТЬ: {item!r}")
+        templates[name] = os.path.abspath(path)
+    return templates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP-сервис заполнения шаблонов практики")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="число процессов (по умолчанию — все ядра)")
+    parser.add_argument("--template", action="append", default=[], metavar="ИМЯ=ПУТЬ",
+                        help="шаблон .docx (можно несколько; по умолчанию pp=ПП.docx)")
+    args = parser.parse_args()
+    try:
+        templates = parse_templates(args.template) or DEFAULT_TEMPLATES
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    try:
+        asyncio.run(serve(args.host, args.port, templates, args.jobs))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from lxml import etree
+from docx_package import DOCUMENT_XML, DocxTemplate
+from fill_openxml_by_context import (
+    ANCHOR_COURSE, ANCHOR_GROUP, ANCHOR_NAME, ANCHOR_TERM, NAME_MAX_BACK,
+    check_template, choose_side_of_slash_in_run, fill_document_xml, is_underlined_empty_run,
+    normalize_record, plan_applies, run_text, set_run_text_preserve_rPr, term_text,
+)
+
+# Потоковое заполнение очень больших word/document.xml.
+# Документ читается через iterparse, run'ы каждого закрытого блока w:body
+# (абзаца, таблицы) обрабатываются в порядке документа тем же поиском, что и
+# fill_tree, а готовые блоки сразу сериализуются в выходной поток и удаляются
+# из дерева. В памяти остаются только текущий блок, блоки с пустыми
+# подчёркнутыми run'ами, которые ещё могут понадобиться для ФИО, и всё, что
+# вне w:body (w:background, другие части плоского OPC) — оно копируется как есть.
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+W_R = f"{{{W_NS}}}r"
+W_BODY = f"{{{W_NS}}}body"
+BODY_MARKER = "@@body@@"
+# столько готовых блоков сериализуется за один вызов tostring
+FLUSH_BLOCKS = 32
+
+
+class _Filler:
+    """Состояние поиска якорей: то же, что fill_tree делает проходами по списку run'ов"""
+
+    def __init__(self, data):
+        self.data = data
+        # только w: — поиск с полным nsmap корня заметно медленнее
+        self.ns = {"w": W_NS}
+        self.course_wait = self.group_wait = False
+        self.course_seen = self.group_seen = False
+        self.name_done = False
+        # непрерывная цепочка пустых подчёркнутых run'ов: (run, номер блока)
+        self.window = deque(maxlen=NAME_MAX_BACK)
+        self.term_run = None
+        self.term_pending = False
+        self.direction_done = self.practice_done = False
+
+    def on_run(self, r, block):
+        ns, data = self.ns, self.data
+        original = run_text(r, ns)
+        empty = is_underlined_empty_run(r, ns)
+        # поле заполняет первый ожидающий якорь: курс раньше группы, как в fill_tree
+        if empty and (self.course_wait or self.group_wait):
+            if self.course_wait:
+                self.course_wait = False
+                set_run_text_preserve_rPr(r, f" {data['course']} ", ns)
+            else:
+                self.group_wait = False
+                set_run_text_preserve_rPr(r, f" {data['group']} ", ns)
+            empty = False
+        if not self.course_seen and ANCHOR_COURSE in original:
+            self.course_seen = self.course_wait = True
+        txt = run_text(r, ns)
+        if not self.group_seen and ANCHOR_GROUP in txt:
+            self.group_seen = self.group_wait = True
+
+        if not self.name_done and ANCHOR_NAME in txt:
+            self.name_done = True
+            targets = [run for run, _ in self.window]
+            self.window.clear()
+            if targets:
+                set_run_text_preserve_rPr(targets[0], f" {data['student_name']} ", ns)
+                for run in targets[1:]:
+                    set_run_text_preserve_rPr(run, " ", ns)
+
+        if self.term_run is None and ANCHOR_TERM in txt:
+            set_run_text_preserve_rPr(r, term_text(data), ns)
+            self.term_run = r
+            self.term_pending = True
+            txt = run_text(r, ns)
+            empty = False
+
+        if not self.name_done:
+            if empty:
+                self.window.append((r, block))
+            else:
+                self.window.clear()
+
+        if not self.direction_done and "/" in txt and ("09.03.04" in txt or "38.03.05" in txt):
+            self.direction_done = True
+            keep_left = (data.get("direction_choice", "09.03.04") == "09.03.04")
+            choose_side_of_slash_in_run(r, keep_left=keep_left, ns=ns)
+            txt = run_text(r, ns)
+        if not self.practice_done and "/" in txt and ("Научно-исследовательская" in txt or "Проектная" in txt):
+            self.practice_done = True
+            keep_left = (data.get("practice_type_choice", "Научно-исследовательская") == "Научно-исследовательская")
+            choose_side_of_slash_in_run(r, keep_left=keep_left, ns=ns)
+
+    def on_block_end(self):
+        # после срока практики в абзаце удаляются остальные run'ы — абзац уже закрыт
+        if self.term_pending:
+            self.term_pending = False
+            parent_p = self.term_run.getparent()
+            removing = False
+            for r in parent_p.findall("w:r", namespaces=self.ns):
+                if removing:
+                    parent_p.remove(r)
+                if r is self.term_run:
+                    removing = True
+
+    @property
+    def done(self):
+        return (self.name_done and self.term_run is not None and not self.term_pending
+                and self.course_seen and not self.course_wait and self.group_seen and not self.group_wait
+                and self.direction_done and self.practice_done)
+
+    def oldest_needed_block(self):
+        if self.name_done or not self.window:
+            return None
+        return self.window[0][1]
+
+
+def fill_document_stream(src, out, data):
+    """
+    Заполняет document.xml из src (путь или бинарный поток) и пишет результат
+    в out по блокам. Для значений, при которых fill_tree пошёл бы другим путём
+    (см. plan_applies), документ заполняется обычным способом целиком в памяти.
+    """
+    if not plan_applies(data):
+        if isinstance(src, (str, os.PathLike)):
+            with open(src, "rb") as f:
+                xml = f.read()
+        else:
+            xml = src.read()
+        out.write(fill_document_xml(xml, data))
+        return
+
+    filler = _Filler(data)
+    tree = body = shell = None
+    body_depth = depth = 0
+    head = tail = b""
+    head_written = False
+    blocks = deque()  # (номер, блок), ещё не записанные
+    seq = 0
+
+    def fill_runs(runs, block):
+        # run'ы блока — в порядке документа, как .//w:r в fill_tree
+        # (вложенные run'ы, например в w:txbxContent, идут после внешнего)
+        for r in runs:
+            if filler.done:
+                break
+            filler.on_run(r, block)
+        filler.on_block_end()
+
+    def flush(keep_from=None):
+        nonlocal head_written
+        if keep_from is not None and keep_from < 0:
+            return  # ещё могут понадобиться run'ы перед w:body
+        if not head_written:
+            head_written = True
+            out.write(split_at_body(tree, body)[0])
+        # блоки сериализуются внутри копии w:body с теми же пространствами
+        # имён, поэтому объявления xmlns не повторяются в каждом абзаце
+        moved = []
+        while blocks and (keep_from is None or blocks[0][0] < keep_from):
+            _, block = blocks.popleft()
+            shell.append(block)
+            moved.append(block)
+        if moved:
+            text = etree.tostring(shell, encoding="UTF-8", xml_declaration=False)
+            out.write(text[len(head):len(text) - len(tail)])
+            for block in moved:
+                shell.remove(block)
+
+    for event, elem in etree.iterparse(src, events=("start", "end"), recover=True, huge_tree=True):
+        if event == "start":
+            depth += 1
+            if tree is None:
+                tree = elem.getroottree()
+            elif body is None and elem.tag == W_BODY:
+                # всё до w:body уже разобрано: его run'ы идут первыми
+                body, body_depth = elem, depth
+                fill_runs(list(tree.iter(W_R)), -1)
+                shell = etree.Element(body.tag, nsmap=body.nsmap)
+                shell.text = BODY_MARKER
+                text = etree.tostring(shell, encoding="UTF-8", xml_declaration=False)
+                i = text.index(BODY_MARKER.encode())
+                head, tail = text[:i], text[i + len(BODY_MARKER):]
+                shell.text = None
+            continue
+
+        depth -= 1
+        if body is not None and depth == body_depth and elem.getparent() is body:
+            fill_runs(list(elem.iter(W_R)) if not filler.done else (), seq)
+            blocks.append((seq, elem))
+            seq += 1
+            if len(blocks) >= FLUSH_BLOCKS:
+                flush(filler.oldest_needed_block())
+
+    if body is None:
+        fill_runs(list(tree.iter(W_R)), 0)
+        out.write(etree.tostring(tree, encoding="UTF-8", xml_declaration=True))
+        return
+    # run'ы после w:body (другие части плоского OPC и т. п.)
+    after = []
+    node = body
+    while node is not None:
+        for sibling in node.itersiblings():
+            after.extend(sibling.iter(W_R))
+        node = node.getparent()
+    fill_runs(after, seq)
+    flush()
+    out.write(split_at_body(tree, body)[1])
+
+
+def split_at_body(tree, body):
+    """
+    Сериализация документа без содержимого w:body: (всё до блоков, всё после).
+    Блоки w:body на это время подменяются пустой копией элемента.
+    """
+    stub = etree.Element(body.tag, attrib=dict(body.attrib))
+    stub.text = (body.text or "") + BODY_MARKER
+    stub.tail = body.tail
+    parent = body.getparent()
+    if parent is None:
+        text = etree.tostring(stub, encoding="UTF-8", xml_declaration=True)
+    else:
+        parent.replace(body, stub)
+        try:
+            text = etree.tostring(tree, encoding="UTF-8", xml_declaration=True)
+        finally:
+            parent.replace(stub, body)
+    i = text.index(BODY_MARKER.encode())
+    return text[:i], text[i + len(BODY_MARKER):]
+
+
+def fill_docx_stream(src, dst, data):
+    """Как fill_docx, но document.xml распаковывается, заполняется и сжимается потоково"""
+    template = check_template(DocxTemplate(src))
+
+    def produce(sink):
+        fill_document_stream(template.open(DOCUMENT_XML), sink, data)
+
+    if isinstance(dst, (str, os.PathLike)):
+        with open(dst, "wb") as out:
+            template.write(out, {DOCUMENT_XML: produce})
+    else:
+        template.write(dst, {DOCUMENT_XML: produce})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Потоковое заполнение больших документов практики")
+    parser.add_argument("src", help=".docx или word/document.xml")
+    parser.add_argument("dst", help="куда записать результат (того же типа)")
+    parser.add_argument("--data", required=True, help="JSON с полями студента, как в пакетном CSV")
+    args = parser.parse_args()
+
+    with open(args.data, "r", encoding="utf-8") as f:
+        row = {k: "" if v is None else str(v) for k, v in json.load(f).items()}
+    try:
+        values = normalize_record(row)
+    except KeyError as e:
+        print(f"Не заполнены поля: {e.args[0]}")
+        return 1
+
+    started = time.perf_counter()
+    if args.src.lower().endswith(".docx"):
+        fill_docx_stream(args.src, args.dst, values)
+    else:
+        with open(args.dst, "wb") as out:
+            fill_document_stream(args.src, out, values)
+    print(f"Поля заполнены: {args.dst} ({time.perf_counter() - started:.2f} с)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
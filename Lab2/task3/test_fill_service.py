@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from fill_service import HTTPError, Metrics, read_request, send
+
+
+def _read(raw):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await read_request(reader)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("length", ["-5", "abc"])
+def test_bad_content_length_is_400(length):
+    with pytest.raises(HTTPError) as e:
+        _read(f"POST /fill HTTP/1.1\r\nContent-Length: {length}\r\n\r\n{{}}".encode())
+    assert e.value.status == 400
+
+
+def test_request_body_is_read():
+    assert _read(b"POST /fill HTTP/1.1\r\nContent-Length: 2\r\n\r\n{}") == ("POST", "/fill", {"content-length": "2"}, b"{}")
+
+
+class _Writer:
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+
+def test_service_unavailable_has_reason_phrase():
+    writer = _Writer()
+    asyncio.run(send(writer, 503, b"{}", "application/json"))
+    assert writer.data.startswith(b"HTTP/1.1 503 Service Unavailable\r\n")
+
+
+def test_percentiles_use_nearest_rank():
+    summary = Metrics._summary([0.001] * 19 + [0.05])
+    assert summary["p50_ms"] == 1.0
+    assert summary["p95_ms"] == 1.0
+    assert summary["p99_ms"] == 50.0
+    assert Metrics._summary([0.002, 0.001])["p95_ms"] == 2.0
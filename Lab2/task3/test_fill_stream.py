@@ -0,0 +1,49 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from fill_openxml_by_context import fill_document_xml
+from fill_stream import fill_document_stream
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA = {
+    "student_name": "Иванов Иван", "course": "2", "group": "P3100",
+    "date_from": "01.07.2024", "date_to": "14.07.2024",
+    "direction_choice": "09.03.04", "practice_type_choice": "Проектная",
+}
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+U = '<w:rPr><w:u w:val="single"/></w:rPr>'
+# run с надписью (w:txbxContent) внутри другого run'а: fill_tree видит
+# внешний run раньше вложенного
+NESTED = f"""<w:document {W}><w:background w:color="FFFFFF"/><w:body>
+<w:p><w:r><w:t>Выдано студенту</w:t><w:pict><w:txbxContent><w:p><w:r>{U}<w:t> </w:t></w:r></w:p>
+</w:txbxContent></w:pict></w:r><w:r>{U}<w:t> </w:t></w:r></w:p>
+<w:p><w:r>{U}<w:t> </w:t></w:r><w:r><w:t>(фамилия, имя, отчество при наличии)</w:t></w:r></w:p>
+<w:p><w:r><w:t>группы</w:t></w:r><w:r>{U}<w:t> </w:t></w:r></w:p>
+</w:body></w:document>""".encode()
+
+
+def _template_document():
+    with zipfile.ZipFile(os.path.join(HERE, "..", "ПП.docx")) as z:
+        return z.read("word/document.xml")
+
+
+def _flat_opc():
+    with open(os.path.join(HERE, "p.xml"), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("xml", [
+    NESTED,
+    NESTED.replace(b'<w:background w:color="FFFFFF"/>', b""),
+    pytest.param(_template_document(), id="docx"),
+    pytest.param(_template_document().replace(b"<w:body>", b'<w:background w:color="FFFFFF"/><w:body>', 1),
+                 id="background"),
+    pytest.param(_flat_opc(), id="flat-opc"),
+])
+def test_stream_matches_in_memory_fill(xml):
+    out = io.BytesIO()
+    fill_document_stream(io.BytesIO(xml), out, dict(DATA))
+    assert out.getvalue() == fill_document_xml(xml, dict(DATA))
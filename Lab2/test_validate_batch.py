@@ -0,0 +1,21 @@
+import json
+import os
+
+import validate_batch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_jsonl_checked_per_line_without_stream(tmp_path):
+    with open(os.path.join(HERE, "out", "albums.json"), encoding="utf-8") as f:
+        albums = json.load(f)
+    lines = [json.dumps(album, ensure_ascii=False) for album in albums]
+    (tmp_path / "good.jsonl").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    (tmp_path / "bad.jsonl").write_text(lines[0] + "\n{broken\n", encoding="utf-8")
+
+    summary = validate_batch.validate_many(validate_batch.collect_files([str(tmp_path)]), jobs=1)
+    results = {os.path.basename(r["file"]): r for r in summary["files"]}
+    assert results["good.jsonl"]["kind"] == "jsonl"
+    assert results["good.jsonl"]["valid"]
+    assert not results["bad.jsonl"]["valid"]
+    assert results["bad.jsonl"]["errors"][0].startswith("line 2: syntax:")
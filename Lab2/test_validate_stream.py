@@ -0,0 +1,38 @@
+import io
+import json
+import os
+
+import pytest
+
+import validate_stream
+from validate_stream import iter_json_array
+
+DATA = ["str", 15000000000.5, 1e5, -2.5e-3, 0, True, None, {"a": [1, 2.0]}, 123456789]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 5, 8, 16, 1 << 16])
+def test_numbers_split_across_chunks(monkeypatch, chunk_size):
+    monkeypatch.setattr(validate_stream, "CHUNK_SIZE", chunk_size)
+    for text in (json.dumps(DATA), json.dumps(DATA, indent=2)):
+        values = [value for _, _, value in iter_json_array(io.StringIO(text))]
+        assert values == DATA
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 1 << 16])
+def test_syntax_error_reported(monkeypatch, chunk_size):
+    monkeypatch.setattr(validate_stream, "CHUNK_SIZE", chunk_size)
+    with pytest.raises(ValueError, match="expected ',' or ']'"):
+        list(iter_json_array(io.StringIO('[1, 2 3]')))
+
+
+def test_truncated_xml_blames_next_record(tmp_path):
+    with open(os.path.join(validate_stream.BASE, "albums.xml"), encoding="utf-8") as f:
+        xml = f.read()
+    second = xml.index("<album>", xml.index("</album>"))
+    path = tmp_path / "truncated.xml"
+    path.write_text(xml[:second + 200], encoding="utf-8")
+
+    result = validate_stream.stream_validate(str(path))
+    assert result["invalid_records"] == 1
+    assert [e["record"] for e in result["errors"]] == [1]
+    assert result["errors"][0]["message"].startswith("syntax:")
@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from jsonschema.validators import validator_for
+from lxml import etree
+
+import validate_stream
+
+# Пакетная валидация каталогов: DTD и XSD для *.xml, JSON Schema для *.json
+# (для *.jsonl — схема одного альбома на каждую строку).
+# Схемы компилируются один раз на процесс, файлы распределяются по пулу процессов,
+# итог печатается в JSON со временем проверки каждого файла.
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+DTD_PATH = os.path.join(BASE, "albums.dtd")
+XSD_PATH = os.path.join(BASE, "albums.xsd")
+JSON_SCHEMA_PATH = os.path.join(BASE, "albums.schema.json")
+
+MAX_ERRORS = 20
+
+# Скомпилированные схемы текущего процесса (заполняются в init_validators)
+_VALIDATORS = None
+
+
+class Validators:
+    def __init__(self, dtd_path=DTD_PATH, xsd_path=XSD_PATH, schema_path=JSON_SCHEMA_PATH, stream=False):
+        self.dtd = etree.DTD(dtd_path)
+        self.xsd = etree.XMLSchema(etree.parse(xsd_path))
+        with open(schema_path, "r", encoding="utf-8") as f:
+            schema = json.load(f)
+        cls = validator_for(schema)
+        cls.check_schema(schema)
+        self.json = cls(schema)
+        # схемы одного альбома: для *.jsonl и потоковой проверки
+        self.album_json = validate_stream.album_json_validator(schema_path)
+        if stream:
+            self.album_xsd = validate_stream.album_xsd(xsd_path)
+
+
+def init_validators(dtd_path=DTD_PATH, xsd_path=XSD_PATH, schema_path=JSON_SCHEMA_PATH, stream=False):
+    global _VALIDATORS
+    _VALIDATORS = Validators(dtd_path, xsd_path, schema_path, stream)
+
+
+def _log_errors(error_log):
+    return [f"line {e.line}: {e.message}" for e in list(error_log)[:MAX_ERRORS]]
+
+
+def _validate_xml(path, v):
+    tree = etree.parse(path)
+    checks = {"dtd": v.dtd.validate(tree), "xsd": v.xsd.validate(tree)}
+    errors = []
+    if not checks["dtd"]:
+        errors += ["dtd: " + e for e in _log_errors(v.dtd.error_log)]
+    if not checks["xsd"]:
+        errors += ["xsd: " + e for e in _log_errors(v.xsd.error_log)]
+    return checks, errors
+
+
+def _validate_json(path, v):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    errors = []
+    for e in v.json.iter_errors(data):
+        location = "/".join(str(p) for p in e.absolute_path)
+        errors.append(f"{location or '$'}: {e.message}")
+        if len(errors) >= MAX_ERRORS:
+            break
+    return {"schema": not errors}, errors
+
+
+def _validate_jsonl(path, v):
+    errors = []
+    for _, offset, message in validate_stream.iter_jsonl_record_errors(path, v.album_json):
+        errors.append(f"line {offset['line']}: {message}")
+        if len(errors) >= MAX_ERRORS:
+            break
+    return {"schema": not errors}, errors
+
+
+_CHECKS = {"xml": _validate_xml, "json": _validate_json, "jsonl": _validate_jsonl}
+
+
+def validate_file(path, stream=False):
+    """Проверяет один файл скомпилированными схемами процесса"""
+    if _VALIDATORS is None:
+        init_validators(stream=stream)
+    if stream:
+        return validate_stream.stream_validate(path, _VALIDATORS.album_xsd, _VALIDATORS.album_json)
+    started = time.perf_counter()
+    kind = validate_stream.file_kind(path)
+    try:
+        checks, errors = _CHECKS[kind](path, _VALIDATORS)
+    except (OSError, etree.XMLSyntaxError, ValueError) as e:
+        checks, errors = {}, [f"parse: {e}"]
+    return {
+        "file": path,
+        "kind": kind,
+        "valid": bool(checks) and all(checks.values()),
+        "checks": checks,
+        "errors": errors,
+        "seconds": round(time.perf_counter() - started, 6),
+    }
+
+
+def collect_files(paths):
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            for folder, _, names in os.walk(p):
+                for name in sorted(names):
+                    if name.endswith(".schema.json"):
+                        continue
+                    if name.lower().endswith((".xml", ".json", ".jsonl")):
+                        files.append(os.path.join(folder, name))
+        else:
+            files.append(p)
+    return files
+
+
+def validate_many(files, jobs=None, dtd_path=DTD_PATH, xsd_path=XSD_PATH, schema_path=JSON_SCHEMA_PATH,
+                  stream=False):
+    """Проверяет список файлов; jobs=1 — без пула процессов, stream — по одной записи"""
+    started = time.perf_counter()
+    check = partial(validate_file, stream=stream)
+    if jobs == 1 or len(files) <= 1:
+        init_validators(dtd_path, xsd_path, schema_path, stream)
+        results = [check(f) for f in files]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_validators,
+                                 initargs=(dtd_path, xsd_path, schema_path, stream)) as pool:
+            chunksize = max(1, len(files) // ((jobs or os.cpu_count() or 1) * 4))
+            results = list(pool.map(check, files, chunksize=chunksize))
+    valid = sum(1 for r in results if r["valid"])
+    return {
+        "total": len(results),
+        "valid": valid,
+        "invalid": len(results) - valid,
+        "seconds": round(time.perf_counter() - started, 6),
+        "files": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная валидация XML/JSON каталогов альбомов")
+    parser.add_argument("paths", nargs="+", help="файлы или папки с *.xml / *.json / *.jsonl")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="число процессов (по умолчанию — все ядра)")
+    parser.add_argument("--dtd", default=DTD_PATH)
+    parser.add_argument("--xsd", default=XSD_PATH)
+    parser.add_argument("--schema", default=JSON_SCHEMA_PATH)
+    parser.add_argument("--stream", action="store_true",
+                        help="потоковая проверка по одному альбому (см. validate_stream.py)")
+    parser.add_argument("-o", "--output", help="куда записать JSON-отчёт (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    summary = validate_many(collect_files(args.paths), args.jobs, args.dtd, args.xsd, args.schema,
+                            args.stream)
+    report = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+    else:
+        print(report)
+    return 0 if summary["invalid"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+from jsonschema.validators import validator_for
+from lxml import etree
+
+# Потоковая проверка каталогов по одному альбому за раз.
+# XML читается через iterparse, JSON-массив — инкрементальным декодером,
+# JSONL — построчно. Каждая запись проверяется схемой одного альбома,
+# выделенной из albums.xsd / albums.schema.json, память не растёт
+# с размером файла, а ошибка в записи не останавливает проверку остальных.
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+XSD_PATH = os.path.join(BASE, "albums.xsd")
+JSON_SCHEMA_PATH = os.path.join(BASE, "albums.schema.json")
+
+XS_NS = "http://www.w3.org/2001/XMLSchema"
+CHUNK_SIZE = 1 << 16
+# запись длиннее считается повреждённой, чтобы не читать в буфер весь файл
+MAX_RECORD_CHARS = 1 << 26
+MAX_ERRORS = 100
+# символы, после которых число в JSON-массиве точно закончилось
+NUMBER_DELIMITERS = {" ", "\t", "\r", "\n", ",", "]"}
+
+
+def album_xsd(xsd_path=XSD_PATH):
+    """XMLSchema, в которой album — корневой элемент"""
+    xsd = etree.parse(xsd_path)
+    album = xsd.find(f".//{{{XS_NS}}}element[@name='album']")
+    if album is None:
+        raise ValueError(f"в {xsd_path} нет объявления элемента album")
+    root = etree.Element(f"{{{XS_NS}}}schema", nsmap={"xs": XS_NS})
+    album = copy.deepcopy(album)
+    # у глобального элемента не может быть minOccurs/maxOccurs
+    album.attrib.pop("minOccurs", None)
+    album.attrib.pop("maxOccurs", None)
+    root.append(album)
+    return etree.XMLSchema(root)
+
+
+def album_json_validator(schema_path=JSON_SCHEMA_PATH):
+    """Валидатор схемы items из albums.schema.json"""
+    with open(schema_path, "r", encoding="utf-8") as f:
+        schema = json.load(f)
+    cls = validator_for(schema)
+    cls.check_schema(schema)
+    item = dict(schema.get("items", {}))
+    # служебные ключи корня нужны и подсхеме (диалект, $defs для $ref)
+    for key in ("$schema", "$defs", "definitions"):
+        if key in schema:
+            item.setdefault(key, schema[key])
+    return cls(item)
+
+
+def iter_xml_records(path):
+    """Отдаёт (номер записи, строка, album) и освобождает обработанные элементы"""
+    depth = 0
+    index = 0
+    for event, elem in etree.iterparse(path, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if depth != 1:
+            continue
+        yield index, elem.sourceline, elem
+        index += 1
+        elem.clear()
+        parent = elem.getparent()
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+def iter_xml_record_errors(path, schema):
+    """Ошибки вида (номер записи, смещение, сообщение) для XML-каталога"""
+    next_index = 0
+    try:
+        for index, line, elem in iter_xml_records(path):
+            next_index = index + 1
+            if elem.tag != "album":
+                yield index, {"line": line}, f"unexpected element <{elem.tag}>"
+                continue
+            if not schema.validate(elem):
+                for e in schema.error_log:
+                    yield index, {"line": e.line}, e.message
+    except etree.XMLSyntaxError as e:
+        # после ошибки разметки продолжить разбор нельзя — сообщаем
+        # о записи, на которой споткнулись, а не о последней разобранной
+        yield next_index, {"line": e.lineno}, f"syntax: {e.msg}"
+
+
+def iter_json_array(f):
+    """Инкрементальный разбор JSON-массива: (номер, смещение в символах, значение)"""
+    decoder = json.JSONDecoder()
+    buf = ""
+    consumed = 0
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, consumed, eof
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            eof = True
+        consumed += pos
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    fill()
+    skip_ws()
+    if buf[pos:pos + 1] != "[":
+        raise ValueError(f"offset {consumed + pos}: expected '['")
+    pos += 1
+    index = 0
+    skip_ws()
+    if buf[pos:pos + 1] == "]":
+        return
+    while True:
+        skip_ws()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # число на границе буфера могло прочитаться не полностью
+                # («1500» из «15000000000.5»): принимаем его, только если
+                # за ним в буфере уже стоит разделитель
+                if (not eof and isinstance(value, (int, float)) and not isinstance(value, bool)
+                        and buf[end:end + 1] not in NUMBER_DELIMITERS):
+                    raise ValueError("incomplete")
+                break
+            except ValueError:
+                if eof or len(buf) - pos > MAX_RECORD_CHARS:
+                    raise ValueError(f"offset {consumed + pos}: invalid JSON value")
+                fill()
+        yield index, consumed + pos, value
+        index += 1
+        pos = end
+        skip_ws()
+        sep = buf[pos:pos + 1]
+        pos += 1
+        if sep == "]":
+            return
+        if sep != ",":
+            raise ValueError(f"offset {consumed + pos - 1}: expected ',' or ']'")
+
+
+def _json_errors(validator, index, offset, value):
+    for e in validator.iter_errors(value):
+        location = "/".join(str(p) for p in e.absolute_path)
+        yield index, offset, f"{location or '$'}: {e.message}"
+
+
+def iter_json_record_errors(path, validator):
+    with open(path, "r", encoding="utf-8") as f:
+        next_index = 0
+        try:
+            for index, offset, value in iter_json_array(f):
+                next_index = index + 1
+                yield from _json_errors(validator, index, {"char": offset}, value)
+        except ValueError as e:
+            # дальше массива не разобрать — сообщаем о записи, на которой споткнулись
+            yield next_index, {}, f"syntax: {e}"
+
+
+def iter_jsonl_record_errors(path, validator):
+    with open(path, "r", encoding="utf-8") as f:
+        index = 0
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                value = json.loads(line)
+            except ValueError as e:
+                yield index, {"line": line_no}, f"syntax: {e}"
+            else:
+                yield from _json_errors(validator, index, {"line": line_no}, value)
+            index += 1
+
+
+def file_kind(path):
+    lower = path.lower()
+    if lower.endswith(".jsonl"):
+        return "jsonl"
+    if lower.endswith(".json"):
+        return "json"
+    return "xml"
+
+
+def stream_validate(path, xsd=None, json_validator=None, max_errors=MAX_ERRORS):
+    """
+    Проверяет файл потоково. В отчёт попадают первые max_errors ошибок,
+    число невалидных записей считается по всему файлу.
+    """
+    started = time.perf_counter()
+    kind = file_kind(path)
+    if kind == "xml":
+        errors_iter = iter_xml_record_errors(path, xsd or album_xsd())
+    elif kind == "json":
+        errors_iter = iter_json_record_errors(path, json_validator or album_json_validator())
+    else:
+        errors_iter = iter_jsonl_record_errors(path, json_validator or album_json_validator())
+
+    errors = []
+    invalid_records = 0
+    last_record = None
+    error_count = 0
+    try:
+        for index, offset, message in errors_iter:
+            error_count += 1
+            # ошибки приходят по порядку записей, поэтому хватает последнего номера
+            if index != last_record:
+                invalid_records += 1
+                last_record = index
+            if len(errors) < max_errors:
+                errors.append({"record": index, **offset, "message": message})
+    except (OSError, ValueError) as e:
+        error_count += 1
+        errors.append({"record": -1, "message": f"io: {e}"})
+    return {
+        "file": path,
+        "kind": kind,
+        "valid": error_count == 0,
+        "invalid_records": invalid_records,
+        "error_count": error_count,
+        "errors": errors,
+        "seconds": round(time.perf_counter() - started, 6),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Потоковая проверка каталогов альбомов по одной записи")
+    parser.add_argument("paths", nargs="+", help="*.xml, *.json или *.jsonl")
+    parser.add_argument("--xsd", default=XSD_PATH)
+    parser.add_argument("--schema", default=JSON_SCHEMA_PATH)
+    parser.add_argument("--max-errors", type=int, default=MAX_ERRORS)
+    args = parser.parse_args()
+
+    xsd = album_xsd(args.xsd)
+    json_validator = album_json_validator(args.schema)
+    ok = True
+    for path in args.paths:
+        result = stream_validate(path, xsd, json_validator, args.max_errors)
+        ok = ok and result["valid"]
+        print(json.dumps(result, ensure_ascii=False))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
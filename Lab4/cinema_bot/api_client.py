@@ -4,23 +4,182 @@
 Реализует все запросы к внешнему API
 """
 
+import asyncio
+import random
 import requests
-from typing import Optional, List, Dict, Any
+import aiohttp
+from typing import Optional, List, Dict, Any, Tuple
 import logging
-from config import KINOPOISK_API_KEY, KINOPOISK_API_URL
+from config import (
+    KINOPOISK_API_KEY, KINOPOISK_API_URL, API_TIMEOUT,
+    API_POOL_LIMIT, API_POOL_LIMIT_PER_HOST, API_KEEPALIVE_TIMEOUT,
+    CACHE_FLUSH_DELAY
+)
+from response_cache import ResponseCache
 
 logger = logging.getLogger(__name__)
 
 
+class KinopoiskRequests:
+    """
+    Параметры запросов к API Кинопоиска
+    Общие для синхронного и асинхронного клиентов
+    """
+    
+    @staticmethod
+    def search_params(name: str, limit: int = 5) -> Dict[str, Any]:
+        """Параметры поиска фильма по названию"""
+        return {
+            "page": 1,
+            "limit": limit,
+            "query": name,
+            "type": "movie"
+        }
+    
+    @staticmethod
+    def genre_params(genre: str, limit: int = 10, min_rating: float = 7.0) -> Dict[str, Any]:
+        """Параметры подборки по жанру с фильтрацией по рейтингу"""
+        return {
+            "page": 1,
+            "limit": limit,
+            "genres.name": genre,
+            "rating.kp": f"{min_rating}-10",
+            "sortField": "rating.kp",
+            "sortType": "-1",
+            "type": "movie"
+        }
+    
+    @staticmethod
+    def top_params(limit: int = 10, min_rating: float = 8.0) -> Dict[str, Any]:
+        """Параметры топа фильмов по рейтингу"""
+        return {
+            "page": 1,
+            "limit": limit,
+            "rating.kp": f"{min_rating}-10",
+            "votes.kp": "100000-10000000",  # Только популярные фильмы
+            "sortField": "rating.kp",
+            "sortType": "-1",
+            "type": "movie"
+        }
+    
+    @staticmethod
+    def random_params(min_rating: float = 7.0) -> Dict[str, Any]:
+        """Параметры случайной страницы хороших фильмов"""
+        # Получаем случайную страницу от 1 до 50
+        random_page = random.randint(1, 50)
+        
+        return {
+            "page": random_page,
+            "limit": 10,
+            "rating.kp": f"{min_rating}-10",
+            "votes.kp": "10000-10000000",
+            "type": "movie"
+        }
+    
+    @staticmethod
+    def popular_params(limit: int = 10) -> Dict[str, Any]:
+        """
+        Параметры популярных фильмов и сериалов
+        Сортировка по количеству просмотров (votes.kp) - это показатель популярности
+        """
+        return {
+            "page": 1,
+            "limit": limit,
+            "year": "2025",  # Только свежие
+            "votes.kp": "10000-10000000",  # Только с большим количеством просмотров
+            "sortField": "votes.kp",  # Сортируем по популярности
+            "sortType": "-1",  # По убыванию
+            "type": ["movie", "tv-series"]  # Фильмы и сериалы
+        }
+    
+    @staticmethod
+    def updated_params(since: Optional[str], until: str, page: int = 1,
+                       limit: int = 250, min_votes: int = 1000) -> Dict[str, Any]:
+        """
+        Параметры выгрузки фильмов, измененных за период (для зеркала каталога)
+        
+        Args:
+            since: Начало периода (дд.мм.гггг) или None — без ограничения
+            until: Конец периода (дд.мм.гггг)
+            page: Номер страницы
+            limit: Фильмов на странице
+            min_votes: Минимальное количество оценок
+        """
+        params = {
+            "page": page,
+            "limit": limit,
+            "votes.kp": f"{min_votes}-100000000",
+            "sortField": "updatedAt",
+            "sortType": "1",
+            "type": ["movie", "tv-series"],
+            "selectFields": [
+                "id", "name", "alternativeName", "year", "type", "rating", "votes",
+                "genres", "shortDescription", "description", "poster", "updatedAt"
+            ]
+        }
+        if since:
+            params["updatedAt"] = f"{since}-{until}"
+        return params
+    
+    @staticmethod
+    def docs(result: Optional[Dict]) -> List[Dict]:
+        """Список фильмов из ответа API"""
+        if result and "docs" in result:
+            return result["docs"]
+        return []
+    
+    @staticmethod
+    def pick_random(result: Optional[Dict]) -> Optional[Dict]:
+        """Случайный фильм из ответа API"""
+        docs = KinopoiskRequests.docs(result)
+        if docs:
+            return random.choice(docs)
+        return None
+
+
+def query_items(params: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """
+    Параметры запроса в виде пар (ключ, значение)
+    Списки разворачиваются в повторяющиеся ключи, как это делает requests
+    """
+    items = []
+    for key, value in params.items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for v in values:
+            items.append((key, str(v)))
+    return items
+
+
+def cache_lookup(cache: Optional[ResponseCache], kind: str, endpoint: str,
+                 params: Dict[str, Any]) -> Tuple[Optional[str], Optional[Dict]]:
+    """
+    Поиск ответа в кэше
+    
+    Returns:
+        (ключ кэша или None, если запрос не кэшируется; ответ из кэша или None)
+    """
+    key = cache_key(cache, kind, endpoint, params)
+    return key, (cache.get(key) if key is not None else None)
+
+
+def cache_key(cache: Optional[ResponseCache], kind: str, endpoint: str,
+              params: Dict[str, Any]) -> Optional[str]:
+    """Ключ кэша или None, если запрос не кэшируется"""
+    if cache is None or cache.ttl(kind) <= 0:
+        return None
+    return cache.make_key(endpoint, query_items(params))
+
+
 class KinopoiskAPIClient:
-    """Клиент для работы с API Кинопоиска"""
+    """Клиент для работы с API Кинопоиска (блокирующий, на requests)"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, cache: Optional[ResponseCache] = None):
         """
         Инициализация клиента
         
         Args:
             api_key: API ключ для доступа к Кинопоиску
+            cache: Кэш ответов (необязательно)
         """
         self.api_key = api_key
         self.base_url = KINOPOISK_API_URL
@@ -28,26 +187,35 @@ class KinopoiskAPIClient:
             "X-API-KEY": self.api_key,
             "Content-Type": "application/json"
         }
+        self.cache = cache
     
-    def _make_request(self, endpoint: str, params: Dict[str, Any]) -> Optional[Dict]:
+    def _make_request(self, endpoint: str, params: Dict[str, Any],
+                      kind: str = "") -> Optional[Dict]:
         """
         Выполняет HTTP-запрос к API
         
         Args:
             endpoint: Конечная точка API
             params: Параметры запроса
+            kind: Вид запроса для выбора времени жизни в кэше
             
         Returns:
             Словарь с ответом или None в случае ошибки
         """
+        key, cached = cache_lookup(self.cache, kind, endpoint, params)
+        if cached is not None:
+            return cached
         try:
             url = f"{self.base_url}/{endpoint}"
-            response = requests.get(url, headers=self.headers, params=params, timeout=10)
+            response = requests.get(url, headers=self.headers, params=params, timeout=API_TIMEOUT)
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            result = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
             logger.error(f"Ошибка при запросе к API: {e}")
             return None
+        if key is not None:
+            self.cache.set(key, result, self.cache.ttl(kind))
+        return result
     
     def search_movie_by_name(self, name: str, limit: int = 5) -> List[Dict]:
         """
@@ -60,18 +228,8 @@ class KinopoiskAPIClient:
         Returns:
             Список найденных фильмов
         """
-        params = {
-            "page": 1,
-            "limit": limit,
-            "query": name,
-            "type": "movie"
-        }
-        
-        result = self._make_request("movie/search", params)
-        
-        if result and "docs" in result:
-            return result["docs"]
-        return []
+        result = self._make_request("movie/search", KinopoiskRequests.search_params(name, limit), "search")
+        return KinopoiskRequests.docs(result)
     
     def get_movies_by_genre(self, genre: str, limit: int = 10, 
                            min_rating: float = 7.0) -> List[Dict]:
@@ -86,21 +244,8 @@ class KinopoiskAPIClient:
         Returns:
             Список фильмов
         """
-        params = {
-            "page": 1,
-            "limit": limit,
-            "genres.name": genre,
-            "rating.kp": f"{min_rating}-10",
-            "sortField": "rating.kp",
-            "sortType": "-1",
-            "type": "movie"
-        }
-        
-        result = self._make_request("movie", params)
-        
-        if result and "docs" in result:
-            return result["docs"]
-        return []
+        result = self._make_request("movie", KinopoiskRequests.genre_params(genre, limit, min_rating), "genre")
+        return KinopoiskRequests.docs(result)
     
     def get_top_movies(self, limit: int = 10, min_rating: float = 8.0) -> List[Dict]:
         """
@@ -113,21 +258,8 @@ class KinopoiskAPIClient:
         Returns:
             Список лучших фильмов
         """
-        params = {
-            "page": 1,
-            "limit": limit,
-            "rating.kp": f"{min_rating}-10",
-            "votes.kp": "100000-10000000",  # Только популярные фильмы
-            "sortField": "rating.kp",
-            "sortType": "-1",
-            "type": "movie"
-        }
-        
-        result = self._make_request("movie", params)
-        
-        if result and "docs" in result:
-            return result["docs"]
-        return []
+        result = self._make_request("movie", KinopoiskRequests.top_params(limit, min_rating), "top")
+        return KinopoiskRequests.docs(result)
     
     def get_random_movie(self, min_rating: float = 7.0) -> Optional[Dict]:
         """
@@ -139,25 +271,21 @@ class KinopoiskAPIClient:
         Returns:
             Случайный фильм
         """
-        import random
-        
-        # Получаем случайную страницу от 1 до 50
-        random_page = random.randint(1, 50)
-        
-        params = {
-            "page": random_page,
-            "limit": 10,
-            "rating.kp": f"{min_rating}-10",
-            "votes.kp": "10000-10000000",
-            "type": "movie"
-        }
-        
-        result = self._make_request("movie", params)
+        result = self._make_request("movie", KinopoiskRequests.random_params(min_rating), "random")
+        return KinopoiskRequests.pick_random(result)
+    
+    def get_random_movies(self, min_rating: float = 7.0) -> List[Dict]:
+        """
+        Получение случайной страницы фильмов с хорошим рейтингом
         
-        if result and "docs" in result and len(result["docs"]) > 0:
-            # Выбираем случайный фильм из полученных
-            return random.choice(result["docs"])
-        return None
+        Args:
+            min_rating: Минимальный рейтинг
+            
+        Returns:
+            Список фильмов со случайной страницы
+        """
+        result = self._make_request("movie", KinopoiskRequests.random_params(min_rating), "random")
+        return KinopoiskRequests.docs(result)
     
     def get_popular_movies(self, limit: int = 10) -> List[Dict]:
         """
@@ -170,20 +298,226 @@ class KinopoiskAPIClient:
         Returns:
             Список популярных фильмов
         """
-        # Получаем популярные фильмы и сериалы за последние 2 года
-        # Сортируем по количеству просмотров (votes.kp) - это показатель популярности
-        params = {
-            "page": 1,
-            "limit": limit,
-            "year": "2025",  # Только свежие
-            "votes.kp": "10000-10000000",  # Только с большим количеством просмотров
-            "sortField": "votes.kp",  # Сортируем по популярности
-            "sortType": "-1",  # По убыванию
-            "type": ["movie", "tv-series"]  # Фильмы и сериалы
+        result = self._make_request("movie", KinopoiskRequests.popular_params(limit), "popular")
+        return KinopoiskRequests.docs(result)
+
+
+class _Flight:
+    """Запрос в полете: общая задача и число ожидающих ее вызовов"""
+    
+    __slots__ = ("task", "waiters")
+    
+    def __init__(self, task: "asyncio.Future"):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncKinopoiskAPIClient:
+    """
+    Асинхронный клиент для работы с API Кинопоиска
+    
+    Все запросы идут через одну сессию aiohttp с общим пулом
+    keep-alive соединений, поэтому медленный ответ API задерживает
+    только свой обработчик, а не весь цикл событий бота.
+    Методы те же, что у KinopoiskAPIClient, но их нужно ожидать (await).
+    Одинаковые одновременные запросы объединяются: HTTP-запрос уходит
+    один раз, остальные вызовы ждут его результат.
+    Отмена задачи обработчика прерывает HTTP-запрос, если его результат
+    больше никто не ждет.
+    """
+    
+    def __init__(self, api_key: str, timeout: float = API_TIMEOUT,
+                 pool_limit: int = API_POOL_LIMIT,
+                 pool_limit_per_host: int = API_POOL_LIMIT_PER_HOST,
+                 cache: Optional[ResponseCache] = None):
+        """
+        Инициализация клиента (сессия создается при первом запросе,
+        внутри работающего цикла событий)
+        
+        Args:
+            api_key: API ключ для доступа к Кинопоиску
+            timeout: Таймаут одного запроса, секунд
+            pool_limit: Максимум соединений в пуле
+            pool_limit_per_host: Максимум соединений к одному хосту
+            cache: Кэш ответов (необязательно)
+        """
+        self.api_key = api_key
+        self.base_url = KINOPOISK_API_URL
+        self.headers = {
+            "X-API-KEY": self.api_key,
+            "Content-Type": "application/json"
         }
+        self.timeout = timeout
+        self.pool_limit = pool_limit
+        self.pool_limit_per_host = pool_limit_per_host
+        self.cache = cache
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Запросы в полете: ключ -> _Flight
+        self._in_flight: Dict[str, "_Flight"] = {}
+        # Отложенная запись новых ответов в кэш на диске
+        self._cache_flush: Optional[asyncio.Task] = None
+        self.http_requests = 0
+        self.coalesced_requests = 0
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Общая сессия клиента (создается заново, если была закрыта)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                keepalive_timeout=API_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+    
+    async def close(self):
+        """Закрытие сессии и всех соединений пула, запись ответов в кэш на диске"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self._cache_flush is not None:
+            self._cache_flush.cancel()
+            await asyncio.gather(self._cache_flush, return_exceptions=True)
+            self._cache_flush = None
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.flush)
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+    
+    async def _make_request(self, endpoint: str, params: Dict[str, Any],
+                            kind: str = "") -> Optional[Dict]:
+        """
+        Выполняет HTTP-запрос к API
         
-        result = self._make_request("movie", params)
+        Ошибки сети, таймауты и ответы с кодом ошибки логируются
+        и дают None; отмена (asyncio.CancelledError) пробрасывается.
         
-        if result and "docs" in result:
-            return result["docs"]
-        return []
\ No newline at end of file
+        Args:
+            endpoint: Конечная точка API
+            params: Параметры запроса
+            kind: Вид запроса для выбора времени жизни в кэше
+            
+        Returns:
+            Словарь с ответом или None в случае ошибки
+        """
+        key = cache_key(self.cache, kind, endpoint, params)
+        if key is not None:
+            cached = await self.cache.get_async(key)
+            if cached is not None:
+                return cached
+        
+        flight_key = key or ResponseCache.make_key(endpoint, query_items(params))
+        flight = self._in_flight.get(flight_key)
+        if flight is None:
+            task = asyncio.ensure_future(self._fetch(endpoint, params, key, kind))
+            flight = self._in_flight[flight_key] = _Flight(task)
+            task.add_done_callback(lambda _: self._forget(flight_key, flight))
+            self.http_requests += 1
+        else:
+            self.coalesced_requests += 1
+        
+        flight.waiters += 1
+        try:
+            # shield: отмена одного ожидающего не отменяет общий запрос
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                self._forget(flight_key, flight)
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+    
+    def _forget(self, flight_key: str, flight: "_Flight"):
+        """Удаление завершенного (или отмененного) запроса из списка в полете"""
+        if self._in_flight.get(flight_key) is flight:
+            del self._in_flight[flight_key]
+    
+    async def _fetch(self, endpoint: str, params: Dict[str, Any],
+                     key: Optional[str], kind: str) -> Optional[Dict]:
+        """HTTP-запрос к API с сохранением ответа в кэш"""
+        url = f"{self.base_url}/{endpoint}"
+        try:
+            async with self._get_session().get(url, params=query_items(params)) as response:
+                response.raise_for_status()
+                result = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.error(f"Ошибка при запросе к API: {e!r}")
+            return None
+        if key is not None:
+            self.cache.set(key, result, self.cache.ttl(kind), defer=True)
+            self._schedule_cache_flush()
+        return result
+    
+    def _schedule_cache_flush(self):
+        """Запуск отложенной записи ответов на диск, если она еще не запланирована"""
+        if self.cache.backend is None:
+            return
+        if self._cache_flush is None or self._cache_flush.done():
+            self._cache_flush = asyncio.ensure_future(self._flush_cache_later())
+    
+    async def _flush_cache_later(self):
+        """Запись накопившихся ответов одной транзакцией в отдельном потоке"""
+        await asyncio.sleep(CACHE_FLUSH_DELAY)
+        await asyncio.to_thread(self.cache.flush)
+    
+    def coalescing_stats(self) -> Dict[str, Any]:
+        """Счетчики объединения одинаковых запросов"""
+        total = self.http_requests + self.coalesced_requests
+        return {
+            "http_requests": self.http_requests,
+            "coalesced": self.coalesced_requests,
+            "coalescing_ratio": round(self.coalesced_requests / total, 3) if total else 0.0,
+            "in_flight": len(self._in_flight),
+        }
+    
+    async def search_movie_by_name(self, name: str, limit: int = 5) -> List[Dict]:
+        """Поиск фильма по названию (см. KinopoiskAPIClient.search_movie_by_name)"""
+        result = await self._make_request("movie/search", KinopoiskRequests.search_params(name, limit), "search")
+        return KinopoiskRequests.docs(result)
+    
+    async def get_movies_by_genre(self, genre: str, limit: int = 10,
+                                  min_rating: float = 7.0) -> List[Dict]:
+        """Фильмы по жанру с фильтрацией по рейтингу"""
+        result = await self._make_request("movie", KinopoiskRequests.genre_params(genre, limit, min_rating), "genre")
+        return KinopoiskRequests.docs(result)
+    
+    async def get_top_movies(self, limit: int = 10, min_rating: float = 8.0) -> List[Dict]:
+        """Топ фильмов по рейтингу"""
+        result = await self._make_request("movie", KinopoiskRequests.top_params(limit, min_rating), "top")
+        return KinopoiskRequests.docs(result)
+    
+    async def get_random_movie(self, min_rating: float = 7.0) -> Optional[Dict]:
+        """Случайный фильм с хорошим рейтингом"""
+        result = await self._make_request("movie", KinopoiskRequests.random_params(min_rating), "random")
+        return KinopoiskRequests.pick_random(result)
+    
+    async def get_random_movies(self, min_rating: float = 7.0) -> List[Dict]:
+        """Случайная страница фильмов с хорошим рейтингом"""
+        result = await self._make_request("movie", KinopoiskRequests.random_params(min_rating), "random")
+        return KinopoiskRequests.docs(result)
+    
+    async def get_updated_movies(self, since: Optional[str], until: str, page: int = 1,
+                                 limit: int = 250, min_votes: int = 1000) -> Optional[Dict]:
+        """
+        Страница фильмов, измененных за период (см. KinopoiskRequests.updated_params)
+        
+        Returns:
+            Ответ API целиком (docs, page, pages) или None в случае ошибки
+        """
+        params = KinopoiskRequests.updated_params(since, until, page, limit, min_votes)
+        return await self._make_request("movie", params)
+    
+    async def get_popular_movies(self, limit: int = 10) -> List[Dict]:
+        """Популярные фильмы и сериалы (то что сейчас смотрят)"""
+        result = await self._make_request("movie", KinopoiskRequests.popular_params(limit), "popular")
+        return KinopoiskRequests.docs(result)
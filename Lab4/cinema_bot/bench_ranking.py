@@ -0,0 +1,86 @@
+import argparse
+import copy
+import random
+import time
+
+from filters import MovieDataProcessor, MovieRanker
+
+# Микробенчмарк: filter_by_rating / sort_by_weighted_rating из MovieDataProcessor
+# против векторного MovieRanker на синтетическом каталоге.
+
+
+def make_catalog(size, seed=1):
+    """Фильмы в формате ответа API со случайными рейтингами и числом голосов"""
+    rnd = random.Random(seed)
+    movies = []
+    for i in range(size):
+        votes = int(rnd.paretovariate(1.2) * 500) if rnd.random() > 0.02 else 0
+        movies.append({
+            "id": i + 1,
+            "name": f"Фильм {i + 1}",
+            "rating": {"kp": round(rnd.uniform(3.0, 9.5), 1), "imdb": round(rnd.uniform(3.0, 9.5), 1)},
+            "votes": {"kp": votes, "imdb": votes // 2},
+        })
+    return movies
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def check_same(movies, k, min_rating, min_votes):
+    original = copy.deepcopy(movies)
+    ranker = MovieRanker(movies, mean_rating=7.0)
+    assert movies == original, "MovieRanker изменил входные словари"
+    assert ranker.filter(min_rating, min_votes) == MovieDataProcessor.filter_by_rating(
+        movies, min_rating, min_votes)
+    old_top = MovieDataProcessor.sort_by_weighted_rating(movies)[:k]
+    assert movies == original, "sort_by_weighted_rating изменил входные словари"
+    new_scores = [round(float(s), 2) for s in ranker.scores[ranker.top_indices(k)]]
+    # порядок при равных (после округления) рейтингах может отличаться
+    assert new_scores == [MovieDataProcessor.weighted_rating(m["rating"]["kp"], m["votes"]["kp"])
+                          for m in old_top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ranking microbenchmark")
+    parser.add_argument("--size", type=int, default=100000, help="фильмов в каталоге")
+    parser.add_argument("-k", type=int, default=10, help="сколько лучших выбирать")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    movies = make_catalog(args.size)
+    min_rating, min_votes = 7.0, 1000
+    check_same(movies, args.k, min_rating, min_votes)
+    ranker = MovieRanker(movies)
+    print(f"movies: {len(movies)}, corpus mean C = {ranker.mean_rating:.3f}")
+
+    cases = [
+        ("filter_by_rating",
+         lambda: MovieDataProcessor.filter_by_rating(movies, min_rating, min_votes),
+         lambda: MovieRanker(movies).filter(min_rating, min_votes)),
+        ("top-k (build + rank)",
+         lambda: MovieDataProcessor.sort_by_weighted_rating(movies)[:args.k],
+         lambda: MovieRanker(movies).top(args.k)),
+        ("top-k (prebuilt ranker)",
+         lambda: MovieDataProcessor.sort_by_weighted_rating(movies)[:args.k],
+         lambda: ranker.top(args.k)),
+        ("filter + top-k",
+         lambda: MovieDataProcessor.sort_by_weighted_rating(
+             MovieDataProcessor.filter_by_rating(movies, min_rating, min_votes))[:args.k],
+         lambda: ranker.top(args.k, min_rating, min_votes)),
+    ]
+    print(f"{'case':26} {'processor':>12} {'ranker':>12} {'speedup':>8}")
+    for name, old_fn, new_fn in cases:
+        old = best_of(old_fn, args.repeat)
+        new = best_of(new_fn, args.repeat)
+        print(f"{name:26} {old * 1000:10.1f}ms {new * 1000:10.1f}ms {old / new:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,11 +14,17 @@ from aiogram.enums import ParseMode
 # Импорт модулей проекта
 from config import (
     BOT_TOKEN, KINOPOISK_API_KEY, WELCOME_MESSAGE, HELP_MESSAGE,
-    MIN_RATING, MAX_RESULTS, MIN_VOTES, AVAILABLE_GENRES
+    MIN_RATING, MAX_RESULTS, MIN_VOTES, AVAILABLE_GENRES,
+    CACHE_TTL, CACHE_MAX_ENTRIES, CACHE_DB_PATH, CATALOG_DB_PATH, USER_DB_PATH
 )
-from api_client import KinopoiskAPIClient
-from filters import MovieDataProcessor
-from user_storage import UserStorage
+from api_client import AsyncKinopoiskAPIClient
+from response_cache import ResponseCache, SQLiteCacheBackend
+from random_pool import RandomMoviePool
+from catalog import MovieCatalog, CatalogFirstClient, sync_loop
+from title_search import TitleIndex
+from filters import MovieDataProcessor, render_cache
+from outbox import OutboundScheduler
+from user_storage import UserStorage, SQLiteUserBackend
 
 # Настройка логирования
 logging.basicConfig(
@@ -30,9 +36,21 @@ logger = logging.getLogger(__name__)
 # Инициализация компонентов
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
-api_client = KinopoiskAPIClient(KINOPOISK_API_KEY)
+response_cache = ResponseCache(
+    CACHE_MAX_ENTRIES, CACHE_TTL,
+    backend=SQLiteCacheBackend(CACHE_DB_PATH) if CACHE_DB_PATH else None
+)
+api_client = AsyncKinopoiskAPIClient(KINOPOISK_API_KEY, cache=response_cache)
+catalog = MovieCatalog(CATALOG_DB_PATH) if CATALOG_DB_PATH else None
+title_index = TitleIndex(catalog) if catalog is not None else None
+# Подборки и поиск идут по локальному зеркалу, API — при промахах
+movie_source = CatalogFirstClient(api_client, catalog, title_index)
+random_pool = RandomMoviePool(movie_source, min_rating=MIN_RATING)
 processor = MovieDataProcessor()
-user_storage = UserStorage()
+# Ответы из нескольких сообщений отправляются в фоне с учетом ограничений Telegram
+outbox = OutboundScheduler(bot)
+# Данные пользователей сохраняются в фоне пакетами, в памяти — недавние пользователи
+user_storage = UserStorage(SQLiteUserBackend(USER_DB_PATH) if USER_DB_PATH else None)
 
 
 def get_main_keyboard():
@@ -81,7 +99,7 @@ async def cmd_start(message: Message):
     user_id = message.from_user.id
     username = message.from_user.first_name
     
-    user_storage.get_user_data(user_id)
+    await user_storage.get_user_data(user_id)
     user_storage.update_last_activity(user_id)
     
     logger.info(f"Пользователь {username} (ID: {user_id}) запустил бота")
@@ -122,7 +140,7 @@ async def cmd_movie(message: Message):
     status_msg = await message.answer(f"🔍 Ищу фильм '{movie_name}'...")
     
     try:
-        movies = api_client.search_movie_by_name(movie_name, limit=3)
+        movies = await movie_source.search_movie_by_name(movie_name, limit=3)
         
         if not movies:
             await status_msg.edit_text(
@@ -142,22 +160,11 @@ async def cmd_movie(message: Message):
         
         await status_msg.delete()
         
-        for movie in filtered_movies[:3]:
-            movie_info, poster_url = processor.format_movie_info(movie)
-            
-            if poster_url:
-                try:
-                    await message.answer_photo(
-                        photo=poster_url,
-                        caption=movie_info,
-                        parse_mode=ParseMode.HTML
-                    )
-                except:
-                    await message.answer(movie_info, parse_mode=ParseMode.HTML)
-            else:
-                await message.answer(movie_info, parse_mode=ParseMode.HTML)
-            
-            await asyncio.sleep(0.5)
+        # Карточки с постерами уходят одним альбомом
+        outbox.send_cards(
+            message.chat.id,
+            [processor.format_movie_info(movie) for movie in filtered_movies[:3]]
+        )
     
     except Exception as e:
         logger.error(f"Ошибка при поиске фильма: {e}")
@@ -200,7 +207,7 @@ async def process_genre_request(message: Message, genre: str):
     status_msg = await message.answer(f"🎭 Подбираю фильмы жанра '{genre}'...")
     
     try:
-        movies = api_client.get_movies_by_genre(
+        movies = await movie_source.get_movies_by_genre(
             genre, limit=MAX_RESULTS, min_rating=MIN_RATING
         )
         
@@ -242,7 +249,7 @@ async def cmd_top(message: Message):
     status_msg = await message.answer("🏆 Формирую топ лучших фильмов...")
     
     try:
-        movies = api_client.get_top_movies(limit=10, min_rating=8.0)
+        movies = await movie_source.get_top_movies(limit=10, min_rating=8.0)
         
         if not movies:
             await status_msg.edit_text(
@@ -255,24 +262,12 @@ async def cmd_top(message: Message):
         
         await status_msg.delete()
         
-        # Заголовок
-        await message.answer(
-            "🏆 <b>Топ-10 лучших фильмов по рейтингу</b>\n",
-            parse_mode=ParseMode.HTML
-        )
-        
-        # Выводим каждый фильм с полным описанием
+        # Заголовок и полные описания фильмов, объединенные в несколько длинных сообщений
+        texts = ["🏆 <b>Топ-10 лучших фильмов по рейтингу</b>\n"]
         for i, movie in enumerate(sorted_movies[:10], 1):
             movie_info, poster_url = processor.format_movie_info(movie, include_poster=False)
-            
-            await message.answer(
-                f"<b>#{i}</b>\n{movie_info}",
-                parse_mode=ParseMode.HTML
-            )
-            
-            # Небольшая задержка между сообщениями
-            if i < 10:
-                await asyncio.sleep(0.3)
+            texts.append(f"<b>#{i}</b>\n{movie_info}")
+        outbox.send_texts(message.chat.id, texts)
     
     except Exception as e:
         logger.error(f"Ошибка при получении топа: {e}")
@@ -290,7 +285,7 @@ async def cmd_popular(message: Message):
     status_msg = await message.answer("🔥 Получаю популярные фильмы...")
     
     try:
-        movies = api_client.get_popular_movies(limit=10)
+        movies = await movie_source.get_popular_movies(limit=10)
         
         if not movies:
             await status_msg.edit_text(
@@ -322,7 +317,7 @@ async def cmd_random(message: Message):
     status_msg = await message.answer("🎲 Выбираю случайный фильм...")
     
     try:
-        movie = api_client.get_random_movie(min_rating=MIN_RATING)
+        movie = await random_pool.get(user_id)
         
         if not movie:
             await status_msg.edit_text(
@@ -336,23 +331,10 @@ async def cmd_random(message: Message):
         
         await status_msg.delete()
         
-        if poster_url:
-            try:
-                await message.answer_photo(
-                    photo=poster_url,
-                    caption=f"🎲 <b>Случайная рекомендация:</b>\n\n{movie_info}",
-                    parse_mode=ParseMode.HTML
-                )
-            except:
-                await message.answer(
-                    f"🎲 <b>Случайная рекомендация:</b>\n\n{movie_info}",
-                    parse_mode=ParseMode.HTML
-                )
-        else:
-            await message.answer(
-                f"🎲 <b>Случайная рекомендация:</b>\n\n{movie_info}",
-                parse_mode=ParseMode.HTML
-            )
+        outbox.send_cards(
+            message.chat.id,
+            [(f"🎲 <b>Случайная рекомендация:</b>\n\n{movie_info}", poster_url)]
+        )
     
     except Exception as e:
         logger.error(f"Ошибка при получении случайного фильма: {e}")
@@ -367,7 +349,7 @@ async def cmd_stats(message: Message):
     user_id = message.from_user.id
     user_storage.update_last_activity(user_id)
     
-    stats = user_storage.get_user_statistics(user_id)
+    stats = await user_storage.get_user_statistics(user_id)
     await message.answer(stats, parse_mode=ParseMode.HTML)
 
 
@@ -439,14 +421,48 @@ async def main():
         logger.error("Ошибка: не указан KINOPOISK_API_KEY в config.py")
         return
     
+    sync_task = None
     try:
         await bot.delete_webhook(drop_pending_updates=True)
+        if catalog is not None:
+            await title_index.refresh()
+            sync_task = asyncio.create_task(
+                sync_loop(api_client, catalog, on_synced=title_index.refresh)
+            )
+        random_pool.start()
+        user_storage.start()
         
         logger.info("Бот успешно запущен!")
         await dp.start_polling(bot)
     except Exception as e:
         logger.error(f"Ошибка при запуске бота: {e}")
     finally:
+        if sync_task is not None:
+            sync_task.cancel()
+            try:
+                await sync_task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                # упавшая синхронизация не должна мешать остановке остальных компонентов
+                logger.error(f"Синхронизация каталога завершилась с ошибкой: {e!r}")
+        await random_pool.stop()
+        logger.info(f"Запас случайных фильмов: {random_pool.stats()}")
+        logger.info(f"Источник фильмов: {movie_source.stats()}")
+        logger.info(f"Кэш сообщений: {render_cache.stats()}")
+        if title_index is not None:
+            logger.info(f"Поиск по названию: {title_index.stats()}")
+        await api_client.close()
+        logger.info(f"Кэш ответов API: {response_cache.stats()}")
+        logger.info(f"Объединение запросов к API: {api_client.coalescing_stats()}")
+        if catalog is not None:
+            catalog.close()
+        response_cache.close()
+        await outbox.close()
+        logger.info(f"Отправка сообщений: {outbox.stats()}")
+        await user_storage.stop()
+        logger.info(f"Данные пользователей: {user_storage.stats()}")
+        user_storage.close()
         await bot.session.close()
 
 
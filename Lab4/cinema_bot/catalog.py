@@ -0,0 +1,440 @@
+"""
+Локальное зеркало каталога фильмов Кинопоиска в SQLite
+Подборки по жанру, топ, популярные и случайные фильмы выбираются
+по индексам локально; API используется для синхронизации и при промахах
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from config import (
+    KINOPOISK_API_KEY, CATALOG_DB_PATH, CATALOG_SYNC_INTERVAL, CATALOG_SYNC_PAGES,
+    CATALOG_PAGE_SIZE, CATALOG_MIN_VOTES
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    alternative_name TEXT,
+    year INTEGER,
+    type TEXT,
+    rating_kp REAL NOT NULL DEFAULT 0,
+    votes_kp INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS movie_genres (
+    genre TEXT NOT NULL,
+    movie_id INTEGER NOT NULL REFERENCES movies(id) ON DELETE CASCADE,
+    PRIMARY KEY (genre, movie_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS movie_genres_movie ON movie_genres (movie_id);
+CREATE INDEX IF NOT EXISTS movies_rating ON movies (type, rating_kp);
+CREATE INDEX IF NOT EXISTS movies_votes ON movies (votes_kp);
+CREATE INDEX IF NOT EXISTS movies_year_votes ON movies (year, votes_kp);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Формат дат фильтра updatedAt в API
+API_DATE_FORMAT = "%d.%m.%Y"
+
+
+class MovieCatalog:
+    """
+    Зеркало каталога фильмов
+
+    Фильм хранится целиком (JSON из ответа API), а рейтинг, число
+    оценок, год, тип и жанры вынесены в индексируемые столбцы.
+    Запросы повторяют фильтры и сортировку соответствующих запросов
+    к API (см. KinopoiskRequests в api_client.py).
+    """
+
+    def __init__(self, path: str):
+        """
+        Открытие (создание) зеркала
+
+        Args:
+            path: Путь к файлу базы данных
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        # хотя бы одна полная выгрузка завершена — зеркалу можно доверять
+        self.complete = self.get_state("synced_at") is not None
+
+    def close(self):
+        """Закрытие файла базы данных"""
+        with self._lock:
+            self._conn.close()
+
+    def _query(self, sql: str, params: Iterable[Any] = ()) -> List[Dict]:
+        """Фильмы из результата запроса, выбирающего столбец data"""
+        with self._lock:
+            rows = self._conn.execute(sql, tuple(params)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def upsert(self, movies: Iterable[Dict]) -> int:
+        """
+        Добавление или обновление фильмов
+
+        Args:
+            movies: Фильмы в формате ответа API
+
+        Returns:
+            Количество записанных фильмов
+        """
+        now = time.time()
+        count = 0
+        with self._lock, self._conn:
+            for movie in movies:
+                movie_id = movie.get("id")
+                if movie_id is None:
+                    continue
+                rating = (movie.get("rating") or {}).get("kp") or 0
+                votes = (movie.get("votes") or {}).get("kp") or 0
+                self._conn.execute(
+                    "INSERT INTO movies (id, name, alternative_name, year, type, rating_kp, votes_kp, updated_at, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET name = excluded.name, "
+                    "alternative_name = excluded.alternative_name, year = excluded.year, "
+                    "type = excluded.type, rating_kp = excluded.rating_kp, votes_kp = excluded.votes_kp, "
+                    "updated_at = excluded.updated_at, data = excluded.data",
+                    (movie_id, movie.get("name"), movie.get("alternativeName"), movie.get("year"),
+                     movie.get("type"), rating, votes, now,
+                     json.dumps(movie, ensure_ascii=False, separators=(",", ":")))
+                )
+                self._conn.execute("DELETE FROM movie_genres WHERE movie_id = ?", (movie_id,))
+                genres = {(g.get("name") or "").strip().lower() for g in movie.get("genres") or []}
+                self._conn.executemany(
+                    "INSERT INTO movie_genres (genre, movie_id) VALUES (?, ?)",
+                    [(genre, movie_id) for genre in genres if genre]
+                )
+                count += 1
+        return count
+
+    def count(self) -> int:
+        """Количество фильмов в зеркале"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM movies").fetchone()[0]
+
+    def movies_by_genre(self, genre: str, limit: int = 10, min_rating: float = 7.0) -> List[Dict]:
+        """Фильмы жанра с рейтингом не ниже min_rating, лучшие первыми"""
+        return self._query(
+            "SELECT m.data FROM movie_genres g JOIN movies m ON m.id = g.movie_id "
+            "WHERE g.genre = ? AND m.type = 'movie' AND m.rating_kp >= ? "
+            "ORDER BY m.rating_kp DESC LIMIT ?",
+            (genre.strip().lower(), min_rating, limit)
+        )
+
+    def top_movies(self, limit: int = 10, min_rating: float = 8.0) -> List[Dict]:
+        """Лучшие популярные фильмы (от 100 000 оценок) по рейтингу"""
+        return self._query(
+            "SELECT data FROM movies "
+            "WHERE type = 'movie' AND rating_kp >= ? AND votes_kp BETWEEN 100000 AND 10000000 "
+            "ORDER BY rating_kp DESC LIMIT ?",
+            (min_rating, limit)
+        )
+
+    def popular_movies(self, limit: int = 10, year: int = 2025) -> List[Dict]:
+        """Фильмы и сериалы года year по количеству оценок"""
+        return self._query(
+            "SELECT data FROM movies "
+            "WHERE year = ? AND votes_kp BETWEEN 10000 AND 10000000 AND type IN ('movie', 'tv-series') "
+            "ORDER BY votes_kp DESC LIMIT ?",
+            (year, limit)
+        )
+
+    def random_movies(self, min_rating: float = 7.0, limit: int = 10) -> List[Dict]:
+        """
+        Случайные фильмы с хорошим рейтингом (от 10 000 оценок)
+
+        Выборка начинается со случайного id и идет по первичному ключу
+        (NOT INDEXED — иначе SQLite выбирает индекс по рейтингу
+        и сортирует все подходящие фильмы).
+        """
+        with self._lock:
+            low, high = self._conn.execute("SELECT MIN(id), MAX(id) FROM movies").fetchone()
+        if low is None:
+            return []
+        start = random.randint(low, high)
+        where = "type = 'movie' AND rating_kp >= ? AND votes_kp BETWEEN 10000 AND 10000000"
+        movies = self._query(
+            f"SELECT data FROM movies NOT INDEXED WHERE id >= ? AND {where} ORDER BY id LIMIT ?",
+            (start, min_rating, limit)
+        )
+        if len(movies) < limit:
+            movies += self._query(
+                f"SELECT data FROM movies NOT INDEXED WHERE id < ? AND {where} ORDER BY id LIMIT ?",
+                (start, min_rating, limit - len(movies))
+            )
+        return movies
+
+    def titles(self) -> List[tuple]:
+        """Названия всех фильмов: (id, name, alternative_name, rating_kp, votes_kp)"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, name, alternative_name, rating_kp, votes_kp FROM movies"
+            ).fetchall()
+
+    def get_movies(self, ids: List[int]) -> List[Dict]:
+        """Фильмы с указанными id в том же порядке (отсутствующие пропускаются)"""
+        if not ids:
+            return []
+        placeholders = ", ".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, data FROM movies WHERE id IN ({placeholders})", tuple(ids)
+            ).fetchall()
+        found = {row[0]: json.loads(row[1]) for row in rows}
+        return [found[movie_id] for movie_id in ids if movie_id in found]
+
+    def get_state(self, key: str) -> Optional[Any]:
+        """Значение состояния синхронизации"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_state(self, key: str, value: Optional[Any]):
+        """Сохранение (None — удаление) значения состояния синхронизации"""
+        with self._lock, self._conn:
+            if value is None:
+                self._conn.execute("DELETE FROM sync_state WHERE key = ?", (key,))
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+                    (key, json.dumps(value))
+                )
+        if key == "synced_at" and value is not None:
+            self.complete = True
+
+
+async def sync_catalog(client, catalog: MovieCatalog, full: bool = False,
+                       max_pages: int = CATALOG_SYNC_PAGES) -> Dict[str, Any]:
+    """
+    Инкрементальная синхронизация зеркала с API
+
+    Загружаются фильмы, измененные с даты прошлой завершенной
+    синхронизации (full=True — все). Если за max_pages страниц выгрузка
+    не закончилась, номер следующей страницы сохраняется и следующий
+    запуск продолжает с него.
+
+    Args:
+        client: AsyncKinopoiskAPIClient
+        catalog: Зеркало каталога
+        full: Загрузить все фильмы, а не только измененные
+        max_pages: Максимум страниц API за один запуск
+
+    Returns:
+        Статистика запуска
+    """
+    started = time.perf_counter()
+    pending = None if full else catalog.get_state("pending")
+    if pending is None:
+        synced_at = None if full else catalog.get_state("synced_at")
+        since = datetime.fromtimestamp(synced_at).strftime(API_DATE_FORMAT) if synced_at else None
+        pending = {"since": since, "until": datetime.now().strftime(API_DATE_FORMAT),
+                   "started_at": time.time(), "page": 1}
+
+    pages = stored = 0
+    complete = False
+    while pages < max_pages:
+        result = await client.get_updated_movies(
+            pending["since"], pending["until"], pending["page"],
+            limit=CATALOG_PAGE_SIZE, min_votes=CATALOG_MIN_VOTES
+        )
+        if result is None:
+            break
+        pages += 1
+        stored += await asyncio.to_thread(catalog.upsert, result.get("docs", []))
+        if pending["page"] >= (result.get("pages") or 0):
+            complete = True
+            break
+        pending["page"] += 1
+
+    if complete:
+        catalog.set_state("synced_at", pending["started_at"])
+        catalog.set_state("pending", None)
+    else:
+        catalog.set_state("pending", pending)
+    stats = {"pages": pages, "movies": stored, "complete": complete,
+             "total": catalog.count(), "seconds": round(time.perf_counter() - started, 3)}
+    logger.info(f"Синхронизация каталога: {stats}")
+    return stats
+
+
+async def sync_loop(client, catalog: MovieCatalog, interval: float = CATALOG_SYNC_INTERVAL,
+                    on_synced: Optional[Callable[[], Awaitable[Any]]] = None):
+    """
+    Периодическая синхронизация (фоновая задача бота)
+
+    Args:
+        on_synced: Вызывается после синхронизации, загрузившей фильмы
+    """
+    while True:
+        try:
+            stats = await sync_catalog(client, catalog)
+            if on_synced is not None and stats["movies"]:
+                await on_synced()
+        except Exception as e:
+            # ошибка одного запуска (в том числе в данных API) не останавливает синхронизацию
+            logger.error(f"Ошибка синхронизации каталога: {e!r}")
+            stats = {"complete": True}
+        # незаконченную выгрузку продолжаем быстрее
+        await asyncio.sleep(interval if stats["complete"] else min(interval, 60))
+
+
+class CatalogFirstClient:
+    """
+    Источник фильмов для бота: сначала локальное зеркало, затем API
+
+    Методы те же, что у AsyncKinopoiskAPIClient. Подборкам из зеркала
+    (топ, жанр, популярные) можно доверять только после первой полной
+    выгрузки, до нее они идут в API. Если зеркало дает меньше limit
+    фильмов, выполняется запрос к API, а его результат добавляется
+    в зеркало. Поиск по названию идет в API, если локальный индекс
+    названий не нашел достаточно похожих фильмов. Запросы к SQLite
+    выполняются в отдельном потоке.
+    """
+
+    def __init__(self, client, catalog: Optional[MovieCatalog], title_index=None):
+        """
+        Args:
+            client: AsyncKinopoiskAPIClient
+            catalog: Зеркало каталога или None — только API
+            title_index: TitleIndex для локального поиска по названию (необязательно)
+        """
+        self.client = client
+        self.catalog = catalog
+        self.title_index = title_index
+        self.local_hits = 0
+        self.remote_calls = 0
+
+    async def _local(self, query: str, *args, limit: int,
+                     needs_complete: bool = True) -> Optional[List[Dict]]:
+        """
+        Результат запроса к зеркалу или None, если ему нельзя доверять
+
+        Args:
+            query: Имя метода MovieCatalog
+            limit: Сколько фильмов нужно
+            needs_complete: Результат верен только для полного зеркала
+                (топ и подборки; случайным фильмам хватает и неполного)
+        """
+        if self.catalog is None or (needs_complete and not self.catalog.complete):
+            return None
+        movies = await asyncio.to_thread(getattr(self.catalog, query), *args)
+        if len(movies) >= limit:
+            self.local_hits += 1
+            return movies
+        return None
+
+    async def _learn(self, movies: List[Dict]) -> List[Dict]:
+        self.remote_calls += 1
+        if self.catalog is not None and movies:
+            try:
+                await asyncio.to_thread(self.catalog.upsert, movies)
+            except sqlite3.Error as e:
+                logger.warning(f"Не удалось сохранить фильмы в каталог: {e}")
+            else:
+                if self.title_index is not None:
+                    self.title_index.add(movies)
+        return movies
+
+    async def search_movie_by_name(self, name: str, limit: int = 5) -> List[Dict]:
+        """Поиск фильма по названию (локально, при неуверенном результате — в API)"""
+        if self.title_index is not None:
+            local = await self.title_index.lookup(name, limit)
+            if local is not None:
+                self.local_hits += 1
+                return local
+        return await self._learn(await self.client.search_movie_by_name(name, limit=limit))
+
+    async def get_movies_by_genre(self, genre: str, limit: int = 10,
+                                  min_rating: float = 7.0) -> List[Dict]:
+        """Фильмы по жанру с фильтрацией по рейтингу"""
+        local = await self._local("movies_by_genre", genre, limit, min_rating, limit=limit)
+        if local is not None:
+            return local
+        return await self._learn(await self.client.get_movies_by_genre(genre, limit=limit, min_rating=min_rating))
+
+    async def get_top_movies(self, limit: int = 10, min_rating: float = 8.0) -> List[Dict]:
+        """Топ фильмов по рейтингу"""
+        local = await self._local("top_movies", limit, min_rating, limit=limit)
+        if local is not None:
+            return local
+        return await self._learn(await self.client.get_top_movies(limit=limit, min_rating=min_rating))
+
+    async def get_popular_movies(self, limit: int = 10) -> List[Dict]:
+        """Популярные фильмы и сериалы"""
+        local = await self._local("popular_movies", limit, limit=limit)
+        if local is not None:
+            return local
+        return await self._learn(await self.client.get_popular_movies(limit=limit))
+
+    async def get_random_movies(self, min_rating: float = 7.0) -> List[Dict]:
+        """Случайные фильмы с хорошим рейтингом"""
+        local = await self._local("random_movies", min_rating, limit=1, needs_complete=False)
+        if local is not None:
+            return local
+        return await self._learn(await self.client.get_random_movies(min_rating=min_rating))
+
+    async def get_random_movie(self, min_rating: float = 7.0) -> Optional[Dict]:
+        """Случайный фильм с хорошим рейтингом"""
+        movies = await self.get_random_movies(min_rating=min_rating)
+        return random.choice(movies) if movies else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики источника"""
+        return {
+            "local_hits": self.local_hits,
+            "remote_calls": self.remote_calls,
+            "catalog_movies": self.catalog.count() if self.catalog is not None else 0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синхронизация локального зеркала каталога Кинопоиска")
+    parser.add_argument("--db", default=CATALOG_DB_PATH, help="файл зеркала")
+    parser.add_argument("--full", action="store_true", help="загрузить все фильмы, а не только измененные")
+    parser.add_argument("--pages", type=int, default=CATALOG_SYNC_PAGES, help="максимум страниц API")
+    args = parser.parse_args()
+    if not args.db:
+        parser.error("не указан файл зеркала (CATALOG_DB_PATH или --db)")
+
+    from api_client import AsyncKinopoiskAPIClient
+
+    async def run():
+        catalog = MovieCatalog(args.db)
+        try:
+            async with AsyncKinopoiskAPIClient(KINOPOISK_API_KEY) as client:
+                return await sync_catalog(client, catalog, full=args.full, max_pages=args.pages)
+        finally:
+            catalog.close()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    stats = asyncio.run(run())
+    json.dump(stats, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    return 0 if stats["pages"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,11 +11,62 @@ KINOPOISK_API_KEY = "..."
 # API endpoints
 KINOPOISK_API_URL = "https://api.kinopoisk.dev/v1.4"
 
+# Настройки HTTP-клиента
+API_TIMEOUT = 10  # Таймаут одного запроса, секунд
+API_POOL_LIMIT = 100  # Всего соединений в пуле
+API_POOL_LIMIT_PER_HOST = 20  # Соединений к одному хосту
+API_KEEPALIVE_TIMEOUT = 30  # Сколько держать простаивающее соединение, секунд
+
+# Кэш ответов API (время жизни по видам запросов, секунд; 0 — не кэшировать)
+CACHE_TTL = {
+    "search": 10 * 60,
+    "genre": 6 * 60 * 60,
+    "top": 12 * 60 * 60,
+    "popular": 60 * 60,
+    "random": 6 * 60 * 60,
+}
+CACHE_MAX_ENTRIES = 1000  # Максимум ответов в памяти
+CACHE_DB_PATH = "api_cache.sqlite3"  # Файл для кэша между перезапусками (None — только память)
+CACHE_FLUSH_DELAY = 1.0  # Задержка записи новых ответов на диск (одной транзакцией), секунд
+
+# Запас случайных рекомендаций для /random
+RANDOM_POOL_SIZE = 50  # Сколько фильмов держать наготове
+RANDOM_POOL_LOW_WATER = 15  # Ниже этого числа запас пополняется в фоне
+RANDOM_HISTORY_SIZE = 100  # Сколько последних рекомендаций не повторять пользователю
+
+# Локальное зеркало каталога фильмов
+CATALOG_DB_PATH = "catalog.sqlite3"  # Файл зеркала (None — без зеркала, только API)
+CATALOG_SYNC_INTERVAL = 6 * 60 * 60  # Период синхронизации с API, секунд
+CATALOG_SYNC_PAGES = 20  # Максимум страниц API за одну синхронизацию
+CATALOG_PAGE_SIZE = 250  # Фильмов на странице при синхронизации
+CATALOG_MIN_VOTES = 1000  # В зеркало попадают фильмы хотя бы с таким числом оценок
+
+# Данные пользователей
+USER_DB_PATH = "users.sqlite3"  # Файл с данными пользователей (None — только память)
+USER_CACHE_SIZE = 5000  # Сколько пользователей держать в памяти
+USER_FLUSH_INTERVAL = 2.0  # Период записи изменений на диск, секунд
+
+# Локальный поиск по названию (0..1): ниже этого сходства поиск идет через API
+SEARCH_CONFIDENCE = 0.75
+
 # Настройки фильтрации
 MIN_RATING = 7.0  # Минимальный рейтинг для рекомендаций
 MAX_RESULTS = 10  # Максимальное количество результатов
 MIN_VOTES = 1000  # Минимальное количество оценок для надежности рейтинга
 
+# Взвешенный рейтинг (формула IMDB)
+WR_MIN_VOTES = 25000  # m — голосов, при которых рейтинг фильма и средний весят поровну
+WR_MEAN_RATING = 7.0  # C для небольших выборок (для каталога берется среднее по нему)
+
+# Кэш готовых текстов сообщений (карточки и списки фильмов)
+RENDER_CACHE_SIZE = 2000
+
+# Ограничения отправки сообщений Telegram
+SEND_GLOBAL_RATE = 30  # Сообщений в секунду для всего бота
+SEND_CHAT_RATE = 1  # Сообщений в секунду в один чат
+SEND_CHAT_BURST = 3  # Сколько сообщений в чат можно отправить подряд
+SEND_MAX_RETRIES = 3  # Повторов после ответа «retry after»
+
 # Доступные жанры
 AVAILABLE_GENRES = [
     "драма", "комедия", "боевик", "триллер", "ужасы",
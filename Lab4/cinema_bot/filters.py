@@ -3,12 +3,120 @@
 Нетривиальные алгоритмы обработки и фильтрации данных о фильмах
 """
 
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence, Callable
+from collections import OrderedDict
 import logging
 import re
+import numpy as np
+from config import WR_MIN_VOTES, WR_MEAN_RATING, RENDER_CACHE_SIZE
 
 logger = logging.getLogger(__name__)
 
+_EMPTY: Dict = {}
+_UNSUPPORTED_TAGS = re.compile(r'</?(?!b|i|u|s|code|pre|a)[^>]*>')
+
+# Шаблоны сообщений (разбираются один раз, при импорте)
+_INFO_FORMAT = (
+    "🎬 <b>{name}</b> ({year})\n\n"
+    "⭐️ Рейтинг: <b>{rating:.1f}</b>/10\n"
+    "📊 Оценок: {votes}\n"
+    "🎭 Жанр: {genres}\n"
+    "🏆 Качество: {quality}\n"
+    "📈 Популярность: {popularity}\n"
+    "📅 Эпоха: {era}\n"
+).format
+_DESCRIPTION_FORMAT = "\n📝 {}\n".format
+_LIST_TITLE_FORMAT = "🎬 <b>{}</b>\n\n".format
+_NUMBER_FORMAT = "<b>{}.</b> ".format
+_LIST_ITEM_FORMAT = "{name} ({year})\n   ⭐️ {rating:.1f} | 🎭 {genres}\n\n".format
+POPULAR_HEADER = (
+    "🔥 <b>Что сейчас смотрят (популярные новинки)</b>\n"
+    "<i>По данным посещаемости Кинопоиска</i>\n\n"
+)
+_PLACE_FORMAT = "{} <b>{}.</b> ".format
+_POPULAR_ITEM_FORMAT = "{name} ({year}) {type_emoji} <i>{type_text}</i>\n".format
+
+
+def movie_version(movie: Dict) -> tuple:
+    """
+    Версия данных фильма для кэша отрисовки: все поля, которые попадают
+    в текст сообщений. Изменились данные — изменилась версия.
+    """
+    genres = movie.get("genres") or ()
+    return (
+        movie.get("name"), movie.get("alternativeName"), movie.get("year"), movie.get("type"),
+        (movie.get("rating") or _EMPTY).get("kp"), (movie.get("votes") or _EMPTY).get("kp"),
+        tuple(g.get("name") for g in genres), movie.get("shortDescription"), movie.get("description"),
+    )
+
+
+class RenderCache:
+    """
+    Кэш готовых текстов сообщений (LRU)
+    
+    Ключ — id фильма и шаблон; вместе с текстом хранится версия данных,
+    и при ее изменении текст отрисовывается заново. Для списков ключ —
+    шаблон и id всех фильмов, а версия — версии всех фильмов списка.
+    """
+    
+    def __init__(self, max_entries: int = RENDER_CACHE_SIZE):
+        """
+        Args:
+            max_entries: Максимальное количество готовых текстов
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    def render(self, key: tuple, version: tuple, build: Callable[[], str]) -> str:
+        """
+        Готовый текст по ключу или результат build() (он сохраняется)
+        
+        Args:
+            key: (шаблон, id); если id нет, текст не кэшируется
+            version: Версия данных (см. movie_version)
+            build: Отрисовка текста
+        """
+        if key[-1] is None:
+            return build()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.invalidations += 1
+        self.misses += 1
+        text = build()
+        self._entries[key] = (version, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return text
+    
+    def render_list(self, key: tuple, movies: List[Dict], build: Callable[[], str]) -> str:
+        """Готовый текст списка фильмов (см. render)"""
+        ids = tuple(movie.get("id") for movie in movies)
+        if None in ids:
+            return build()
+        version = tuple(movie_version(movie) for movie in movies)
+        return self.render(key + (ids,), version, build)
+    
+    def clear(self):
+        """Очистка кэша"""
+        self._entries.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        """Счетчики кэша"""
+        return {"entries": len(self._entries), "hits": self.hits,
+                "misses": self.misses, "invalidations": self.invalidations}
+
+
+# Общий кэш отрисовки сообщений бота
+render_cache = RenderCache()
+
 
 class MovieDataProcessor:
     """Класс для обработки и анализа данных о фильмах"""
@@ -42,6 +150,27 @@ class MovieDataProcessor:
         
         return filtered
     
+    @staticmethod
+    def weighted_rating(rating: float, votes: int) -> float:
+        """
+        Взвешенный рейтинг одного фильма (см. sort_by_weighted_rating)
+        
+        Args:
+            rating: Средний рейтинг фильма
+            votes: Количество голосов
+            
+        Returns:
+            Взвешенный рейтинг, округленный до сотых (0 для фильма без голосов)
+        """
+        MIN_VOTES_THRESHOLD = WR_MIN_VOTES
+        MEAN_RATING = WR_MEAN_RATING
+        
+        if votes > 0:
+            weighted = (votes / (votes + MIN_VOTES_THRESHOLD)) * rating + \
+                      (MIN_VOTES_THRESHOLD / (votes + MIN_VOTES_THRESHOLD)) * MEAN_RATING
+            return round(weighted, 2)
+        return 0
+    
     @staticmethod
     def sort_by_weighted_rating(movies: List[Dict]) -> List[Dict]:
         """
@@ -54,9 +183,12 @@ class MovieDataProcessor:
         где:
         - WR = взвешенный рейтинг
         - v = количество голосов за фильм
-        - m = минимум голосов для попадания в топ (например, 25000)
+        - m = минимум голосов для попадания в топ (WR_MIN_VOTES, 25000)
         - R = средний рейтинг фильма
-        - C = средний рейтинг по всем фильмам (например, 7.0)
+        - C = средний рейтинг по всем фильмам (WR_MEAN_RATING, 7.0)
+        
+        Входные словари не изменяются: это могут быть общие значения
+        из кэша ответов API. Для больших списков см. MovieRanker
         
         Args:
             movies: Список фильмов
@@ -64,23 +196,12 @@ class MovieDataProcessor:
         Returns:
             Отсортированный список
         """
-        MIN_VOTES_THRESHOLD = 25000
-        MEAN_RATING = 7.0
-        
-        for movie in movies:
+        def key(movie: Dict) -> float:
             rating = movie.get("rating", {}).get("kp", 0)
             votes = movie.get("votes", {}).get("kp", 0)
-            
-            # Расчет взвешенного рейтинга
-            if votes > 0:
-                weighted = (votes / (votes + MIN_VOTES_THRESHOLD)) * rating + \
-                          (MIN_VOTES_THRESHOLD / (votes + MIN_VOTES_THRESHOLD)) * MEAN_RATING
-                movie["weighted_rating"] = round(weighted, 2)
-            else:
-                movie["weighted_rating"] = 0
-        
-        # Сортировка по взвешенному рейтингу
-        return sorted(movies, key=lambda x: x.get("weighted_rating", 0), reverse=True)
+            return MovieDataProcessor.weighted_rating(rating, votes)
+        
+        return sorted(movies, key=key, reverse=True)
     
     @staticmethod
     def analyze_movie_data(movie: Dict) -> Dict[str, any]:
@@ -151,21 +272,11 @@ class MovieDataProcessor:
         if not text:
             return ""
         # Удаляем все теги, кроме разрешенных
-        return re.sub(r'</?(?!b|i|u|s|code|pre|a)[^>]*>', '', text)
+        return _UNSUPPORTED_TAGS.sub('', text)
 
     @staticmethod
-    def format_movie_info(movie: Dict, include_poster: bool = True) -> tuple:
-        """
-        Форматирование информации о фильме для вывода в Telegram
-        Безопасно для parse_mode=HTML
-        
-        Args:
-            movie: Данные о фильме
-            include_poster: Включать ли URL постера
-            
-        Returns:
-            Кортеж (текст сообщения, URL постера или None)
-        """
+    def _render_movie_info(movie: Dict) -> str:
+        """Текст карточки фильма (без кэша)"""
         # Извлечение данных
         name = movie.get("name", movie.get("alternativeName", "Без названия"))
         name = MovieDataProcessor.clean_html(name)
@@ -182,28 +293,60 @@ class MovieDataProcessor:
         if description and len(description) > 200:
             description = description[:200] + "..."
         
+        # Анализ данных
+        analysis = MovieDataProcessor.analyze_movie_data(movie)
+        
+        # Формирование сообщения по готовому шаблону
+        message = _INFO_FORMAT(
+            name=name, year=year, rating=rating, votes=analysis['votes_formatted'],
+            genres=genres_str, quality=analysis['quality'],
+            popularity=analysis['popularity'], era=analysis['era']
+        )
+        if description:
+            message += _DESCRIPTION_FORMAT(description)
+        return message
+
+    @staticmethod
+    def format_movie_info(movie: Dict, include_poster: bool = True) -> tuple:
+        """
+        Форматирование информации о фильме для вывода в Telegram
+        Безопасно для parse_mode=HTML
+        
+        Текст берется из кэша отрисовки, пока данные фильма не менялись
+        
+        Args:
+            movie: Данные о фильме
+            include_poster: Включать ли URL постера
+            
+        Returns:
+            Кортеж (текст сообщения, URL постера или None)
+        """
+        message = render_cache.render(
+            ("info", movie.get("id")), movie_version(movie),
+            lambda: MovieDataProcessor._render_movie_info(movie)
+        )
+        
         # Постер
         poster_url = None
         if include_poster:
             poster = movie.get("poster", {})
             poster_url = poster.get("url") or poster.get("previewUrl")
         
-        # Анализ данных
-        analysis = MovieDataProcessor.analyze_movie_data(movie)
-        
-        # Формирование сообщения
-        message = f"🎬 <b>{name}</b> ({year})\n\n"
-        message += f"⭐️ Рейтинг: <b>{rating:.1f}</b>/10\n"
-        message += f"📊 Оценок: {analysis['votes_formatted']}\n"
-        message += f"🎭 Жанр: {genres_str}\n"
-        message += f"🏆 Качество: {analysis['quality']}\n"
-        message += f"📈 Популярность: {analysis['popularity']}\n"
-        message += f"📅 Эпоха: {analysis['era']}\n"
+        return message, poster_url
+    
+    @staticmethod
+    def _render_list_item(movie: Dict) -> str:
+        """Строка фильма в списке по жанру (без номера)"""
+        name = movie.get("name", movie.get("alternativeName", "Без названия"))
+        name = MovieDataProcessor.clean_html(name)
+        year = movie.get("year", "—")
+        rating = movie.get("rating", {}).get("kp", 0)
         
-        if description:
-            message += f"\n📝 {description}\n"
+        # Жанры
+        genres = movie.get("genres", [])
+        genres_str = ", ".join([MovieDataProcessor.clean_html(g.get("name", "")) for g in genres[:2]]) if genres else "—"
         
-        return message, poster_url
+        return _LIST_ITEM_FORMAT(name=name, year=year, rating=rating, genres=genres_str)
     
     @staticmethod
     def format_movies_list(movies: List[Dict], title: str = "Фильмы") -> str:
@@ -217,22 +360,35 @@ class MovieDataProcessor:
         Returns:
             Отформатированный текст
         """
-        message = f"🎬 <b>{title}</b>\n\n"
+        def build():
+            parts = [_LIST_TITLE_FORMAT(title)]
+            for i, movie in enumerate(movies, 1):
+                parts.append(_NUMBER_FORMAT(i))
+                parts.append(render_cache.render(
+                    ("list_item", movie.get("id")), movie_version(movie),
+                    lambda: MovieDataProcessor._render_list_item(movie)
+                ))
+            return "".join(parts)
+        
+        return render_cache.render_list(("list", title), movies, build)
+    
+    @staticmethod
+    def _render_popular_item(movie: Dict) -> str:
+        """Строка фильма в списке популярных (без места и номера)"""
+        name = movie.get("name", movie.get("alternativeName", "Без названия"))
+        name = MovieDataProcessor.clean_html(name)
+        year = movie.get("year", "—")
         
-        for i, movie in enumerate(movies, 1):
-            name = movie.get("name", movie.get("alternativeName", "Без названия"))
-            name = MovieDataProcessor.clean_html(name)
-            year = movie.get("year", "—")
-            rating = movie.get("rating", {}).get("kp", 0)
-            
-            # Жанры
-            genres = movie.get("genres", [])
-            genres_str = ", ".join([MovieDataProcessor.clean_html(g.get("name", "")) for g in genres[:2]]) if genres else "—"
-            
-            message += f"<b>{i}.</b> {name} ({year})\n"
-            message += f"   ⭐️ {rating:.1f} | 🎭 {genres_str}\n\n"
+        # Определяем тип (фильм или сериал)
+        movie_type = movie.get("type", "")
+        if movie_type == "tv-series":
+            type_emoji = "📺"
+            type_text = "Сериал"
+        else:
+            type_emoji = "🎬"
+            type_text = "Фильм"
         
-        return message
+        return _POPULAR_ITEM_FORMAT(name=name, year=year, type_emoji=type_emoji, type_text=type_text)
     
     @staticmethod
     def format_popular_list(movies: List[Dict]) -> str:
@@ -240,35 +396,27 @@ class MovieDataProcessor:
         Форматирование списка популярных фильмов и сериалов (то что сейчас смотрят)
         Показывает название, год и тип (фильм/сериал)
         
+        Повторный запрос того же списка отдается готовой строкой из кэша
+        
         Args:
             movies: Список фильмов
             
         Returns:
             Отформатированный текст
         """
-        message = "🔥 <b>Что сейчас смотрят (популярные новинки)</b>\n"
-        message += "<i>По данным посещаемости Кинопоиска</i>\n\n"
-        
-        for i, movie in enumerate(movies, 1):
-            name = movie.get("name", movie.get("alternativeName", "Без названия"))
-            name = MovieDataProcessor.clean_html(name)
-            year = movie.get("year", "—")
-            
-            # Определяем тип (фильм или сериал)
-            movie_type = movie.get("type", "")
-            if movie_type == "tv-series":
-                type_emoji = "📺"
-                type_text = "Сериал"
-            else:
-                type_emoji = "🎬"
-                type_text = "Фильм"
-            
-            # Эмодзи для топ-3
-            emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "📌"
-            
-            message += f"{emoji} <b>{i}.</b> {name} ({year}) {type_emoji} <i>{type_text}</i>\n"
-        
-        return message
+        def build():
+            parts = [POPULAR_HEADER]
+            for i, movie in enumerate(movies, 1):
+                # Эмодзи для топ-3
+                emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "📌"
+                parts.append(_PLACE_FORMAT(emoji, i))
+                parts.append(render_cache.render(
+                    ("popular_item", movie.get("id")), movie_version(movie),
+                    lambda: MovieDataProcessor._render_popular_item(movie)
+                ))
+            return "".join(parts)
+        
+        return render_cache.render_list(("popular",), movies, build)
     
     @staticmethod
     def deduplicate_movies(movies: List[Dict]) -> List[Dict]:
@@ -290,4 +438,111 @@ class MovieDataProcessor:
                 seen_ids.add(movie_id)
                 unique_movies.append(movie)
         
-        return unique_movies
\ No newline at end of file
+        return unique_movies
+
+
+def _kp_column(movies: Sequence[Dict], field: str) -> np.ndarray:
+    """Массив movie[field]["kp"] всех фильмов (0, если поля нет)"""
+    return np.fromiter(((movie.get(field) or _EMPTY).get("kp") or 0 for movie in movies),
+                       dtype=np.float64, count=len(movies))
+
+
+class MovieRanker:
+    """
+    Пакетное ранжирование фильмов по взвешенному рейтингу (NumPy)
+    
+    Рейтинги и число голосов один раз переносятся в массивы, дальше
+    фильтрация и расчет взвешенного рейтинга выполняются векторно.
+    C по умолчанию — средний рейтинг фильмов выборки, у которых есть
+    голоса (как в исходной формуле IMDB), а не константа. Входные
+    словари не копируются и не изменяются: результаты — это ссылки
+    на них же, а взвешенный рейтинг доступен отдельно (scores).
+    """
+    
+    def __init__(self, movies: Sequence[Dict], min_votes_threshold: int = WR_MIN_VOTES,
+                 mean_rating: Optional[float] = None):
+        """
+        Args:
+            movies: Список фильмов
+            min_votes_threshold: m в формуле взвешенного рейтинга
+            mean_rating: C в формуле; None — средний рейтинг по выборке
+        """
+        self._init(movies, _kp_column(movies, "rating"), _kp_column(movies, "votes"),
+                   min_votes_threshold, mean_rating)
+    
+    @classmethod
+    def from_arrays(cls, movies: Sequence, ratings, votes,
+                    min_votes_threshold: int = WR_MIN_VOTES,
+                    mean_rating: Optional[float] = None) -> "MovieRanker":
+        """
+        Ранжирование по готовым столбцам (например, из зеркала каталога)
+        
+        Args:
+            movies: Объекты, возвращаемые в результатах (фильмы или их id)
+            ratings: Рейтинги в том же порядке
+            votes: Количество голосов в том же порядке
+        """
+        ranker = cls.__new__(cls)
+        ranker._init(movies, np.asarray(ratings, dtype=np.float64),
+                     np.asarray(votes, dtype=np.float64), min_votes_threshold, mean_rating)
+        return ranker
+    
+    def _init(self, movies, ratings, votes, min_votes_threshold, mean_rating):
+        if ratings.shape != votes.shape or len(ratings) != len(movies):
+            raise ValueError("количество рейтингов, голосов и фильмов должно совпадать")
+        self.movies = movies
+        self.ratings = ratings
+        self.votes = votes
+        self.min_votes_threshold = min_votes_threshold
+        voted = votes > 0
+        if mean_rating is None:
+            mean_rating = float(ratings[voted].mean()) if voted.any() else WR_MEAN_RATING
+        self.mean_rating = mean_rating
+        
+        m = float(min_votes_threshold)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weight = votes / (votes + m)
+            scores = weight * ratings + (1.0 - weight) * mean_rating
+        # как в weighted_rating: у фильма без голосов взвешенный рейтинг 0
+        self.scores = np.where(voted, scores, 0.0)
+    
+    def __len__(self) -> int:
+        return len(self.movies)
+    
+    def mask(self, min_rating: float = 0.0, min_votes: int = 0) -> np.ndarray:
+        """Булев массив фильмов, проходящих фильтр (как filter_by_rating)"""
+        return (self.ratings >= min_rating) & (self.votes >= min_votes)
+    
+    def filter(self, min_rating: float = 0.0, min_votes: int = 0) -> List:
+        """Фильмы с рейтингом и числом голосов не ниже заданных, в исходном порядке"""
+        return [self.movies[i] for i in np.flatnonzero(self.mask(min_rating, min_votes))]
+    
+    def top_indices(self, k: int, min_rating: float = 0.0, min_votes: int = 0) -> np.ndarray:
+        """
+        Номера k лучших фильмов по взвешенному рейтингу среди прошедших фильтр
+        
+        Выбор k лучших — argpartition за линейное время, сортируются
+        только они; среди выбранных при равенстве раньше идет фильм,
+        стоявший раньше.
+        """
+        if min_rating > 0 or min_votes > 0:
+            candidates = np.flatnonzero(self.mask(min_rating, min_votes))
+        else:
+            candidates = np.arange(len(self.scores))
+        if k <= 0 or len(candidates) == 0:
+            return candidates[:0]
+        scores = self.scores[candidates]
+        if k < len(candidates):
+            chosen = np.argpartition(-scores, k - 1)[:k]
+        else:
+            chosen = np.arange(len(candidates))
+        order = np.lexsort((chosen, -scores[chosen]))
+        return candidates[chosen[order]]
+    
+    def top(self, k: int, min_rating: float = 0.0, min_votes: int = 0) -> List:
+        """k лучших фильмов по взвешенному рейтингу (без изменения словарей)"""
+        return [self.movies[i] for i in self.top_indices(k, min_rating, min_votes)]
+    
+    def ranked(self) -> List:
+        """Все фильмы по убыванию взвешенного рейтинга"""
+        return self.top(len(self.movies))
@@ -0,0 +1,308 @@
+"""
+Планировщик исходящих сообщений Telegram
+Соблюдает ограничения частоты отправки (общее и на чат), объединяет
+результаты в альбомы и длинные сообщения и централизованно
+обрабатывает ответы «retry after»
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import InputMediaPhoto
+
+from config import SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_CHAT_BURST, SEND_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Ограничения Telegram на длину текста и подписи, на размер альбома
+MESSAGE_LIMIT = 4096
+CAPTION_LIMIT = 1024
+MEDIA_GROUP_MAX = 10
+# Сколько ждать отправки оставшихся сообщений при остановке бота, секунд
+DRAIN_TIMEOUT = 10.0
+# При стольких ведрах чатов простаивающие удаляются
+MAX_IDLE_BUCKETS = 1000
+
+# Отправка: функция без аргументов, возвращающая корутину вызова Bot API
+Job = Callable[[], Awaitable]
+# Элемент очереди чата: функция без аргументов, выполняющая доставку целиком
+Runner = Callable[[], Awaitable]
+
+
+class TokenBucket:
+    """
+    Ведро токенов: rate отправок в секунду, до burst подряд
+
+    Ожидающие получают токены по очереди (в порядке вызова acquire).
+    """
+
+    def __init__(self, rate: float, burst: float = 1):
+        """
+        Args:
+            rate: Токенов в секунду
+            burst: Емкость ведра
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated: Optional[float] = None
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Не выдавать токены seconds секунд (ответ «retry after»)"""
+        loop = asyncio.get_running_loop()
+        self.paused_until = max(self.paused_until, loop.time() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self):
+        """Ожидание токена"""
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                if self.updated is not None:
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def pack_texts(texts: List[str], limit: int = MESSAGE_LIMIT, separator: str = "\n") -> List[str]:
+    """
+    Объединение текстов в как можно меньшее число сообщений не длиннее limit
+
+    Тексты не разрываются (HTML-разметка остается целой); текст длиннее
+    limit отправляется отдельным сообщением как есть.
+    """
+    messages = []
+    current = ""
+    for text in texts:
+        if current and len(current) + len(separator) + len(text) <= limit:
+            current += separator + text
+            continue
+        if current:
+            messages.append(current)
+        current = text
+    if current:
+        messages.append(current)
+    return messages
+
+
+class OutboundScheduler:
+    """
+    Очереди исходящих сообщений по чатам
+
+    Обработчик ставит сообщения в очередь и сразу возвращается; для
+    каждого чата с непустой очередью работает задача, которая отправляет
+    сообщения по порядку, беря токены из ведра чата и общего ведра бота.
+    На ответ «retry after» отправка в чат приостанавливается на указанное
+    время и повторяется; при ошибке отправки (например, недоступный
+    постер) выполняется запасной вариант, если он задан.
+    """
+
+    def __init__(self, bot: Bot, global_rate: float = SEND_GLOBAL_RATE,
+                 chat_rate: float = SEND_CHAT_RATE, chat_burst: int = SEND_CHAT_BURST,
+                 max_retries: int = SEND_MAX_RETRIES):
+        """
+        Args:
+            bot: Бот, от имени которого отправляются сообщения
+            global_rate: Сообщений в секунду для всего бота
+            chat_rate: Сообщений в секунду в один чат
+            chat_burst: Сколько сообщений в чат можно отправить подряд
+            max_retries: Сколько раз повторять отправку после «retry after»
+        """
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global: Optional[TokenBucket] = None
+        self._global_rate = global_rate
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._queues: Dict[int, asyncio.Queue] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+
+    def submit(self, chat_id: int, job: Job, fallback: Optional[Job] = None) -> asyncio.Future:
+        """
+        Постановка отправки в очередь чата
+
+        Args:
+            chat_id: ID чата
+            job: Отправка
+            fallback: Запасная отправка при ошибке основной
+
+        Returns:
+            Future с результатом вызова Bot API (ждать его не обязательно)
+        """
+        return self._enqueue(chat_id, lambda: self._deliver(chat_id, job, fallback))
+
+    def _enqueue(self, chat_id: int, runner: Runner) -> asyncio.Future:
+        """Постановка доставки в очередь чата и запуск задачи чата"""
+        if self._global is None:
+            self._global = TokenBucket(self._global_rate, self._global_rate)
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = asyncio.Queue()
+        queue.put_nowait((runner, future))
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._run(chat_id, queue))
+        return future
+
+    def send_texts(self, chat_id: int, texts: List[str],
+                   parse_mode: str = ParseMode.HTML) -> List[asyncio.Future]:
+        """Тексты, объединенные в минимальное число сообщений"""
+        return [
+            self.submit(chat_id, lambda text=text: self.bot.send_message(chat_id, text, parse_mode=parse_mode))
+            for text in pack_texts(texts)
+        ]
+
+    def send_cards(self, chat_id: int, cards: List[Tuple[str, Optional[str]]],
+                   parse_mode: str = ParseMode.HTML) -> List[asyncio.Future]:
+        """
+        Карточки фильмов (текст, URL постера или None)
+
+        Несколько карточек с постерами уходят одним альбомом; если альбом
+        отправить не удалось, карточки отправляются по одной, а карточка,
+        чей постер не отправился, — текстом. Каждая карточка при этом
+        отправляется не больше одного раза.
+        """
+        def single(text: str, poster: Optional[str]) -> Tuple[Job, Optional[Job]]:
+            as_text = lambda: self.bot.send_message(chat_id, text, parse_mode=parse_mode)
+            if poster and len(text) <= CAPTION_LIMIT:
+                return (lambda: self.bot.send_photo(chat_id, poster, caption=text, parse_mode=parse_mode),
+                        as_text)
+            return as_text, None
+
+        album = len(cards) > 1 and all(poster and len(text) <= CAPTION_LIMIT for text, poster in cards)
+        if album:
+            album_cards = cards[:MEDIA_GROUP_MAX]
+
+            def send_album():
+                media = [InputMediaPhoto(media=poster, caption=text, parse_mode=parse_mode)
+                         for text, poster in album_cards]
+                return self.bot.send_media_group(chat_id, media)
+
+            async def deliver_album():
+                try:
+                    return await self._deliver(chat_id, send_album)
+                except TelegramRetryAfter:
+                    # повторы исчерпаны — по одной карточке будет не лучше
+                    raise
+                except (TelegramBadRequest, TelegramAPIError) as e:
+                    logger.warning(f"Альбом не отправлен (чат {chat_id}), отправка по одной: {e}")
+                # запасной вариант — вне цикла повторов альбома: каждая карточка
+                # повторяется сама по себе, а ошибка одной не мешает остальным
+                results = []
+                for text, poster in album_cards:
+                    try:
+                        results.append(await self._deliver(chat_id, *single(text, poster)))
+                    except (TelegramRetryAfter, TelegramBadRequest, TelegramAPIError) as e:
+                        self.failed += 1
+                        logger.error(f"Не удалось отправить карточку в чат {chat_id}: {e}")
+                        results.append(None)
+                return results
+
+            futures = [self._enqueue(chat_id, deliver_album)]
+            for text, poster in cards[MEDIA_GROUP_MAX:]:
+                futures.append(self.submit(chat_id, *single(text, poster)))
+            return futures
+        return [self.submit(chat_id, *single(text, poster)) for text, poster in cards]
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _deliver(self, chat_id: int, job: Job, fallback: Optional[Job] = None):
+        """Одна отправка с ожиданием токенов, повтором после «retry after» и запасным вариантом"""
+        bucket = self._bucket(chat_id)
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            await self._global.acquire()
+            try:
+                result = await job()
+                self.sent += 1
+                return result
+            except TelegramRetryAfter as e:
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Telegram просит подождать {e.retry_after} с (чат {chat_id})")
+                # ограничение может быть общим для бота, поэтому ждут все чаты
+                bucket.pause(e.retry_after)
+                self._global.pause(e.retry_after)
+                if attempt > self.max_retries:
+                    raise
+            except (TelegramBadRequest, TelegramAPIError):
+                if fallback is None:
+                    raise
+                job, fallback = fallback, None
+
+    async def _run(self, chat_id: int, queue: asyncio.Queue):
+        """Задача чата: отправляет очередь по порядку и завершается, когда она пуста"""
+        try:
+            while not queue.empty():
+                runner, future = queue.get_nowait()
+                try:
+                    result = await runner()
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Не удалось отправить сообщение в чат {chat_id}: {e}")
+                    if not future.done():
+                        future.set_exception(e)
+                        # результат могут не ждать — не выводим «exception was never retrieved»
+                        future.exception()
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    queue.task_done()
+        finally:
+            del self._workers[chat_id]
+            self._queues.pop(chat_id, None)
+            # если задачу отменили посреди очереди, оставшиеся отправки отменяются
+            while not queue.empty():
+                queue.get_nowait()[1].cancel()
+            if len(self._buckets) > MAX_IDLE_BUCKETS:
+                self._prune_buckets()
+
+    def _prune_buckets(self):
+        """Удаление ведер чатов без очереди, которые уже снова полные"""
+        now = asyncio.get_running_loop().time()
+        for chat_id, bucket in list(self._buckets.items()):
+            if chat_id in self._workers or bucket.paused_until > now:
+                continue
+            if bucket.updated is None or bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.burst:
+                del self._buckets[chat_id]
+
+    async def close(self, timeout: float = DRAIN_TIMEOUT):
+        """Дождаться отправки поставленных сообщений (не дольше timeout), остальные отменить"""
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        done, pending = await asyncio.wait(workers, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики отправки"""
+        return {"sent": self.sent, "failed": self.failed, "retries": self.retries,
+                "active_chats": len(self._workers)}
@@ -0,0 +1,196 @@
+"""
+Запас случайных рекомендаций для команды /random
+Фоновая задача заранее загружает и фильтрует фильмы со случайных страниц API
+"""
+
+import asyncio
+import logging
+import random
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+from config import (
+    MIN_RATING, MIN_VOTES, RANDOM_POOL_SIZE, RANDOM_POOL_LOW_WATER, RANDOM_HISTORY_SIZE
+)
+from filters import MovieDataProcessor
+
+logger = logging.getLogger(__name__)
+
+# Сколько пользователей помнить для исключения повторов
+MAX_TRACKED_USERS = 10000
+# Сколько страниц подряд может не дать новых фильмов, прежде чем пополнение остановится
+MAX_EMPTY_PAGES = 5
+# Пауза перед повторной попыткой после ошибки API, секунд
+RETRY_DELAY = 5.0
+
+
+class RandomMoviePool:
+    """
+    Запас отфильтрованных фильмов для случайных рекомендаций
+
+    Одна страница API дает до 10 кандидатов, и все они идут в запас,
+    а не один выбранный фильм, поэтому запросов к API на рекомендацию
+    примерно в 10 раз меньше. Когда в запасе остается меньше low_water
+    фильмов, фоновая задача пополняет его до size. Пользователю не
+    повторяются его последние history_size рекомендаций.
+    """
+
+    def __init__(self, client, min_rating: float = MIN_RATING, min_votes: int = MIN_VOTES,
+                 size: int = RANDOM_POOL_SIZE, low_water: int = RANDOM_POOL_LOW_WATER,
+                 history_size: int = RANDOM_HISTORY_SIZE):
+        """
+        Инициализация запаса
+
+        Args:
+            client: AsyncKinopoiskAPIClient
+            min_rating: Минимальный рейтинг фильмов
+            min_votes: Минимальное количество оценок
+            size: Сколько фильмов держать наготове
+            low_water: Порог, ниже которого запас пополняется
+            history_size: Сколько последних рекомендаций не повторять пользователю
+        """
+        self.client = client
+        self.min_rating = min_rating
+        self.min_votes = min_votes
+        self.size = size
+        self.low_water = low_water
+        self.history_size = history_size
+        # id фильма -> фильм
+        self._movies: Dict[Any, Dict] = {}
+        # user_id -> (очередь id, множество id) последних рекомендаций
+        self._history: "OrderedDict[int, tuple]" = OrderedDict()
+        self._need_refill: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.served = 0
+        self.fallbacks = 0
+        self.api_calls = 0
+
+    def __len__(self) -> int:
+        return len(self._movies)
+
+    def start(self):
+        """Запуск фоновой задачи пополнения (внутри работающего цикла событий)"""
+        if self._task is None or self._task.done():
+            self._need_refill = asyncio.Event()
+            self._need_refill.set()
+            self._task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self):
+        """Остановка фоновой задачи"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def get(self, user_id: int) -> Optional[Dict]:
+        """
+        Случайный фильм для пользователя
+
+        Берется из запаса; если подходящих фильмов там нет, выполняется
+        обычный запрос к API.
+
+        Args:
+            user_id: ID пользователя
+
+        Returns:
+            Фильм или None
+        """
+        movie = self.take(user_id)
+        if movie is not None:
+            return movie
+        self.fallbacks += 1
+        movie = await self.client.get_random_movie(min_rating=self.min_rating)
+        if movie is not None:
+            self._remember(user_id, movie.get("id"))
+        return movie
+
+    def take(self, user_id: int) -> Optional[Dict]:
+        """
+        Фильм из запаса, который пользователь еще не видел, или None
+
+        Args:
+            user_id: ID пользователя
+        """
+        seen = self._history.get(user_id)
+        seen_ids = seen[1] if seen else ()
+        candidates = [movie_id for movie_id in self._movies if movie_id not in seen_ids]
+        movie = None
+        if candidates:
+            movie_id = random.choice(candidates)
+            movie = self._movies.pop(movie_id)
+            self._remember(user_id, movie_id)
+            self.served += 1
+        if len(self._movies) < self.low_water and self._need_refill is not None:
+            self._need_refill.set()
+        return movie
+
+    def _remember(self, user_id: int, movie_id: Any):
+        """Запоминание рекомендации, чтобы не повторять ее пользователю"""
+        if movie_id is None:
+            return
+        entry = self._history.get(user_id)
+        if entry is None:
+            entry = self._history[user_id] = (deque(), set())
+            while len(self._history) > MAX_TRACKED_USERS:
+                self._history.popitem(last=False)
+        else:
+            self._history.move_to_end(user_id)
+        order, ids = entry
+        if movie_id in ids:
+            return
+        order.append(movie_id)
+        ids.add(movie_id)
+        while len(order) > self.history_size:
+            ids.discard(order.popleft())
+
+    def add(self, movies: List[Dict]) -> int:
+        """
+        Добавление фильмов в запас (с фильтрацией и без дубликатов)
+
+        Returns:
+            Сколько фильмов добавлено
+        """
+        filtered = MovieDataProcessor.filter_by_rating(movies, self.min_rating, self.min_votes)
+        added = 0
+        for movie in filtered:
+            movie_id = movie.get("id")
+            if movie_id is None or movie_id in self._movies or len(self._movies) >= self.size:
+                continue
+            self._movies[movie_id] = movie
+            added += 1
+        return added
+
+    async def _refill_loop(self):
+        """Фоновое пополнение запаса до size, когда он опускается ниже low_water"""
+        while True:
+            await self._need_refill.wait()
+            self._need_refill.clear()
+            empty_pages = 0
+            while len(self._movies) < self.size and empty_pages < MAX_EMPTY_PAGES:
+                self.api_calls += 1
+                try:
+                    movies = await self.client.get_random_movies(min_rating=self.min_rating)
+                except Exception as e:
+                    logger.error(f"Ошибка при пополнении запаса случайных фильмов: {e}")
+                    movies = []
+                if not movies:
+                    # API недоступен — пауза перед следующей попыткой
+                    await asyncio.sleep(RETRY_DELAY)
+                    empty_pages += 1
+                    continue
+                if self.add(movies) == 0:
+                    empty_pages += 1
+            logger.debug(f"Запас случайных фильмов: {len(self._movies)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики запаса"""
+        return {
+            "pool": len(self._movies),
+            "served": self.served,
+            "fallbacks": self.fallbacks,
+            "api_calls": self.api_calls,
+            "users": len(self._history),
+        }
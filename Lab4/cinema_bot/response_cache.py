@@ -0,0 +1,283 @@
+"""
+Кэш ответов API Кинопоиска
+LRU в памяти с временем жизни записей и необязательное хранилище на диске
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteCacheBackend:
+    """
+    Хранилище кэша в файле SQLite
+    Позволяет не терять ответы API при перезапуске бота
+    """
+
+    def __init__(self, path: str):
+        """
+        Открытие (создание) файла кэша
+
+        Args:
+            path: Путь к файлу базы данных
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, expires REAL NOT NULL, value TEXT NOT NULL)"
+        )
+        self.purge_expired()
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        """Запись (время истечения, значение) или None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires, value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(self, key: str, expires: float, value: Any):
+        """Сохранение записи"""
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, expires, value) VALUES (?, ?, ?)",
+                (key, expires, data)
+            )
+
+    def set_many(self, entries: Iterable[Tuple[str, float, Any]]) -> int:
+        """
+        Сохранение нескольких записей (ключ, время истечения, значение) одной транзакцией
+
+        Returns:
+            Количество сохраненных записей
+        """
+        rows = [(key, expires, json.dumps(value, ensure_ascii=False, separators=(",", ":")))
+                for key, expires, value in entries]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO responses (key, expires, value) VALUES (?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def delete(self, key: str):
+        """Удаление записи"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """
+        Удаление устаревших записей
+
+        Returns:
+            Количество удаленных записей
+        """
+        now = time.time() if now is None else now
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+        return cursor.rowcount
+
+    def close(self):
+        """Закрытие файла базы данных"""
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    Кэш ответов API с ограничением по числу записей (LRU)
+
+    Ключ — конечная точка и нормализованные параметры запроса,
+    время жизни задается для каждого вида запроса отдельно
+    (см. CACHE_TTL в config.py). Если указано хранилище backend,
+    записи дублируются в него и подхватываются после перезапуска.
+
+    Значения из кэша общие для всех вызывающих, изменять их нельзя.
+
+    Асинхронный клиент не обращается к диску в цикле событий:
+    get_async читает хранилище в отдельном потоке, а set(..., defer=True)
+    только ставит запись в очередь, которую flush пишет одной транзакцией.
+    """
+
+    def __init__(self, max_entries: int, ttls: Dict[str, float],
+                 backend: Optional[SQLiteCacheBackend] = None,
+                 clock: Callable[[], float] = time.time):
+        """
+        Инициализация кэша
+
+        Args:
+            max_entries: Максимальное количество записей в памяти
+            ttls: Время жизни записей по видам запросов, секунд
+            backend: Хранилище на диске (необязательно)
+            clock: Источник текущего времени
+        """
+        self.max_entries = max_entries
+        self.ttls = dict(ttls)
+        self.backend = backend
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # Записи, еще не сохраненные в хранилище (set с defer=True)
+        self._pending: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.backend_hits = 0
+
+    @staticmethod
+    def make_key(endpoint: str, items: Iterable[Tuple[str, str]]) -> str:
+        """
+        Ключ кэша: порядок параметров и пробелы по краям значений не важны
+
+        Args:
+            endpoint: Конечная точка API
+            items: Параметры запроса парами (ключ, значение)
+        """
+        normalized = sorted((key, str(value).strip()) for key, value in items)
+        return f"{endpoint}?{urlencode(normalized)}"
+
+    def ttl(self, kind: str) -> float:
+        """Время жизни записей вида kind (0 — не кэшировать)"""
+        return self.ttls.get(kind, 0)
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Значение из кэша или None, если записи нет или она устарела
+        """
+        now = self.clock()
+        found, value = self._get_memory(key, now)
+        if found:
+            return value
+        return self._get_backend(key, now)
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        """Как get, но хранилище на диске читается в отдельном потоке"""
+        now = self.clock()
+        found, value = self._get_memory(key, now)
+        if found or self.backend is None:
+            return value if found else self._miss()
+        return await asyncio.to_thread(self._get_backend, key, now)
+
+    def _get_memory(self, key: str, now: float) -> Tuple[bool, Any]:
+        """(найдено ли, значение) среди записей в памяти и еще не сохраненных"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[1]
+                del self._entries[key]
+                self.expirations += 1
+            entry = self._pending.get(key)
+            if entry is not None and entry[0] > now:
+                self._store(key, entry)
+                self.hits += 1
+                return True, entry[1]
+        return False, None
+
+    def _get_backend(self, key: str, now: float) -> Optional[Any]:
+        """Значение из хранилища на диске (при его наличии) или промах"""
+        if self.backend is not None:
+            stored = self.backend.get(key)
+            if stored is not None and stored[0] > now:
+                with self._lock:
+                    self._store(key, stored)
+                    self.hits += 1
+                    self.backend_hits += 1
+                return stored[1]
+            if stored is not None:
+                self.backend.delete(key)
+        return self._miss()
+
+    def _miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any, ttl: float, defer: bool = False):
+        """
+        Сохранение значения на ttl секунд
+
+        Args:
+            defer: Не писать в хранилище сразу, а поставить в очередь для flush
+        """
+        if ttl <= 0:
+            return
+        entry = (self.clock() + ttl, value)
+        with self._lock:
+            self._store(key, entry)
+            if defer and self.backend is not None:
+                self._pending[key] = entry
+                return
+        if self.backend is not None:
+            try:
+                self.backend.set(key, entry[0], value)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.warning(f"Не удалось сохранить ответ в кэш на диске: {e}")
+
+    def flush(self) -> int:
+        """
+        Запись отложенных значений в хранилище одной транзакцией
+
+        Returns:
+            Количество записанных значений
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or self.backend is None:
+            return 0
+        try:
+            return self.backend.set_many(
+                (key, expires, value) for key, (expires, value) in pending.items()
+            )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"Не удалось сохранить ответы в кэш на диске: {e}")
+            return 0
+
+    def _store(self, key: str, entry: Tuple[float, Any]):
+        """Запись в LRU с вытеснением самых давних (вызывается под блокировкой)"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Очистка кэша в памяти"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики кэша"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "backend_hits": self.backend_hits,
+            }
+
+    def close(self):
+        """Запись отложенных значений и закрытие хранилища на диске"""
+        if self.backend is not None:
+            self.flush()
+            self.backend.close()
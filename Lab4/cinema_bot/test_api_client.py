@@ -0,0 +1,160 @@
+import asyncio
+import threading
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from api_client import AsyncKinopoiskAPIClient
+from response_cache import ResponseCache, SQLiteCacheBackend
+
+
+class FakeKinopoisk:
+    """Локальный API: считает запросы и отвечает с задержкой"""
+
+    def __init__(self, delay: float = 0.2):
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = 0
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", self.handle)
+        self.server = TestServer(app)
+
+    async def handle(self, request):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            # клиент закрыл соединение
+            self.cancelled += 1
+            raise
+        query = request.query.get("query", "")
+        return web.json_response({"docs": [{"id": self.calls, "name": query}]})
+
+    async def __aenter__(self):
+        await self.server.start_server()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.server.close()
+
+    def client(self, cache=None) -> AsyncKinopoiskAPIClient:
+        client = AsyncKinopoiskAPIClient("test-key", cache=cache)
+        client.base_url = str(self.server.make_url("")).rstrip("/")
+        return client
+
+
+def test_burst_of_identical_requests_makes_one_upstream_call():
+    async def run():
+        async with FakeKinopoisk() as api:
+            async with api.client() as client:
+                results = await asyncio.gather(*(
+                    client.search_movie_by_name("Матрица", limit=3) for _ in range(50)
+                ))
+                assert api.calls == 1
+                assert results == [[{"id": 1, "name": "Матрица"}]] * 50
+                assert client.coalescing_stats()["coalesced"] == 49
+
+                # после ответа следующий запрос снова идет в API
+                await client.search_movie_by_name("Матрица", limit=3)
+                assert api.calls == 2
+
+    asyncio.run(run())
+
+
+def test_different_requests_are_not_coalesced():
+    async def run():
+        async with FakeKinopoisk(delay=0.05) as api:
+            async with api.client() as client:
+                results = await asyncio.gather(*(
+                    client.search_movie_by_name(f"фильм {i}") for i in range(5)
+                ))
+                assert api.calls == 5
+                assert sorted(docs[0]["name"] for docs in results) == [f"фильм {i}" for i in range(5)]
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_cancel_shared_request():
+    async def run():
+        async with FakeKinopoisk() as api:
+            async with api.client() as client:
+                waiters = [asyncio.create_task(client.search_movie_by_name("Дюна")) for _ in range(5)]
+                await asyncio.sleep(0.05)
+                waiters[0].cancel()
+                results = await asyncio.gather(*waiters, return_exceptions=True)
+                assert isinstance(results[0], asyncio.CancelledError)
+                assert results[1:] == [[{"id": 1, "name": "Дюна"}]] * 4
+                assert api.calls == 1
+                assert api.cancelled == 0
+
+    asyncio.run(run())
+
+
+def test_last_waiter_cancelled_aborts_request():
+    async def run():
+        async with FakeKinopoisk() as api:
+            async with api.client() as client:
+                waiter = asyncio.create_task(client.search_movie_by_name("Дюна"))
+                await asyncio.sleep(0.05)
+                waiter.cancel()
+                await asyncio.gather(waiter, return_exceptions=True)
+                await asyncio.sleep(0.05)
+                assert api.cancelled == 1
+                assert not client._in_flight
+
+                # новый вызов не подхватывает отмененный запрос
+                assert await client.search_movie_by_name("Дюна") == [{"id": 2, "name": "Дюна"}]
+
+    asyncio.run(run())
+
+
+class ThreadRecordingBackend(SQLiteCacheBackend):
+    """Хранилище, которое запоминает, из каких потоков к нему обращались"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.threads = set()
+        self.transactions = 0
+
+    def get(self, key):
+        self.threads.add(threading.get_ident())
+        return super().get(key)
+
+    def set(self, key, expires, value):
+        self.threads.add(threading.get_ident())
+        self.transactions += 1
+        super().set(key, expires, value)
+
+    def set_many(self, entries):
+        self.threads.add(threading.get_ident())
+        self.transactions += 1
+        return super().set_many(entries)
+
+
+def test_disk_cache_io_runs_off_event_loop(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+
+    async def run():
+        backend = ThreadRecordingBackend(path)
+        cache = ResponseCache(100, {"search": 600}, backend=backend)
+        async with FakeKinopoisk(delay=0.01) as api:
+            async with api.client(cache) as client:
+                await asyncio.gather(*(client.search_movie_by_name(f"фильм {i}") for i in range(20)))
+        assert threading.get_ident() not in backend.threads
+        # все ответы записаны одной транзакцией при закрытии клиента
+        assert backend.transactions == 1
+        cache.close()
+
+    asyncio.run(run())
+
+    async def reopen():
+        cache = ResponseCache(100, {"search": 600}, backend=SQLiteCacheBackend(path))
+        async with FakeKinopoisk() as api:
+            async with api.client(cache) as client:
+                await asyncio.gather(*(client.search_movie_by_name(f"фильм {i}") for i in range(20)))
+            assert api.calls == 0
+        assert cache.stats()["backend_hits"] == 20
+        cache.close()
+
+    # после перезапуска ответы читаются с диска, без запросов к API
+    asyncio.run(reopen())
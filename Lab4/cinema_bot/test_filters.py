@@ -0,0 +1,16 @@
+import copy
+
+from filters import MovieDataProcessor
+
+
+def test_sort_by_weighted_rating_leaves_movies_untouched():
+    movies = [
+        {"id": 1, "rating": {"kp": 9.5}, "votes": {"kp": 10}},
+        {"id": 2, "rating": {"kp": 8.0}, "votes": {"kp": 500000}},
+        {"id": 3, "rating": {"kp": 7.5}, "votes": {"kp": 0}},
+    ]
+    original = copy.deepcopy(movies)
+    ranked = MovieDataProcessor.sort_by_weighted_rating(movies)
+    assert [m["id"] for m in ranked] == [2, 1, 3]
+    assert movies == original
+    assert ranked[0] is movies[1]
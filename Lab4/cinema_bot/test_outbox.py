@@ -0,0 +1,67 @@
+import asyncio
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from outbox import OutboundScheduler, pack_texts
+
+
+def _method(chat_id):
+    return SendMessage(chat_id=chat_id, text="")
+
+
+class FakeBot:
+    """Бот, который запоминает отправленное; альбомы и постер "bad" не проходят"""
+
+    def __init__(self, retry_after_photos=()):
+        self.sent = []
+        self.retry_after_photos = set(retry_after_photos)
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append((chat_id, "text", text))
+
+    async def send_photo(self, chat_id, photo, caption=None, parse_mode=None):
+        if photo in self.retry_after_photos:
+            raise TelegramRetryAfter(method=_method(chat_id), message="flood", retry_after=0)
+        if photo == "bad":
+            raise TelegramBadRequest(method=_method(chat_id), message="bad photo")
+        self.sent.append((chat_id, "photo", caption))
+
+    async def send_media_group(self, chat_id, media):
+        raise TelegramBadRequest(method=_method(chat_id), message="bad album")
+
+
+def _scheduler(bot):
+    return OutboundScheduler(bot, global_rate=1000, chat_rate=1000, chat_burst=1000, max_retries=2)
+
+
+def test_pack_texts():
+    assert pack_texts(["a" * 3, "b" * 3, "c" * 3], limit=7) == ["aaa\nbbb", "ccc"]
+    assert pack_texts(["a" * 10, "b"], limit=5) == ["a" * 10, "b"]
+
+
+def test_album_fallback_sends_each_card_once():
+    async def run():
+        bot = FakeBot(retry_after_photos={"p2"})
+        outbox = _scheduler(bot)
+        outbox.send_cards(1, [("A", "p1"), ("B", "p2"), ("C", "bad")])
+        await outbox.close()
+        return bot, outbox
+
+    bot, outbox = asyncio.run(run())
+    # B так и не прошел из-за «retry after», C ушла текстом
+    assert bot.sent == [(1, "photo", "A"), (1, "text", "C")]
+    assert outbox.sent == 2
+    assert outbox.failed == 1
+
+
+def test_retry_after_pauses_global_bucket():
+    async def run():
+        outbox = _scheduler(FakeBot(retry_after_photos={"p"}))
+        outbox.send_cards(1, [("A", "p")])
+        await outbox.close()
+        return outbox
+
+    outbox = asyncio.run(run())
+    assert outbox.retries == 3
+    assert outbox._global.paused_until > 0
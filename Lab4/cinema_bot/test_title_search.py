@@ -0,0 +1,33 @@
+import asyncio
+import threading
+
+from title_search import TitleIndex
+
+
+class SlowCatalog:
+    """Каталог, чей снимок названий отдается только по сигналу"""
+
+    def __init__(self, titles):
+        self._titles = titles
+        self.release = threading.Event()
+
+    def titles(self):
+        self.release.wait(timeout=5)
+        return list(self._titles)
+
+
+def test_movies_added_during_refresh_survive():
+    async def run():
+        catalog = SlowCatalog([(1, "Матрица", "The Matrix", 8.5, 500000)])
+        index = TitleIndex(catalog)
+        refresh = asyncio.create_task(index.refresh())
+        await asyncio.sleep(0.05)
+        index.add([{"id": 2, "name": "Дюна", "rating": {"kp": 8.0}, "votes": {"kp": 300000}}])
+        catalog.release.set()
+        await refresh
+        return index
+
+    index = asyncio.run(run())
+    assert len(index) == 2
+    assert index.search("Дюна")[0][0] == 2
+    assert index.search("Matrix")[0][0] == 1
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import subprocess
+import sys
+import textwrap
+
+from user_storage import SQLiteUserBackend, UserStorage
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _run_child(code: str, *args):
+    """Скрипт в отдельном процессе (рядом с user_storage.py)"""
+    return subprocess.Popen([sys.executable, "-c", textwrap.dedent(code), *map(str, args)], cwd=HERE)
+
+
+CRASH_CHILD = """
+    import asyncio, os, sys
+    from user_storage import SQLiteUserBackend, UserStorage
+
+    async def main():
+        storage = UserStorage(SQLiteUserBackend(sys.argv[1]), flush_interval=3600)
+        for i in range(30):
+            storage.add_to_search_history(1, f"q{i}", "movie")
+        storage.add_favorite_genre(1, "драма")
+        storage.increment_request_counter(1)
+        await storage.flush()
+        # изменения после записи теряются вместе с процессом
+        storage.update_last_activity(1)
+        storage.update_last_activity(2)
+        os._exit(1)
+
+    asyncio.run(main())
+"""
+
+WRITER_CHILD = """
+    import asyncio, sys
+    from user_storage import SQLiteUserBackend, UserStorage
+
+    async def main():
+        path, writer, operations, users = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+        storage = UserStorage(SQLiteUserBackend(path), cache_size=users // 2, flush_interval=0.01)
+        storage.start()
+        for i in range(operations):
+            user_id = i % users
+            storage.add_to_search_history(user_id, f"w{writer}-{i}", "top")
+            storage.increment_request_counter(user_id)
+            if i % 50 == 0:
+                await asyncio.sleep(0.005)
+        await storage.stop()
+        storage.close()
+
+    asyncio.run(main())
+"""
+
+
+def test_crash_keeps_flushed_data(tmp_path):
+    path = tmp_path / "users.sqlite3"
+    assert _run_child(CRASH_CHILD, path).wait(timeout=60) == 1
+
+    backend = SQLiteUserBackend(str(path))
+    try:
+        user = backend.load(1)
+        assert user["total_requests"] == 30
+        assert user["request_count"] == 1
+        assert [entry["query"] for entry in user["search_history"]] == [f"q{i}" for i in range(10, 30)]
+        assert user["favorite_genres"] == ["драма"]
+        assert backend.load(2) is None
+    finally:
+        backend.close()
+
+
+def test_concurrent_writers_sum_exactly(tmp_path):
+    path = tmp_path / "users.sqlite3"
+    writers, operations, users = 4, 1000, 40
+    children = [_run_child(WRITER_CHILD, path, n, operations, users) for n in range(writers)]
+    assert [child.wait(timeout=120) for child in children] == [0] * writers
+
+    backend = SQLiteUserBackend(str(path))
+    try:
+        assert backend.count_users() == users
+        loaded = [backend.load(user_id) for user_id in range(users)]
+        assert sum(user["total_requests"] for user in loaded) == writers * operations
+        assert sum(user["request_count"] for user in loaded) == writers * operations
+        assert all(len(user["search_history"]) == 20 for user in loaded)
+    finally:
+        backend.close()
+
+
+def test_hot_path_does_not_read_backend(tmp_path):
+    async def run():
+        storage = UserStorage(SQLiteUserBackend(str(tmp_path / "users.sqlite3")), cache_size=2)
+        for user_id in range(10):
+            storage.add_to_search_history(user_id, "q", "movie")
+            storage.add_favorite_genre(user_id, "комедия")
+        assert storage.loads == 0
+        await storage.flush()
+
+        # вытесненный и снова прочитанный пользователь видит и записанное, и несохраненное
+        storage.update_last_activity(0)
+        user = await storage.get_user_data(0)
+        assert storage.loads == 1
+        assert user["total_requests"] == 2
+        assert user["favorite_genres"] == ["комедия"]
+        assert await storage.get_total_users() == 10
+        assert await storage.get_active_users() == 10
+        await storage.stop()
+        storage.close()
+
+    asyncio.run(run())
+
+
+def test_memory_mode():
+    async def run():
+        storage = UserStorage()
+        storage.add_to_search_history(1, "q", "movie")
+        storage.increment_request_counter(1)
+        assert (await storage.get_user_data(1))["total_requests"] == 1
+        assert await storage.get_request_count(1) == 1
+        assert await storage.get_request_count(2) == 0
+        assert await storage.get_total_users() == 1
+        assert "Всего запросов: 1" in await storage.get_user_statistics(1)
+
+    asyncio.run(run())
@@ -0,0 +1,226 @@
+"""
+Локальный нечеткий поиск фильмов по названию
+Триграммный индекс по name и alternativeName фильмов из зеркала каталога
+"""
+
+import asyncio
+import heapq
+import logging
+import math
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import SEARCH_CONFIDENCE
+from filters import MovieDataProcessor
+
+logger = logging.getLogger(__name__)
+
+# Кириллица -> латиница: запрос, набранный латиницей («Matrica»),
+# находит русское название («Матрица») и наоборот
+TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e",
+    "ж": "zh", "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "h", "ц": "c", "ч": "ch", "ш": "sh", "щ": "shch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+}
+_TRANSLIT_TABLE = str.maketrans(TRANSLIT)
+_NOT_WORD = re.compile(r"[^0-9a-z]+")
+
+# Вклад доли триграмм запроса, найденных в названии (остальное — коэффициент Дайса)
+CONTAINMENT_WEIGHT = 0.6
+# Названия, содержащие меньшую долю триграмм запроса, не рассматриваются
+MIN_CONTAINMENT = 0.5
+# Надбавка названию, которое начинается с запроса
+PREFIX_BONUS = 0.05
+
+
+def normalize_title(text: Optional[str]) -> str:
+    """
+    Ключ для поиска: нижний регистр, транслитерация, только буквы и цифры
+
+    Args:
+        text: Название или запрос
+
+    Returns:
+        Слова через один пробел (пустая строка, если искать нечего)
+    """
+    text = (text or "").lower().translate(_TRANSLIT_TABLE)
+    return " ".join(_NOT_WORD.sub(" ", text).split())
+
+
+def trigrams(key: str) -> set:
+    """Триграммы ключа с отступами по краям (для коротких слов и начала строки)"""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _IndexState:
+    """Неизменяемая после сборки часть индекса (заменяется целиком при обновлении)"""
+
+    __slots__ = ("keys", "sizes", "owners", "postings", "weighted")
+
+    def __init__(self):
+        self.keys: List[str] = []  # ключ варианта названия
+        self.sizes: List[int] = []  # число триграмм варианта
+        self.owners: List[int] = []  # id фильма варианта
+        self.postings: Dict[str, List[int]] = {}  # триграмма -> номера вариантов
+        self.weighted: Dict[int, float] = {}  # id фильма -> взвешенный рейтинг
+
+    def add(self, movie_id: int, names: Tuple[Optional[str], ...], rating: float, votes: int):
+        self.weighted[movie_id] = MovieDataProcessor.weighted_rating(rating or 0, votes or 0)
+        for key in {normalize_title(name) for name in names}:
+            if not key:
+                continue
+            doc = len(self.keys)
+            grams = trigrams(key)
+            self.keys.append(key)
+            self.sizes.append(len(grams))
+            self.owners.append(movie_id)
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(doc)
+
+
+class TitleIndex:
+    """
+    Нечеткий поиск по названиям фильмов зеркала каталога
+
+    Название и запрос транслитерируются в латиницу и раскладываются
+    на триграммы; сходство — доля триграмм запроса в названии вместе
+    с коэффициентом Дайса, что дает поиск по началу названия и
+    терпимость к опечаткам. Равные по сходству фильмы упорядочиваются
+    по взвешенному рейтингу.
+    """
+
+    def __init__(self, catalog, confidence: float = SEARCH_CONFIDENCE):
+        """
+        Args:
+            catalog: MovieCatalog — источник названий и данных фильмов
+            confidence: Минимальное сходство лучшего результата,
+                при котором локальному поиску можно доверять
+        """
+        self.catalog = catalog
+        self.confidence = confidence
+        self._state = _IndexState()
+        # фильмы, добавленные во время фоновой пересборки (None — пересборки нет)
+        self._added_during_refresh: Optional[List[Dict]] = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._state.weighted)
+
+    def _build(self) -> _IndexState:
+        state = _IndexState()
+        for movie_id, name, alternative_name, rating, votes in self.catalog.titles():
+            state.add(movie_id, (name, alternative_name), rating, votes)
+        return state
+
+    def rebuild(self):
+        """Сборка индекса по всем фильмам каталога"""
+        started = time.perf_counter()
+        self._state = self._build()
+        logger.info(f"Индекс названий: {len(self)} фильмов за "
+                    f"{time.perf_counter() - started:.2f} с")
+
+    async def refresh(self):
+        """
+        Пересборка индекса в отдельном потоке, без остановки цикла событий
+
+        Фильмы, добавленные через add во время сборки, переносятся
+        в новый индекс (сборка идет по более раннему снимку каталога).
+        """
+        started = time.perf_counter()
+        self._added_during_refresh = added = []
+        try:
+            state = await asyncio.to_thread(self._build)
+        finally:
+            self._added_during_refresh = None
+        self._add_to(state, added)
+        self._state = state
+        logger.info(f"Индекс названий обновлен: {len(self)} фильмов за "
+                    f"{time.perf_counter() - started:.2f} с")
+
+    def add(self, movies: List[Dict]):
+        """Добавление фильмов (например, найденных через API) без пересборки"""
+        if self._added_during_refresh is not None:
+            self._added_during_refresh.extend(movies)
+        self._add_to(self._state, movies)
+
+    @staticmethod
+    def _add_to(state: _IndexState, movies: List[Dict]):
+        for movie in movies:
+            movie_id = movie.get("id")
+            if movie_id is None or movie_id in state.weighted:
+                continue
+            state.add(movie_id, (movie.get("name"), movie.get("alternativeName")),
+                      (movie.get("rating") or {}).get("kp"), (movie.get("votes") or {}).get("kp"))
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[int, float]]:
+        """
+        Поиск по названию
+
+        Args:
+            query: Запрос (можно с опечатками, начало названия, в любой раскладке)
+            limit: Максимальное количество результатов
+
+        Returns:
+            Список (id фильма, сходство от 0 до 1), лучшие первыми
+        """
+        key = normalize_title(query)
+        if not key:
+            return []
+        state = self._state
+        grams = trigrams(key)
+        # Название с долей MIN_CONTAINMENT триграмм запроса обязательно содержит
+        # одну из (len - need + 1) самых редких, поэтому кандидаты собираются
+        # только по ним, а частые триграммы («  t», « th») не перебираются
+        need = max(1, math.ceil(MIN_CONTAINMENT * len(grams)))
+        ordered = sorted(grams, key=lambda gram: len(state.postings.get(gram, ())))
+        candidates = set()
+        for gram in ordered[:len(grams) - need + 1]:
+            candidates.update(state.postings.get(gram, ()))
+
+        best: Dict[int, float] = {}
+        for doc in candidates:
+            shared = len(grams & trigrams(state.keys[doc]))
+            if shared < need:
+                continue
+            containment = shared / len(grams)
+            dice = 2 * shared / (len(grams) + state.sizes[doc])
+            score = CONTAINMENT_WEIGHT * containment + (1 - CONTAINMENT_WEIGHT) * dice
+            if state.keys[doc].startswith(key):
+                score += PREFIX_BONUS
+            movie_id = state.owners[doc]
+            if score > best.get(movie_id, 0):
+                best[movie_id] = score
+
+        ranked = heapq.nlargest(limit, best.items(),
+                                key=lambda item: (round(item[1], 2), state.weighted.get(item[0], 0)))
+        return [(movie_id, round(min(score, 1.0), 3)) for movie_id, score in ranked]
+
+    async def lookup(self, query: str, limit: int = 5) -> Optional[List[Dict]]:
+        """
+        Фильмы по запросу, если локальный результат достаточно надежен
+        (поиск идет в памяти, чтение фильмов из каталога — в отдельном потоке)
+
+        Returns:
+            Список фильмов или None — тогда нужно искать через API
+        """
+        found = self.search(query, limit)
+        if not found or found[0][1] < self.confidence:
+            self.misses += 1
+            return None
+        movies = await asyncio.to_thread(
+            self.catalog.get_movies, [movie_id for movie_id, score in found if score >= self.confidence]
+        )
+        if not movies:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return movies
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики поиска"""
+        return {"movies": len(self), "hits": self.hits, "misses": self.misses}
@@ -3,50 +3,429 @@
 Хранилище данных пользователей для многопользовательского режима
 """
 
-from typing import Dict, List, Optional
-from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import asyncio
 import logging
+import sqlite3
+import threading
+
+from config import USER_CACHE_SIZE, USER_FLUSH_INTERVAL
 
 logger = logging.getLogger(__name__)
 
+# Сколько последних запросов хранится в истории пользователя
+HISTORY_LIMIT = 20
+# Сколько ждать, пока другой процесс освободит файл базы, секунд
+BUSY_TIMEOUT = 10.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    first_seen REAL NOT NULL,
+    last_activity REAL NOT NULL,
+    total_requests INTEGER NOT NULL DEFAULT 0,
+    request_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS users_last_activity ON users (last_activity);
+CREATE TABLE IF NOT EXISTS search_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    query TEXT NOT NULL,
+    type TEXT NOT NULL,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS search_history_user ON search_history (user_id, id);
+CREATE TABLE IF NOT EXISTS favorite_genres (
+    user_id INTEGER NOT NULL,
+    genre TEXT NOT NULL,
+    PRIMARY KEY (user_id, genre)
+);
+"""
+
+
+def _new_changes() -> Dict:
+    """Пустой набор несохраненных изменений пользователя"""
+    return {"first_seen": None, "last_activity": None, "requests": 0,
+            "counter": 0, "history": [], "genres": []}
+
+
+def _merge_changes(older: Dict, newer: Dict) -> Dict:
+    """Объединение двух наборов изменений одного пользователя"""
+    return {
+        "first_seen": older["first_seen"] or newer["first_seen"],
+        "last_activity": newer["last_activity"] or older["last_activity"],
+        "requests": older["requests"] + newer["requests"],
+        "counter": older["counter"] + newer["counter"],
+        "history": (older["history"] + newer["history"])[-HISTORY_LIMIT:],
+        "genres": older["genres"] + [g for g in newer["genres"] if g not in older["genres"]],
+    }
+
+
+def _apply_changes(user_data: Dict, changes: Dict):
+    """Наложение несохраненных изменений на данные, прочитанные из хранилища"""
+    if changes["last_activity"] and changes["last_activity"] > user_data["last_activity"]:
+        user_data["last_activity"] = changes["last_activity"]
+    user_data["total_requests"] += changes["requests"]
+    user_data["request_count"] += changes["counter"]
+    user_data["search_history"] = (user_data["search_history"] + changes["history"])[-HISTORY_LIMIT:]
+    for genre in changes["genres"]:
+        if genre not in user_data["favorite_genres"]:
+            user_data["favorite_genres"].append(genre)
+
+
+class SQLiteUserBackend:
+    """
+    Хранилище данных пользователей в файле SQLite (режим WAL)
+    
+    Изменения записываются приращениями: счетчики прибавляются, история
+    дописывается, поэтому один файл могут одновременно использовать
+    несколько процессов бота. Чтение идет через отдельное соединение
+    и не ждет записи.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Открытие (создание) файла с данными пользователей
+        
+        Args:
+            path: Путь к файлу базы данных
+        """
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.executescript(SCHEMA)
+        self._reader = self._connect()
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+    
+    def load(self, user_id: int) -> Optional[Dict]:
+        """
+        Данные пользователя в формате UserStorage.get_user_data или None
+        """
+        with self._read_lock:
+            # все три запроса читают один снимок базы
+            self._reader.execute("BEGIN")
+            try:
+                row = self._reader.execute(
+                    "SELECT first_seen, last_activity, total_requests, request_count "
+                    "FROM users WHERE user_id = ?", (user_id,)
+                ).fetchone()
+                if row is None:
+                    return None
+                history = self._reader.execute(
+                    "SELECT query, type, timestamp FROM search_history "
+                    "WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, HISTORY_LIMIT)
+                ).fetchall()
+                genres = self._reader.execute(
+                    "SELECT genre FROM favorite_genres WHERE user_id = ? ORDER BY rowid",
+                    (user_id,)
+                ).fetchall()
+            finally:
+                self._reader.commit()
+        
+        return {
+            "user_id": user_id,
+            "first_seen": datetime.fromtimestamp(row[0]),
+            "last_activity": datetime.fromtimestamp(row[1]),
+            "search_history": [
+                {"query": query, "type": query_type, "timestamp": datetime.fromtimestamp(ts)}
+                for query, query_type, ts in reversed(history)
+            ],
+            "favorite_genres": [genre for genre, in genres],
+            "total_requests": row[2],
+            "request_count": row[3],
+        }
+    
+    def write(self, changes: Dict[int, Dict]):
+        """
+        Запись изменений нескольких пользователей одной транзакцией
+        
+        Args:
+            changes: {user_id: изменения} (см. UserStorage)
+        """
+        now = datetime.now().timestamp()
+        users = []
+        history = []
+        genres = []
+        trimmed = []
+        for user_id, change in changes.items():
+            last = change["last_activity"].timestamp() if change["last_activity"] else now
+            first = change["first_seen"].timestamp() if change["first_seen"] else last
+            users.append((user_id, first, last, change["requests"], change["counter"]))
+            history.extend((user_id, entry["query"], entry["type"], entry["timestamp"].timestamp())
+                           for entry in change["history"])
+            genres.extend((user_id, genre) for genre in change["genres"])
+            if change["history"]:
+                trimmed.append((user_id, user_id, HISTORY_LIMIT - 1))
+        
+        with self._write_lock, self._writer:
+            self._writer.executemany(
+                "INSERT INTO users (user_id, first_seen, last_activity, total_requests, request_count) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (user_id) DO UPDATE SET "
+                "first_seen = min(first_seen, excluded.first_seen), "
+                "last_activity = max(last_activity, excluded.last_activity), "
+                "total_requests = total_requests + excluded.total_requests, "
+                "request_count = request_count + excluded.request_count",
+                users
+            )
+            self._writer.executemany(
+                "INSERT INTO search_history (user_id, query, type, timestamp) VALUES (?, ?, ?, ?)",
+                history
+            )
+            # в истории остаются последние HISTORY_LIMIT записей
+            self._writer.executemany(
+                "DELETE FROM search_history WHERE user_id = ? AND id < ("
+                "SELECT id FROM search_history WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                trimmed
+            )
+            self._writer.executemany(
+                "INSERT OR IGNORE INTO favorite_genres (user_id, genre) VALUES (?, ?)", genres
+            )
+    
+    def count_users(self) -> int:
+        """Количество сохраненных пользователей"""
+        with self._read_lock:
+            return self._reader.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    
+    def known_users(self, user_ids: Iterable[int]) -> Set[int]:
+        """Те из user_ids, что уже сохранены"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+        placeholders = ", ".join("?" * len(user_ids))
+        with self._read_lock:
+            rows = self._reader.execute(
+                f"SELECT user_id FROM users WHERE user_id IN ({placeholders})", user_ids
+            ).fetchall()
+        return {user_id for user_id, in rows}
+    
+    def active_users(self, since: datetime) -> Set[int]:
+        """ID пользователей, активных начиная с since"""
+        with self._read_lock:
+            rows = self._reader.execute(
+                "SELECT user_id FROM users WHERE last_activity >= ?", (since.timestamp(),)
+            ).fetchall()
+        return {user_id for user_id, in rows}
+    
+    def close(self):
+        """Закрытие файла базы данных"""
+        with self._write_lock, self._read_lock:
+            self._writer.close()
+            self._reader.close()
+
 
 class UserStorage:
     """
     Класс для хранения данных пользователей
     Обеспечивает многопользовательский режим работы бота
+    
+    Без backend данные хранятся только в памяти. С backend в памяти
+    держатся последние cache_size пользователей (LRU). Методы, которые
+    вызываются на каждую команду (update_last_activity,
+    add_to_search_history и т. п.), не обращаются к диску: они меняют
+    данные в памяти и копят изменения, которые раз в flush_interval
+    секунд записываются одной транзакцией в отдельном потоке (см. start).
+    Чтение из backend (асинхронные методы) тоже идет в отдельном потоке.
+    При сбое теряются изменения не более чем за flush_interval.
     """
     
-    def __init__(self):
-        """Инициализация хранилища"""
-        # Словарь для хранения данных: {user_id: user_data}
-        self._users: Dict[int, Dict] = {}
-        # Счетчик запросов для статистики
-        self._request_counter: Dict[int, int] = {}
+    def __init__(self, backend: Optional[SQLiteUserBackend] = None,
+                 cache_size: int = USER_CACHE_SIZE,
+                 flush_interval: float = USER_FLUSH_INTERVAL):
+        """
+        Инициализация хранилища
+        
+        Args:
+            backend: Хранилище на диске (необязательно)
+            cache_size: Сколько пользователей держать в памяти при наличии backend
+            flush_interval: Период записи изменений в backend, секунд
+        """
+        self.backend = backend
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        # Данные пользователей в порядке обращения: {user_id: user_data}
+        self._users: "OrderedDict[int, Dict]" = OrderedDict()
+        # Несохраненные изменения: {user_id: изменения}
+        self._pending: Dict[int, Dict] = {}
+        # Изменения, которые записываются прямо сейчас
+        self._flushing: Dict[int, Dict] = {}
+        # Запись и чтение backend не пересекаются: прочитанное плюс
+        # несохраненные изменения всегда дают точные данные
+        self._io_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.loads = 0
+        self.flushes = 0
+        self.flush_errors = 0
+    
+    def _lock(self) -> asyncio.Lock:
+        if self._io_lock is None:
+            self._io_lock = asyncio.Lock()
+        return self._io_lock
+    
+    def start(self):
+        """Запуск фоновой записи изменений (внутри работающего цикла событий)"""
+        if self.backend is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._flush_loop())
+    
+    async def stop(self):
+        """Остановка фоновой записи и запись оставшихся изменений"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    async def _flush_loop(self):
+        """Периодическая запись изменений"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # отмена во время записи не должна прерывать транзакцию
+            await asyncio.shield(self.flush())
+    
+    async def flush(self) -> int:
+        """
+        Запись накопленных изменений в backend
+        
+        Returns:
+            Количество пользователей, чьи изменения записаны
+        """
+        if self.backend is None:
+            return 0
+        async with self._lock():
+            if not self._pending:
+                return 0
+            self._flushing, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self.backend.write, self._flushing)
+            except Exception as e:
+                self.flush_errors += 1
+                logger.error(f"Не удалось сохранить данные пользователей: {e}")
+                # изменения вернутся в очередь и запишутся в следующий раз
+                for user_id, changes in self._pending.items():
+                    if user_id in self._flushing:
+                        changes = _merge_changes(self._flushing[user_id], changes)
+                    self._flushing[user_id] = changes
+                self._pending = self._flushing
+                return 0
+            finally:
+                written = len(self._flushing)
+                self._flushing = {}
+            self.flushes += 1
+            return written
+    
+    def _changes(self, user_id: int) -> Optional[Dict]:
+        """Несохраненные изменения пользователя (None, если хранить их негде)"""
+        if self.backend is None:
+            return None
+        changes = self._pending.get(user_id)
+        if changes is None:
+            changes = self._pending[user_id] = _new_changes()
+        return changes
+    
+    def _remember(self, user_id: int, user_data: Dict):
+        """Добавление в LRU с вытеснением давних пользователей"""
+        self._users[user_id] = user_data
+        self._users.move_to_end(user_id)
+        if self.backend is None:
+            return
+        # вытесненного пользователя можно прочитать заново: backend
+        # вместе с несохраненными изменениями дает его точные данные
+        while len(self._users) > self.cache_size:
+            self._users.popitem(last=False)
+    
+    def _create(self, user_id: int) -> Dict:
+        """Создание новой записи для пользователя"""
+        now = datetime.now()
+        user_data = {
+            "user_id": user_id,
+            "first_seen": now,
+            "last_activity": now,
+            "search_history": [],
+            "favorite_genres": [],
+            "total_requests": 0,
+            "request_count": 0
+        }
+        changes = self._changes(user_id)
+        if changes is not None:
+            changes["first_seen"] = now
+            changes["last_activity"] = changes["last_activity"] or now
+        logger.info(f"Создан новый пользователь: {user_id}")
+        self._remember(user_id, user_data)
+        return user_data
+    
+    def _cached(self, user_id: int) -> Optional[Dict]:
+        """Данные из памяти (без backend запись создается при первом обращении)"""
+        user_data = self._users.get(user_id)
+        if user_data is not None:
+            self._users.move_to_end(user_id)
+        elif self.backend is None:
+            user_data = self._create(user_id)
+        return user_data
+    
+    async def _fetch(self, user_id: int, fresh: bool = False) -> Optional[Dict]:
+        """
+        Данные пользователя из памяти или из backend (в отдельном потоке)
+        
+        Args:
+            user_id: ID пользователя
+            fresh: Перечитать из backend, даже если данные есть в памяти
+                (их мог изменить другой процесс бота)
+        
+        Returns:
+            Данные или None, если пользователя нет
+        """
+        if self.backend is None or not fresh:
+            user_data = self._users.get(user_id)
+            if user_data is not None or self.backend is None:
+                if user_data is not None:
+                    self._users.move_to_end(user_id)
+                return user_data
+        
+        async with self._lock():
+            self.loads += 1
+            user_data = await asyncio.to_thread(self.backend.load, user_id)
+            # изменения, сделанные за время чтения, тоже еще в _pending
+            changes = self._pending.get(user_id)
+            if changes is not None:
+                if user_data is None:
+                    first_seen = changes["first_seen"] or changes["last_activity"] or datetime.now()
+                    user_data = {
+                        "user_id": user_id,
+                        "first_seen": first_seen,
+                        "last_activity": first_seen,
+                        "search_history": [],
+                        "favorite_genres": [],
+                        "total_requests": 0,
+                        "request_count": 0
+                    }
+                _apply_changes(user_data, changes)
+        if user_data is not None:
+            self._remember(user_id, user_data)
+        return user_data
     
-    def get_user_data(self, user_id: int) -> Dict:
+    async def get_user_data(self, user_id: int) -> Dict:
         """
         Получение данных пользователя
         
         Args:
             user_id: ID пользователя в Telegram
-            
+        
         Returns:
             Словарь с данными пользователя
         """
-        if user_id not in self._users:
-            # Создание новой записи для пользователя
-            self._users[user_id] = {
-                "user_id": user_id,
-                "first_seen": datetime.now(),
-                "last_activity": datetime.now(),
-                "search_history": [],
-                "favorite_genres": [],
-                "total_requests": 0
-            }
-            self._request_counter[user_id] = 0
-            logger.info(f"Создан новый пользователь: {user_id}")
-        
-        return self._users[user_id]
+        user_data = await self._fetch(user_id)
+        if user_data is None:
+            user_data = self._create(user_id)
+        return user_data
     
     def update_last_activity(self, user_id: int):
         """
@@ -55,9 +434,16 @@ class UserStorage:
         Args:
             user_id: ID пользователя
         """
-        user_data = self.get_user_data(user_id)
-        user_data["last_activity"] = datetime.now()
-        user_data["total_requests"] += 1
+        now = datetime.now()
+        user_data = self._cached(user_id)
+        if user_data is not None:
+            user_data["last_activity"] = now
+            user_data["total_requests"] += 1
+        
+        changes = self._changes(user_id)
+        if changes is not None:
+            changes["last_activity"] = now
+            changes["requests"] += 1
     
     def add_to_search_history(self, user_id: int, query: str, query_type: str):
         """
@@ -68,7 +454,6 @@ class UserStorage:
             query: Текст запроса
             query_type: Тип запроса (movie, genre, top, random)
         """
-        user_data = self.get_user_data(user_id)
         history_entry = {
             "query": query,
             "type": query_type,
@@ -76,9 +461,16 @@ class UserStorage:
         }
         
         # Ограничиваем историю последними 20 запросами
-        user_data["search_history"].append(history_entry)
-        if len(user_data["search_history"]) > 20:
-            user_data["search_history"] = user_data["search_history"][-20:]
+        user_data = self._cached(user_id)
+        if user_data is not None:
+            user_data["search_history"].append(history_entry)
+            if len(user_data["search_history"]) > HISTORY_LIMIT:
+                user_data["search_history"] = user_data["search_history"][-HISTORY_LIMIT:]
+        
+        changes = self._changes(user_id)
+        if changes is not None:
+            changes["history"].append(history_entry)
+            del changes["history"][:-HISTORY_LIMIT]
         
         self.update_last_activity(user_id)
     
@@ -90,23 +482,33 @@ class UserStorage:
             user_id: ID пользователя
             genre: Название жанра
         """
-        user_data = self.get_user_data(user_id)
+        user_data = self._cached(user_id)
         
         # Подсчет частоты запросов жанра
-        if genre not in user_data["favorite_genres"]:
+        if user_data is not None:
+            if genre in user_data["favorite_genres"]:
+                return
             user_data["favorite_genres"].append(genre)
+        
+        # повторно сохраненный жанр backend пропустит сам
+        changes = self._changes(user_id)
+        if changes is not None and genre not in changes["genres"]:
+            changes["genres"].append(genre)
     
-    def get_user_statistics(self, user_id: int) -> str:
+    async def get_user_statistics(self, user_id: int) -> str:
         """
         Получение статистики пользователя
         
         Args:
             user_id: ID пользователя
-            
+        
         Returns:
             Форматированная строка со статистикой
         """
-        user_data = self.get_user_data(user_id)
+        # данные могли измениться в другом процессе бота
+        user_data = await self._fetch(user_id, fresh=True)
+        if user_data is None:
+            user_data = self._create(user_id)
         
         first_seen = user_data["first_seen"].strftime("%d.%m.%Y")
         total_requests = user_data["total_requests"]
@@ -123,26 +525,43 @@ class UserStorage:
         
         return stats
     
-    def get_total_users(self) -> int:
+    async def get_total_users(self) -> int:
         """
         Получение общего количества пользователей
         
         Returns:
             Количество пользователей
         """
-        return len(self._users)
+        if self.backend is None:
+            return len(self._users)
+        async with self._lock():
+            unsaved = list(self._pending)
+            count, known = await asyncio.to_thread(
+                lambda: (self.backend.count_users(), self.backend.known_users(unsaved))
+            )
+        return count + len(set(unsaved) - known)
     
-    def get_active_users(self, minutes: int = 60) -> int:
+    async def get_active_users(self, minutes: int = 60) -> int:
         """
         Получение количества активных пользователей за период
         
         Args:
             minutes: Период в минутах
-            
+        
         Returns:
             Количество активных пользователей
         """
         now = datetime.now()
+        
+        if self.backend is not None:
+            since = now - timedelta(minutes=minutes)
+            async with self._lock():
+                active = await asyncio.to_thread(self.backend.active_users, since)
+                for user_id, changes in self._pending.items():
+                    if changes["last_activity"] and changes["last_activity"] >= since:
+                        active.add(user_id)
+            return len(active)
+        
         active = 0
         
         for user_data in self._users.values():
@@ -161,19 +580,33 @@ class UserStorage:
         Args:
             user_id: ID пользователя
         """
-        if user_id not in self._request_counter:
-            self._request_counter[user_id] = 0
+        user_data = self._cached(user_id)
+        if user_data is not None:
+            user_data["request_count"] += 1
         
-        self._request_counter[user_id] += 1
+        changes = self._changes(user_id)
+        if changes is not None:
+            changes["counter"] += 1
     
-    def get_request_count(self, user_id: int) -> int:
+    async def get_request_count(self, user_id: int) -> int:
         """
         Получение количества запросов пользователя
         
         Args:
             user_id: ID пользователя
-            
+        
         Returns:
             Количество запросов
         """
-        return self._request_counter.get(user_id, 0)
\ No newline at end of file
+        user_data = await self._fetch(user_id)
+        return user_data["request_count"] if user_data is not None else 0
+    
+    def stats(self) -> Dict[str, int]:
+        """Счетчики хранилища"""
+        return {"cached": len(self._users), "pending": len(self._pending), "loads": self.loads,
+                "flushes": self.flushes, "flush_errors": self.flush_errors}
+    
+    def close(self):
+        """Закрытие хранилища на диске"""
+        if self.backend is not None:
+            self.backend.close()